@@ -0,0 +1,45 @@
+"""
+Compare two benchmark reports of benchmarks.run:
+
+	python -m benchmarks.compare baseline.json bench.json
+"""
+
+import argparse
+import json
+from typing import Any
+
+
+def compare(baseline: dict[str, Any], current: dict[str, Any]) -> list[str]:
+	"""One line per scenario and phase with the p50 and p95 of both reports and the change of p50"""
+	lines = [f'{"scenario":<16} {"phase":<18} {"p50 ms":>18} {"p95 ms":>18} {"p50 change":>11}']
+	sections = [(name, result['phases']) for name, result in current['scenarios'].items()]
+	sections.append(('total', current['total']['phases']))
+	for name, phases in sections:
+		base_phases = baseline['total']['phases'] if name == 'total' else baseline['scenarios'].get(name, {}).get('phases', {})
+		for phase, stats in phases.items():
+			base = base_phases.get(phase)
+			if base is None:
+				lines.append(f'{name:<16} {phase:<18} {stats["p50_ms"]:>18.1f} {stats["p95_ms"]:>18.1f} {"new":>11}')
+				continue
+			change = (stats['p50_ms'] - base['p50_ms']) / base['p50_ms'] * 100 if base['p50_ms'] else 0.0
+			p50 = f'{base["p50_ms"]:.1f} -> {stats["p50_ms"]:.1f}'
+			p95 = f'{base["p95_ms"]:.1f} -> {stats["p95_ms"]:.1f}'
+			lines.append(f'{name:<16} {phase:<18} {p50:>18} {p95:>18} {change:>+10.1f}%')
+	return lines
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('baseline')
+	parser.add_argument('current')
+	args = parser.parse_args()
+
+	with open(args.baseline) as f:
+		baseline = json.load(f)
+	with open(args.current) as f:
+		current = json.load(f)
+	print('\n'.join(compare(baseline, current)))
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,29 @@
+"""
+Recorded conversations for the tokenizer benchmark, the message manager state of agent runs saved as JSON:
+
+	with open('benchmarks/fixtures/conversations/my_run.json', 'w') as f:
+		json.dump(agent.state.message_manager_state.model_dump(mode='json'), f, ensure_ascii=False)
+
+BENCHMARK_CONVERSATIONS can name another directory of recordings.
+"""
+
+import json
+import os
+from pathlib import Path
+
+from langchain_core.messages import BaseMessage
+
+from browser_use.agent.views import MessageManagerState
+
+CONVERSATIONS_DIR = Path(__file__).parent / 'fixtures' / 'conversations'
+
+
+def load_conversations() -> dict[str, list[BaseMessage]]:
+	"""Messages of every recorded conversation by file name"""
+	directory = Path(os.getenv('BENCHMARK_CONVERSATIONS') or CONVERSATIONS_DIR)
+	conversations = {}
+	for path in sorted(directory.glob('*.json')):
+		with open(path, encoding='utf-8') as f:
+			state = MessageManagerState.model_validate(json.load(f))
+		conversations[path.stem] = state.history.get_messages()
+	return conversations
@@ -0,0 +1,56 @@
+"""
+Local HTTP server for the static fixture sites of the benchmarks.
+"""
+
+import functools
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+
+FIXTURES_DIR = Path(__file__).parent / 'fixtures'
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+	def log_message(self, format, *args):
+		pass
+
+
+class FixtureServer:
+	"""
+	Serves `directory` on a free port of localhost in a background thread.
+
+	Example:
+		with FixtureServer() as server:
+			url = server.url('forms.html')
+	"""
+
+	def __init__(self, directory: Path = FIXTURES_DIR, port: int = 0):
+		handler = functools.partial(_QuietHandler, directory=str(directory))
+		self._server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+		self._thread: Optional[threading.Thread] = None
+
+	@property
+	def base_url(self) -> str:
+		host, port = self._server.server_address[:2]
+		return f'http://{host}:{port}'
+
+	def url(self, path: str) -> str:
+		return f'{self.base_url}/{path.lstrip("/")}'
+
+	def start(self) -> None:
+		self._thread = threading.Thread(target=self._server.serve_forever, name='fixture-server', daemon=True)
+		self._thread.start()
+
+	def stop(self) -> None:
+		self._server.shutdown()
+		self._server.server_close()
+		if self._thread is not None:
+			self._thread.join()
+
+	def __enter__(self) -> 'FixtureServer':
+		self.start()
+		return self
+
+	def __exit__(self, *exc) -> None:
+		self.stop()
@@ -0,0 +1,19 @@
+"""
+Summary of the phase timings which the agent records in the metadata of every history item.
+"""
+
+from browser_use.agent.views import AgentHistory, AgentHistoryList
+
+
+def summarize(history: list[AgentHistory]) -> dict[str, dict[str, float]]:
+	"""p50, p95 and mean in milliseconds of every phase, over the steps which ran the phase"""
+	summary = AgentHistoryList(history=history).timing_summary()
+	return {
+		phase: {
+			'count': stats['count'],
+			'p50_ms': round(stats['p50'] * 1000, 3),
+			'p95_ms': round(stats['p95'] * 1000, 3),
+			'mean_ms': round(stats['mean'] * 1000, 3),
+		}
+		for phase, stats in sorted(summary.items())
+	}
@@ -0,0 +1,112 @@
+"""
+Offline end-to-end benchmark of Agent.run.
+
+Runs the scenarios against the local fixture sites with a scripted model, so no website and no model
+provider is involved, and writes p50/p95 of every step phase as JSON:
+
+	python -m benchmarks.run --repeat 5 --output bench.json
+	python -m benchmarks.compare baseline.json bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import subprocess
+import sys
+import time
+from typing import Any, Optional
+
+from benchmarks.fixture_server import FixtureServer
+from benchmarks.phases import summarize
+from benchmarks.scenarios import SCENARIOS, Scenario
+from benchmarks.scripted_llm import ScriptedChatModel
+from browser_use.agent.service import Agent
+from browser_use.agent.views import AgentHistoryList
+from browser_use.browser.browser import Browser, BrowserConfig
+from browser_use.browser.context import BrowserContextConfig
+
+logger = logging.getLogger(__name__)
+
+
+async def run_scenario(browser: Browser, server: FixtureServer, scenario: Scenario, use_vision: bool) -> AgentHistoryList:
+	llm = ScriptedChatModel(steps=scenario.steps)
+	async with await browser.new_context(BrowserContextConfig()) as context:
+		agent = Agent(
+			task=scenario.task,
+			llm=llm,
+			browser_context=context,
+			initial_actions=[{'go_to_url': {'url': server.url(scenario.page)}}],
+			use_vision=use_vision,
+			max_failures=1,
+		)
+		return await agent.run(max_steps=len(scenario.steps) + 2)
+
+
+async def run(scenarios: list[Scenario], repeat: int, headless: bool, use_vision: bool) -> dict[str, Any]:
+	results: dict[str, Any] = {}
+	all_steps = []
+	browser = Browser(BrowserConfig(headless=headless))
+	try:
+		with FixtureServer() as server:
+			for scenario in scenarios:
+				started = time.perf_counter()
+				runs = [await run_scenario(browser, server, scenario, use_vision) for _ in range(repeat)]
+				duration = time.perf_counter() - started
+				steps = [h for run in runs for h in run.history]
+				all_steps.extend(steps)
+				results[scenario.name] = {
+					'runs': repeat,
+					'completed': sum(run.is_done() and not run.has_errors() for run in runs),
+					'steps': len(steps),
+					'steps_per_second': round(len(steps) / duration, 3) if duration else None,
+					'phases': summarize(steps),
+					'errors': sorted({error.splitlines()[0] for run in runs for error in run.errors()}),
+				}
+				logger.info(f'{scenario.name}: {results[scenario.name]["steps_per_second"]} steps/s')
+	finally:
+		await browser.close()
+
+	return {
+		'meta': {
+			'commit': _git_commit(),
+			'python': platform.python_version(),
+			'platform': platform.platform(),
+			'repeat': repeat,
+			'use_vision': use_vision,
+		},
+		'scenarios': results,
+		'total': {'phases': summarize(all_steps)},
+	}
+
+
+def _git_commit() -> Optional[str]:
+	try:
+		return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True, stderr=subprocess.DEVNULL).strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--scenario', action='append', choices=[scenario.name for scenario in SCENARIOS], help='default: all')
+	parser.add_argument('--repeat', type=int, default=3, help='runs of every scenario')
+	parser.add_argument('--output', help='JSON file, default: stdout')
+	parser.add_argument('--headful', action='store_true', help='show the browser')
+	parser.add_argument('--vision', action='store_true', help='send screenshots to the model')
+	args = parser.parse_args(argv)
+
+	scenarios = [scenario for scenario in SCENARIOS if not args.scenario or scenario.name in args.scenario]
+	report = asyncio.run(run(scenarios, args.repeat, headless=not args.headful, use_vision=args.vision))
+
+	output = json.dumps(report, indent=2, sort_keys=True)
+	if args.output:
+		with open(args.output, 'w') as f:
+			f.write(output + '\n')
+	else:
+		sys.stdout.write(output + '\n')
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,75 @@
+"""
+Agent runs over the fixture sites, one step of actions per model call.
+"""
+
+from dataclasses import dataclass
+
+from benchmarks.scripted_llm import Action, Element
+
+
+@dataclass
+class Scenario:
+	name: str
+	page: str
+	steps: list[list[Action]]
+	task: str = 'Benchmark scenario'
+
+
+SCENARIOS = [
+	Scenario(
+		name='forms',
+		page='forms.html',
+		steps=[
+			[{'input_text': {'index': Element('name="name"'), 'text': 'Ada Lovelace'}}],
+			[{'input_text': {'index': Element('name="email"'), 'text': 'ada@example.com'}}],
+			[{'select_dropdown_option': {'index': Element('name="plan"'), 'text': 'Team'}}],
+			[{'input_text': {'index': Element('name="message"'), 'text': 'Hello'}}],
+			[{'click_element': {'index': Element('name="terms"')}}],
+			[{'click_element': {'index': Element('name="submit"')}}],
+			[{'done': {'text': 'Signed up'}}],
+		],
+	),
+	Scenario(
+		name='infinite_list',
+		page='infinite_list.html',
+		steps=[
+			[{'scroll_down': {}}],
+			[{'scroll_down': {}}],
+			[{'scroll_down': {}}],
+			[{'click_element': {'index': Element('name="add-')}}],
+			[{'scroll_up': {}}],
+			[{'done': {'text': 'Added a product'}}],
+		],
+	),
+	Scenario(
+		name='iframes',
+		page='iframes.html',
+		steps=[
+			[{'click_element': {'index': Element('name="outer"')}}],
+			[{'input_text': {'index': Element('name="card"'), 'text': '4242 4242 4242 4242'}}],
+			[{'click_element': {'index': Element('name="pay"')}}],
+			[{'click_element': {'index': Element('name="inline"')}}],
+			[{'done': {'text': 'Paid'}}],
+		],
+	),
+	Scenario(
+		name='shadow_dom',
+		page='shadow_dom.html',
+		steps=[
+			[{'input_text': {'index': Element('name="query"'), 'text': 'laptop'}}],
+			[{'click_element': {'index': Element('name="search"')}}],
+			[{'done': {'text': 'Searched'}}],
+		],
+	),
+	Scenario(
+		name='dropdowns',
+		page='dropdowns.html',
+		steps=[
+			[{'get_dropdown_options': {'index': Element('name="country"')}}],
+			[{'select_dropdown_option': {'index': Element('name="country"'), 'text': 'Japan'}}],
+			[{'click_element': {'index': Element('name="speed"')}}],
+			[{'click_element': {'index': Element('aria-label="express"')}}],
+			[{'done': {'text': 'Shipping selected'}}],
+		],
+	),
+]
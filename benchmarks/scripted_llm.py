@@ -0,0 +1,101 @@
+"""
+Chat model which answers the agent with predetermined actions instead of calling a provider.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+Action = dict[str, dict[str, Any]]
+
+
+@dataclass(frozen=True)
+class Element:
+	"""
+	Index of the first interactive element of the current state whose line matches `pattern`,
+	e.g. Element('name="email"') matches `[3]<input name="email" placeholder="Email">`
+	"""
+
+	pattern: str
+
+	def resolve(self, state: str) -> int:
+		for line in state.splitlines():
+			match = re.match(r'\s*\[(\d+)\]<', line)
+			if match and re.search(self.pattern, line):
+				return int(match.group(1))
+		raise LookupError(f'No element matches {self.pattern!r} in the current state')
+
+
+class ScriptedChatModel(BaseChatModel):
+	"""
+	Answers the n-th call with the n-th step of `steps` as a tool call of the bound output model.
+
+	Element markers in the action parameters are resolved against the last state message, so the
+	script does not depend on the highlight indices of a browser build. Once the script is exhausted
+	every call answers with `done`.
+	"""
+
+	steps: list[list[Action]]
+	model_name: str = 'scripted'
+	calls: int = 0
+
+	@property
+	def _llm_type(self) -> str:
+		return 'scripted'
+
+	def bind_tools(self, tools, *, tool_choice=None, **kwargs):
+		return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+	def _generate(
+		self,
+		messages: list[BaseMessage],
+		stop: Optional[list[str]] = None,
+		run_manager: Any = None,
+		tools: Optional[list[dict]] = None,
+		**kwargs: Any,
+	) -> ChatResult:
+		if not tools:
+			raise ValueError('ScriptedChatModel only answers structured output calls')
+		state = _last_state(messages)
+		step = self.steps[self.calls] if self.calls < len(self.steps) else [{'done': {'text': 'Script finished'}}]
+		self.calls += 1
+
+		output = {
+			'current_state': {
+				'page_summary': '',
+				'evaluation_previous_goal': 'Success',
+				'memory': f'Scripted step {self.calls}',
+				'next_goal': ', '.join(next(iter(action)) for action in step),
+			},
+			'action': [_resolve(action, state) for action in step],
+		}
+		message = AIMessage(
+			content='',
+			tool_calls=[{'name': tools[0]['function']['name'], 'args': output, 'id': f'call_{self.calls}'}],
+			usage_metadata={'input_tokens': len(state) // 3, 'output_tokens': 50, 'total_tokens': len(state) // 3 + 50},
+		)
+		return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def _last_state(messages: list[BaseMessage]) -> str:
+	for message in reversed(messages):
+		if isinstance(message, HumanMessage):
+			if isinstance(message.content, str):
+				return message.content
+			return '\n'.join(part['text'] for part in message.content if isinstance(part, dict) and part.get('type') == 'text')
+	return ''
+
+
+def _resolve(value: Any, state: str) -> Any:
+	if isinstance(value, Element):
+		return value.resolve(state)
+	if isinstance(value, dict):
+		return {key: _resolve(item, state) for key, item in value.items()}
+	if isinstance(value, list):
+		return [_resolve(item, state) for item in value]
+	return value
@@ -0,0 +1,41 @@
+"""
+Micro-benchmark of Agent construction, e.g. the RPA server creates an agent per request.
+
+Run with `pytest benchmarks/tests/agent_construction_benchmark_test.py --benchmark-only`.
+"""
+
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from browser_use.agent.service import Agent
+from browser_use.controller.service import Controller
+
+pytest.importorskip('pytest_benchmark')
+
+pytestmark = pytest.mark.slow
+
+# Building the action models and prompt description per agent took about 40 ms
+MAX_MEAN_SECONDS = 0.01
+
+
+@pytest.mark.parametrize('shared_controller', [True, False], ids=['shared-controller', 'new-controller'])
+def test_agent_construction(benchmark, shared_controller):
+	llm = FakeListChatModel(responses=['unused'])
+	controller = Controller()
+
+	def construct():
+		return Agent(
+			task='Benchmark task',
+			llm=llm,
+			browser_context=SimpleNamespace(),
+			controller=controller if shared_controller else Controller(),
+		)
+
+	agent = benchmark(construct)
+
+	assert agent.ActionModel is not None
+	# stats is None with --benchmark-disable
+	if shared_controller and benchmark.stats:
+		assert benchmark.stats['mean'] < MAX_MEAN_SECONDS
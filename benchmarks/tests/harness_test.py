@@ -0,0 +1,66 @@
+import json
+import urllib.request
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from benchmarks.compare import compare
+from benchmarks.fixture_server import FixtureServer
+from benchmarks.phases import summarize
+from benchmarks.scripted_llm import Element, ScriptedChatModel
+from browser_use.agent.service import Agent
+from browser_use.agent.views import AgentHistory, StepMetadata
+from browser_use.browser.views import BrowserStateHistory
+
+STATE = """Interactive elements from top layer of the current page inside the viewport:
+[0]<input name="name" placeholder="Full name"></input>
+[1]<input name="email" type="email" placeholder="Email"></input>
+[2]<button name="submit">Sign up</button>"""
+
+
+def test_element_resolves_against_state():
+	assert Element('name="email"').resolve(STATE) == 1
+	assert Element('Sign up').resolve(STATE) == 2
+
+	with pytest.raises(LookupError):
+		Element('name="missing"').resolve(STATE)
+
+
+async def test_scripted_model_drives_agent():
+	llm = ScriptedChatModel(steps=[[{'input_text': {'index': Element('name="email"'), 'text': 'ada@example.com'}}]])
+	agent = Agent(task='Sign up', llm=llm, browser_context=SimpleNamespace())
+
+	first = await agent.get_next_action([HumanMessage(content=STATE)])
+	second = await agent.get_next_action([HumanMessage(content=STATE)])
+
+	assert first.action[0].model_dump(exclude_unset=True) == {'input_text': {'index': 1, 'text': 'ada@example.com'}}
+	assert 'done' in second.action[0].model_dump(exclude_unset=True)
+
+
+def test_fixture_server_serves_fixtures():
+	with FixtureServer() as server:
+		with urllib.request.urlopen(server.url('forms.html')) as response:
+			assert b'name="email"' in response.read()
+
+
+def test_summary_and_compare():
+	state = BrowserStateHistory(url='', title='', tabs=[], interacted_element=[], screenshot=None)
+	history = [
+		AgentHistory(
+			model_output=None,
+			result=[],
+			state=state,
+			metadata=StepMetadata(step_number=i, step_start_time=0, step_end_time=i / 100, timings={'dom_build': i / 1000}),
+		)
+		for i in range(1, 101)
+	]
+	summary = summarize(history)
+
+	assert summary['dom_build'] == {'count': 100, 'p50_ms': 50.5, 'p95_ms': 95.05, 'mean_ms': 50.5}
+	assert summary['step']['p50_ms'] == 505.0
+
+	report = {'scenarios': {'forms': {'phases': summary}}, 'total': {'phases': summary}}
+	lines = compare(json.loads(json.dumps(report)), report)
+	assert len(lines) == 1 + 2 * 2
+	assert lines[1].split()[:2] == ['forms', 'dom_build']
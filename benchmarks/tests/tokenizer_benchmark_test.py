@@ -0,0 +1,101 @@
+"""
+Token counting throughput and trim accuracy of the tokenizers on the recorded conversations.
+
+Run with `pytest benchmarks/tests/tokenizer_benchmark_test.py --benchmark-only`. The trim accuracy is measured
+against the tiktoken encoding of gpt-4o and skipped if tiktoken can not load it.
+"""
+
+from typing import Callable
+
+import pytest
+from langchain_core.messages import BaseMessage
+
+from benchmarks.conversations import load_conversations
+from browser_use.agent.message_manager.service import MessageManager, MessageManagerSettings
+from browser_use.agent.message_manager.views import MessageMetadata
+from browser_use.agent.views import MessageManagerState
+from browser_use.llm.tokenizer import CharacterTokenizer, DeepSeekTokenizer, TiktokenTokenizer, Tokenizer, _tiktoken_encoding
+
+pytest.importorskip('pytest_benchmark')
+
+pytestmark = pytest.mark.slow
+
+REFERENCE_MODEL = 'gpt-4o'
+
+
+def tiktoken_tokenizer() -> Tokenizer:
+	encoding = _tiktoken_encoding(REFERENCE_MODEL)
+	if encoding is None:
+		pytest.skip(f'No tiktoken encoding for {REFERENCE_MODEL}')
+	return TiktokenTokenizer(encoding)
+
+
+TOKENIZERS: dict[str, Callable[[], Tokenizer]] = {
+	'character': CharacterTokenizer,
+	'deepseek': DeepSeekTokenizer,
+	'deepseek-no-memo': lambda: DeepSeekTokenizer(max_memoized=0),
+	'tiktoken': tiktoken_tokenizer,
+}
+
+
+@pytest.fixture(scope='module')
+def conversations() -> dict[str, list[BaseMessage]]:
+	conversations = load_conversations()
+	assert conversations, 'no recorded conversations'
+	return conversations
+
+
+def message_manager(messages: list[BaseMessage], tokenizer: Tokenizer, max_input_tokens: int) -> MessageManager:
+	"""Message manager with a copy of the recorded messages, counted by the tokenizer"""
+	state = MessageManagerState()
+	for message in messages:
+		state.history.add_message(message.model_copy(deep=True), MessageMetadata())
+	manager = MessageManager(
+		task='',
+		system_message=messages[0],
+		settings=MessageManagerSettings(max_input_tokens=max_input_tokens),
+		state=state,
+		tokenizer=tokenizer,
+	)
+	for managed in state.history.messages:
+		managed.metadata.tokens = manager._count_tokens(managed.message)
+	state.history.total_tokens = sum(managed.metadata.tokens for managed in state.history.messages)
+	return manager
+
+
+@pytest.mark.parametrize('name', TOKENIZERS)
+def test_counting_throughput(benchmark, conversations, name):
+	tokenizer = TOKENIZERS[name]()
+	managers = [message_manager(messages, tokenizer, 128000) for messages in conversations.values()]
+
+	def count():
+		# every step counts the whole history again, e.g. for the rate limiter
+		return sum(manager._count_tokens(managed.message) for manager in managers for managed in manager.state.history.messages)
+
+	tokens = benchmark(count)
+
+	benchmark.extra_info['tokens'] = tokens
+	assert tokens > 0
+
+
+@pytest.mark.parametrize('name', ['character', 'deepseek', 'tiktoken'])
+def test_trim_accuracy(benchmark, conversations, name):
+	reference = tiktoken_tokenizer()
+	tokenizer = TOKENIZERS[name]()
+
+	overshoot = {}
+	for conversation, messages in conversations.items():
+		reference_tokens = message_manager(messages, reference, 128000).state.history.total_tokens
+		# half of the last state message has to be cut to fit
+		budget = reference_tokens - reference.count_text(str(messages[-1].content)) // 2
+		manager = message_manager(messages, tokenizer, budget)
+
+		benchmark.pedantic(manager.cut_messages, rounds=1, iterations=1)
+
+		trimmed = message_manager(manager.state.history.get_messages(), reference, budget).state.history.total_tokens
+		overshoot[conversation] = round(trimmed / budget - 1, 4)
+
+	# tokens over (positive) or under (negative) the budget after trimming, relative to the budget
+	benchmark.extra_info['overshoot'] = overshoot
+	if name == 'tiktoken':
+		assert all(abs(value) < 0.02 for value in overshoot.values())
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import threading
+from collections import deque
+from typing import Any, Optional
+
+from browser_use.agent.action_trace.views import ActionTraceRecord, TracedElement
+from browser_use.dom.views import DOMElementNode
+
+logger = logging.getLogger(__name__)
+
+
+class _JsonlWriter:
+	"""Appends records to a JSONL file from a daemon thread, so the event loop never blocks on disk"""
+
+	_STOP = object()
+
+	def __init__(self, path: str):
+		self.path = path
+		self._queue: queue.Queue = queue.Queue()
+		self._thread = threading.Thread(target=self._run, name='action-trace-writer', daemon=True)
+		self._thread.start()
+
+	def write(self, record: ActionTraceRecord) -> None:
+		self._queue.put(record)
+
+	def close(self, timeout: Optional[float] = None) -> None:
+		self._queue.put(self._STOP)
+		self._thread.join(timeout)
+
+	def _run(self) -> None:
+		dirname = os.path.dirname(self.path)
+		if dirname:
+			os.makedirs(dirname, exist_ok=True)
+
+		with open(self.path, 'a', encoding='utf-8') as file:
+			while True:
+				item = self._queue.get()
+				if item is self._STOP:
+					return
+				try:
+					file.write(item.model_dump_json() + '\n')
+					# Flush once the queue is drained instead of after every record
+					if self._queue.empty():
+						file.flush()
+				except Exception as e:
+					logger.debug(f'Failed to write action trace record: {e}')
+
+
+class ActionTrace:
+	"""
+	Records the actions of one agent run.
+
+	Keeps the last `max_records` records in memory, older records are dropped. If `jsonl_path`
+	is set every record is also appended to that file by a background thread.
+	"""
+
+	def __init__(self, max_records: int = 1000, jsonl_path: Optional[str] = None):
+		self._records: deque[ActionTraceRecord] = deque(maxlen=max_records)
+		self._writer = _JsonlWriter(jsonl_path) if jsonl_path else None
+		self.step: Optional[int] = None
+
+	def __len__(self) -> int:
+		return len(self._records)
+
+	@property
+	def records(self) -> list[ActionTraceRecord]:
+		return list(self._records)
+
+	def record(
+		self,
+		action: str,
+		params: dict[str, Any],
+		started_at: float,
+		duration: float,
+		url: Optional[str] = None,
+		element: Optional[DOMElementNode] = None,
+		extracted_content: Optional[str] = None,
+		error: Optional[str] = None,
+	) -> ActionTraceRecord:
+		record = ActionTraceRecord(
+			action=action,
+			params=params,
+			step=self.step,
+			url=url,
+			element=TracedElement.from_element(element) if element is not None else None,
+			started_at=started_at,
+			duration=duration,
+			extracted_content=extracted_content,
+			error=error,
+		)
+		self._records.append(record)
+		if self._writer is not None:
+			self._writer.write(record)
+		return record
+
+	def clear(self) -> None:
+		self._records.clear()
+
+	def to_text(self) -> str:
+		"""All records in readable form, e.g. as context for generating a script from the run"""
+		return '\n'.join(record.to_text() for record in self._records)
+
+	def close(self) -> None:
+		"""Write the pending records and stop the writer thread"""
+		if self._writer is not None:
+			self._writer.close()
+			self._writer = None
@@ -0,0 +1,126 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from browser_use.agent.action_trace.service import ActionTrace
+from browser_use.agent.action_trace.views import TracedElement
+from browser_use.agent.views import ActionResult
+from browser_use.controller.service import Controller
+from browser_use.controller.views import ClickElementAction, InputTextAction
+from browser_use.dom.views import DOMElementNode, DOMTextNode
+
+
+@pytest.fixture
+def element():
+	button = DOMElementNode(
+		tag_name='button',
+		xpath='html/body/form/button',
+		attributes={'id': 'submit', 'class': 'btn primary', 'type': 'submit', 'href': '/ignored'},
+		children=[],
+		is_visible=True,
+		parent=None,
+		is_interactive=True,
+		is_top_element=True,
+		highlight_index=3,
+	)
+	button.children.append(DOMTextNode(text='Send', is_visible=True, parent=button))
+	return button
+
+
+@pytest.fixture
+def controller():
+	controller = Controller()
+
+	@controller.action('Press element', param_model=ClickElementAction)
+	async def press(params: ClickElementAction):
+		return f'Pressed {params.index}'
+
+	@controller.action('Fill element', param_model=InputTextAction)
+	async def fill(params: InputTextAction):
+		raise ValueError('element is detached')
+
+	return controller
+
+
+@pytest.fixture
+def browser_context(element):
+	cached_state = SimpleNamespace(url='https://example.com/form', selector_map={3: element})
+	return SimpleNamespace(session=SimpleNamespace(cached_state=cached_state))
+
+
+async def test_act_records_action_with_target_element(controller, browser_context):
+	ActionModel = controller.registry.create_action_model()
+	trace = ActionTrace()
+	trace.step = 2
+
+	result = await controller.act(ActionModel(press={'index': 3}), browser_context, action_trace=trace)
+
+	assert result == ActionResult(extracted_content='Pressed 3')
+	(record,) = trace.records
+	assert record.action == 'press'
+	assert record.params == {'index': 3}
+	assert record.step == 2
+	assert record.url == 'https://example.com/form'
+	assert record.extracted_content == 'Pressed 3'
+	assert record.duration >= 0
+	assert record.element is not None
+	assert record.element.attributes == {'id': 'submit', 'class': 'btn primary', 'type': 'submit'}
+	assert record.element.selectors == [
+		'[id="submit"]',
+		'.btn.primary',
+		'[type="submit"]',
+		'xpath=//html/body/form/button',
+		'text="Send"',
+	]
+	assert '[id="submit"]' in trace.to_text()
+
+
+def test_selectors_escape_attribute_values_and_text():
+	link = DOMElementNode(
+		tag_name='a',
+		xpath='html/body/a',
+		attributes={'id': '1:next', 'class': 'md:flex link', 'title': 'Say "hi" \\ bye'},
+		children=[],
+		is_visible=True,
+		parent=None,
+	)
+	link.children.append(DOMTextNode(text='Next\n"page"', is_visible=True, parent=link))
+
+	assert TracedElement.from_element(link).selectors == [
+		'[id="1:next"]',
+		'.link',
+		'[title="Say \\"hi\\" \\\\ bye"]',
+		'xpath=//html/body/a',
+		'text="Next \\"page\\""',
+	]
+
+
+async def test_act_records_failed_action(controller, browser_context):
+	ActionModel = controller.registry.create_action_model()
+	trace = ActionTrace()
+
+	with pytest.raises(RuntimeError):
+		await controller.act(ActionModel(fill={'index': 3, 'text': 'hello'}), browser_context, action_trace=trace)
+
+	(record,) = trace.records
+	assert record.action == 'fill'
+	assert 'element is detached' in record.error
+
+
+async def test_act_without_trace(controller, browser_context):
+	ActionModel = controller.registry.create_action_model()
+	result = await controller.act(ActionModel(press={'index': 3}), browser_context)
+	assert result.extracted_content == 'Pressed 3'
+
+
+def test_trace_is_bounded_and_spills_to_jsonl(tmp_path):
+	path = tmp_path / 'traces' / 'run.jsonl'
+	trace = ActionTrace(max_records=2, jsonl_path=str(path))
+	for i in range(3):
+		trace.record('scroll_down', {'amount': i}, started_at=0.0, duration=0.1)
+	trace.close()
+
+	assert [record.params['amount'] for record in trace.records] == [1, 2]
+	lines = path.read_text().splitlines()
+	assert [json.loads(line)['params']['amount'] for line in lines] == [0, 1, 2]
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import re
+from typing import Any, Optional
+
+from pydantic import BaseModel, Field
+
+from browser_use.dom.views import DOMElementNode
+
+# Attributes Playwright locators are usually built from
+LOCATOR_ATTRIBUTES = (
+	'id',
+	'class',
+	'name',
+	'type',
+	'value',
+	'placeholder',
+	'role',
+	'aria-label',
+	'data-testid',
+	'title',
+)
+
+# Class names usable in a `.class` selector without escaping, e.g. not Tailwind's `md:flex`
+CSS_IDENTIFIER = re.compile(r'-?[_a-zA-Z][_a-zA-Z0-9-]*')
+
+
+def quote_selector_value(value: str) -> str:
+	"""Double quoted string for attribute and text selectors"""
+	value = value.replace('\\', '\\\\').replace('"', '\\"')
+	# CSS strings can not contain raw newlines
+	value = value.replace('\n', '\\a ').replace('\r', '\\d ')
+	return f'"{value}"'
+
+
+class TracedElement(BaseModel):
+	"""The element an action interacted with, with the selectors Playwright can locate it by"""
+
+	tag_name: str
+	xpath: str
+	attributes: dict[str, str] = Field(default_factory=dict)
+	selectors: list[str] = Field(default_factory=list)
+	text: Optional[str] = None
+	is_interactive: bool = False
+	is_top_element: bool = False
+	is_in_viewport: bool = False
+	viewport_coordinates: Optional[dict[str, Any]] = None
+
+	@classmethod
+	def from_element(cls, element: DOMElementNode) -> TracedElement:
+		attributes = {key: value for key, value in element.attributes.items() if key in LOCATOR_ATTRIBUTES}
+
+		# Most specific selector first
+		selectors = []
+		if 'id' in attributes:
+			# `#id` is invalid for ids starting with a digit or containing `:`
+			selectors.append(f'[id={quote_selector_value(attributes["id"])}]')
+		class_names = [name for name in attributes.get('class', '').split() if CSS_IDENTIFIER.fullmatch(name)]
+		if class_names:
+			selectors.append('.' + '.'.join(class_names))
+		for key, value in attributes.items():
+			if key not in ('id', 'class'):
+				selectors.append(f'[{key}={quote_selector_value(value)}]')
+		selectors.append(f'xpath=//{element.xpath}')
+
+		text = element.get_all_text_till_next_clickable_element(max_depth=1) or None
+		if text and len(text) < 100:
+			# text selectors match whitespace normalized text
+			selectors.append(f'text={quote_selector_value(" ".join(text.split()))}')
+
+		return cls(
+			tag_name=element.tag_name,
+			xpath=element.xpath,
+			attributes=attributes,
+			selectors=selectors,
+			text=text,
+			is_interactive=element.is_interactive,
+			is_top_element=element.is_top_element,
+			is_in_viewport=element.is_in_viewport,
+			viewport_coordinates=element.viewport_coordinates.model_dump() if element.viewport_coordinates else None,
+		)
+
+
+class ActionTraceRecord(BaseModel):
+	"""One executed action of an agent run"""
+
+	action: str
+	params: dict[str, Any] = Field(default_factory=dict)
+	step: Optional[int] = None
+	url: Optional[str] = None
+	element: Optional[TracedElement] = None
+	started_at: float
+	duration: float
+	extracted_content: Optional[str] = None
+	error: Optional[str] = None
+
+	def to_text(self) -> str:
+		"""Readable form of the record, used in prompts"""
+		lines = [f'------------------ {self.action} ------------------']
+		if self.url:
+			lines.append(f'URL: {self.url}')
+		if self.params:
+			lines.append(f'Params: {self.params}')
+		if self.element:
+			lines.append(f'Element: <{self.element.tag_name}>')
+			lines.append(f'Interactive: {self.element.is_interactive}, Top element: {self.element.is_top_element}')
+			if self.element.attributes:
+				lines.append(f'Key attributes: {self.element.attributes}')
+			lines.append('Playwright selectors:')
+			lines.extend(f'  {i}. {selector}' for i, selector in enumerate(self.element.selectors, 1))
+		if self.extracted_content:
+			lines.append(f'Result: {self.extracted_content}')
+		if self.error:
+			lines.append(f'Error: {self.error}')
+		return '\n'.join(lines)
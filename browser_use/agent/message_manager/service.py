@@ -1,4 +1,5 @@
 from __future__ import annotations
+import json
 import logging
 from typing import Dict, List, Optional
 
@@ -9,12 +10,14 @@ from langchain_core.messages import (
 	SystemMessage,
 	ToolMessage,
 )
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from browser_use.agent.message_manager.views import MessageMetadata
 from browser_use.agent.prompts import AgentMessagePrompt
 from browser_use.agent.views import ActionResult, AgentOutput, AgentStepInfo, MessageManagerState
+from browser_use.browser.screenshot import ScreenshotHash
 from browser_use.browser.views import BrowserState
+from browser_use.llm.tokenizer import CharacterTokenizer, Tokenizer
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +29,14 @@ class MessageManagerSettings(BaseModel):
 	message_context: Optional[str] = None
 	sensitive_data: Optional[Dict[str, str]] = None
 	available_file_paths: Optional[List[str]] = None
+	# Keep the last steps verbatim and fold older steps into a compact memory, None keeps every step
+	keep_last_steps: Optional[int] = Field(default=None, ge=1)
+	# Keep the prompt prefix byte-stable for provider-side prompt caching: the plan is only sent with the current state
+	# and compacted steps are folded in batches of keep_last_steps
+	cache_aware_layout: bool = False
+	# Keep the last screenshot in the history and do not send new screenshots whose perceptual hash differs from it
+	# in at most this many of 256 bits, None sends every screenshot with its state message
+	screenshot_unchanged_threshold: Optional[int] = Field(default=None, ge=0)
 
 
 class MessageManager:
@@ -35,11 +46,21 @@ class MessageManager:
 		system_message: SystemMessage,
 		settings: MessageManagerSettings = MessageManagerSettings(),
 		state: MessageManagerState = MessageManagerState(),
+		tokenizer: Optional[Tokenizer] = None,
 	):
 		self.task = task
 		self.settings = settings
 		self.state = state
 		self.system_prompt = system_message
+		# Without the tokenizer of the model the counts are estimated from the settings
+		self.tokenizer = tokenizer or CharacterTokenizer(
+			characters_per_token=settings.estimated_characters_per_token,
+			image_tokens=settings.image_tokens,
+		)
+		# Url of the last state, for the memory of compacted steps
+		self._url: Optional[str] = None
+		# Hash and base64 of the screenshot kept in the history
+		self._screenshot: Optional[tuple[ScreenshotHash, str]] = None
 
 		# Only initialize messages if state is empty
 		if len(self.state.history.messages) == 0:
@@ -110,8 +131,15 @@ class MessageManager:
 		result: Optional[List[ActionResult]] = None,
 		step_info: Optional[AgentStepInfo] = None,
 		use_vision=True,
-	) -> None:
-		"""Add browser state as human message"""
+		screenshot_hash: Optional[ScreenshotHash] = None,
+	) -> Optional[str]:
+		"""
+		Add browser state as human message.
+
+		With screenshot_unchanged_threshold and the `screenshot_hash` of the state, the screenshot is a message of its own
+		which stays in the history. Returns the screenshot in the history if the screen is unchanged, None otherwise.
+		"""
+		self._url = state.url
 
 		# if keep in memory, add to directly to history and add state without result
 		if result:
@@ -119,24 +147,62 @@ class MessageManager:
 				if r.include_in_memory:
 					if r.extracted_content:
 						msg = HumanMessage(content='Action result: ' + str(r.extracted_content))
-						self._add_message_with_tokens(msg)
+						self._add_message_with_tokens(msg, step=self.state.step)
 					if r.error:
 						last_line = r.error.split('\n')[-1]
 						msg = HumanMessage(content='Action error: ' + last_line)
-						self._add_message_with_tokens(msg)
+						self._add_message_with_tokens(msg, step=self.state.step)
 					result = None  # if result in history, we dont want to add it again
 
-		# otherwise add state message and result to next message (which will not stay in memory)
-		state_message = AgentMessagePrompt(
+		prompt = AgentMessagePrompt(
 			state,
 			result,
 			include_attributes=self.settings.include_attributes,
 			step_info=step_info,
-		).get_user_message(use_vision)
+		)
+		threshold = self.settings.screenshot_unchanged_threshold
+		if not (use_vision and state.screenshot and threshold is not None and screenshot_hash is not None):
+			# a kept screenshot would no longer show the current page
+			self._remove_screenshot_message()
+			# otherwise add state message and result to next message (which will not stay in memory)
+			self._add_message_with_tokens(prompt.get_user_message(use_vision))
+			return None
+
+		# compare with the screenshot the model still has in its history, it may have been cut or come from restored state
+		kept = any(m.metadata.screenshot for m in self.state.history.messages)
+		unchanged = kept and self._screenshot is not None and screenshot_hash.matches(self._screenshot[0], threshold)
+		if not unchanged:
+			self._remove_screenshot_message()
+			image_url = f'data:image/{state.screenshot_format};base64,{state.screenshot}'
+			message = HumanMessage(
+				content=[
+					{'type': 'text', 'text': f'Screenshot of {state.url}:'},
+					{'type': 'image_url', 'image_url': {'url': image_url}},
+				]
+			)
+			self._add_message_with_tokens(message, screenshot=True)
+			self._screenshot = (screenshot_hash, state.screenshot)
+
+		state_message = prompt.get_user_message(use_vision=False)
+		if unchanged:
+			state_message.content += '\nScreenshot: the page looks unchanged since the last screenshot above'
+		else:
+			state_message.content += '\nScreenshot: the last screenshot above shows the current page'
 		self._add_message_with_tokens(state_message)
+		return self._screenshot[1] if unchanged else None
+
+	def _remove_screenshot_message(self) -> None:
+		"""Remove the screenshot kept in the history"""
+		messages = self.state.history.messages
+		kept = [m for m in messages if m.metadata.screenshot]
+		if kept:
+			self.state.history.messages = [m for m in messages if not m.metadata.screenshot]
+			self.state.history.total_tokens -= sum(m.metadata.tokens for m in kept)
+		self._screenshot = None
 
 	def add_model_output(self, model_output: AgentOutput) -> None:
 		"""Add model output as AI message"""
+		self.state.step += 1
 		tool_calls = [
 			{
 				'name': 'AgentOutput',
@@ -151,14 +217,87 @@ class MessageManager:
 			tool_calls=tool_calls,
 		)
 
-		self._add_message_with_tokens(msg)
+		self._add_message_with_tokens(msg, step=self.state.step)
 		# empty tool response
-		self.add_tool_message(content='')
+		self.add_tool_message(content='', step=self.state.step)
+
+		keep_last_steps = self.settings.keep_last_steps
+		if keep_last_steps is not None:
+			self.state.step_summaries[self.state.step] = self._summarize_step(model_output)
+			# a new memory message invalidates the cached prompt after it
+			batch = keep_last_steps if self.settings.cache_aware_layout else 1
+			if len(self.state.step_summaries) >= keep_last_steps + batch:
+				self._compact_history(keep_last_steps)
+
+	def _summarize_step(self, model_output: AgentOutput) -> str:
+		"""One line memory of a model output with its actions"""
+		actions = []
+		for action in model_output.action:
+			for name, params in action.model_dump(exclude_unset=True).items():
+				if params is not None:
+					actions.append(f'{name} {json.dumps(params, ensure_ascii=False)}')
+		page = f' on {self._url}' if self._url else ''
+		return f'Step {self.state.step}{page}: {model_output.current_state.next_goal} - {"; ".join(actions)}'
+
+	def _compact_history(self, keep_last_steps: int) -> None:
+		"""Fold the messages of the steps before the last keep_last_steps into one memory message"""
+		last_step = self.state.step - keep_last_steps
+		messages = self.state.history.messages
+		position = next(
+			(
+				i
+				for i, m in enumerate(messages)
+				if m.metadata.memory or (m.metadata.step is not None and m.metadata.step <= last_step)
+			),
+			None,
+		)
+		removed = self.state.history.remove_steps(last_step)
+		if position is None or not removed:
+			return
+
+		for step in sorted({m.metadata.step for m in removed}):
+			# results of the actions which were kept in memory
+			results = [
+				f'  {m.message.content}'
+				for m in removed
+				if m.metadata.step == step and isinstance(m.message, HumanMessage) and isinstance(m.message.content, str)
+			]
+			# step 0 holds the results of the initial actions and the first plan
+			if step or results:
+				self.state.memory.append(self.state.step_summaries.pop(step, f'Step {step}' if step else 'Initial actions'))
+			self.state.memory.extend(results)
+
+		# the memory message takes the place of the first compacted message or of the previous memory
+		messages = self.state.history.messages
+		previous = next((m for m in messages if m.metadata.memory), None)
+		if previous is not None:
+			self.state.history.total_tokens -= previous.metadata.tokens
+			messages.remove(previous)
+		memory = HumanMessage(content=f'[Memory of steps 1-{last_step}]\n' + '\n'.join(self.state.memory))
+		self._add_message_with_tokens(memory, position, memory=True)
+		logger.debug(f'Compacted steps up to {last_step} - total tokens now: {self.state.history.total_tokens}')
 
 	def add_plan(self, plan: Optional[str], position: int = -1) -> None:
-		if plan:
-			msg = AIMessage(content=plan)
-			self._add_message_with_tokens(msg, position)
+		if not plan:
+			return
+		if self.settings.cache_aware_layout:
+			# the plan changes with every planner call, it goes in the trailing state message instead of the history
+			self._append_to_last_message(f'\nCurrent plan: {plan}')
+			return
+		msg = AIMessage(content=plan)
+		self._add_message_with_tokens(msg, position, step=self.state.step)
+
+	def _append_to_last_message(self, text: str) -> None:
+		"""Append text to the last message, e.g. to the current state"""
+		last = self.state.history.messages[-1]
+		message = last.message.model_copy()
+		if isinstance(message.content, list):
+			message.content = [*message.content, {'type': 'text', 'text': text}]
+		else:
+			message.content += text
+		self.state.history.messages.pop()
+		self.state.history.total_tokens -= last.metadata.tokens
+		self._add_message_with_tokens(message, step=last.metadata.step)
 
 	def get_messages(self) -> List[BaseMessage]:
 		"""Get current message list, potentially trimmed to max tokens"""
@@ -176,15 +315,22 @@ class MessageManager:
 
 		return msg
 
-	def _add_message_with_tokens(self, message: BaseMessage, position: int = -1) -> None:
-		"""Add message with token count metadata"""
+	def _add_message_with_tokens(
+		self,
+		message: BaseMessage,
+		position: int = -1,
+		step: Optional[int] = None,
+		screenshot: bool = False,
+		memory: bool = False,
+	) -> None:
+		"""Add message with token count metadata, messages of a step are compacted with the step"""
 
 		# filter out sensitive data from the message
 		if self.settings.sensitive_data:
 			message = self._filter_sensitive_data(message)
 
 		token_count = self._count_tokens(message)
-		metadata = MessageMetadata(tokens=token_count)
+		metadata = MessageMetadata(tokens=token_count, step=step, screenshot=screenshot, memory=memory)
 		self.state.history.add_message(message, metadata, position)
 
 	def _filter_sensitive_data(self, message: BaseMessage) -> BaseMessage:
@@ -214,7 +360,7 @@ class MessageManager:
 		if isinstance(message.content, list):
 			for item in message.content:
 				if 'image_url' in item:
-					tokens += self.settings.image_tokens
+					tokens += self.tokenizer.count_image(item['image_url'])
 				elif isinstance(item, dict) and 'text' in item:
 					tokens += self._count_text_tokens(item['text'])
 		else:
@@ -226,8 +372,7 @@ class MessageManager:
 
 	def _count_text_tokens(self, text: str) -> int:
 		"""Count tokens in a text string"""
-		tokens = len(text) // self.settings.estimated_characters_per_token  # Rough estimate if no tokenizer available
-		return tokens
+		return self.tokenizer.count_text(text)
 
 	def cut_messages(self):
 		"""Get current message list, potentially trimmed to max tokens"""
@@ -243,11 +388,12 @@ class MessageManager:
 			for item in msg.message.content:
 				if 'image_url' in item:
 					msg.message.content.remove(item)
-					diff -= self.settings.image_tokens
-					msg.metadata.tokens -= self.settings.image_tokens
-					self.state.history.total_tokens -= self.settings.image_tokens
+					image_tokens = self.tokenizer.count_image(item['image_url'])
+					diff -= image_tokens
+					msg.metadata.tokens -= image_tokens
+					self.state.history.total_tokens -= image_tokens
 					logger.debug(
-						f'Removed image with {self.settings.image_tokens} tokens - total tokens now: {self.state.history.total_tokens}/{self.settings.max_input_tokens}'
+						f'Removed image with {image_tokens} tokens - total tokens now: {self.state.history.total_tokens}/{self.settings.max_input_tokens}'
 					)
 				elif 'text' in item and isinstance(item, dict):
 					text += item['text']
@@ -290,8 +436,8 @@ class MessageManager:
 		"""Remove last state message from history"""
 		self.state.history.remove_last_state_message()
 
-	def add_tool_message(self, content: str) -> None:
+	def add_tool_message(self, content: str, step: Optional[int] = None) -> None:
 		"""Add tool message to history"""
 		msg = ToolMessage(content=content, tool_call_id=str(self.state.tool_id))
 		self.state.tool_id += 1
-		self._add_message_with_tokens(msg)
+		self._add_message_with_tokens(msg, step=step)
@@ -75,6 +75,9 @@ def _merge_successive_messages(messages: list[BaseMessage], class_to_merge: Type
 		if isinstance(message, class_to_merge):
 			streak += 1
 			if streak > 1:
+				if streak == 2:
+					# merge into a copy, the input messages are the message history and a changed history breaks prompt caching
+					merged_messages[-1] = merged_messages[-1].model_copy()
 				if isinstance(message.content, list):
 					merged_messages[-1].content += message.content[0]['text']  # type:ignore
 				else:
@@ -6,6 +6,8 @@ from langchain_core.load import dumpd, load
 from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
 from pydantic import BaseModel, ConfigDict, Field, model_serializer, model_validator
 
+from browser_use.llm.tokenizer import CharacterTokenizer, Tokenizer
+
 if TYPE_CHECKING:
 	from browser_use.agent.views import AgentOutput
 
@@ -14,6 +16,12 @@ class MessageMetadata(BaseModel):
 	"""Metadata for a message"""
 
 	tokens: int = 0
+	# Messages added after the n-th model output belong to step n, messages before the first output to step 0
+	step: int | None = None
+	# The memory of the compacted steps
+	memory: bool = False
+	# The last screenshot sent to the model, kept while the screen is unchanged
+	screenshot: bool = False
 
 
 class ManagedMessage(BaseModel):
@@ -76,8 +84,9 @@ class MessageHistory(BaseModel):
 			self.messages.insert(position, ManagedMessage(message=message, metadata=metadata))
 		self.total_tokens += metadata.tokens
 
-	def add_model_output(self, output: 'AgentOutput') -> None:
+	def add_model_output(self, output: 'AgentOutput', tokenizer: Tokenizer | None = None) -> None:
 		"""Add model output as AI message"""
+		tokenizer = tokenizer or CharacterTokenizer()
 		tool_calls = [
 			{
 				'name': 'AgentOutput',
@@ -91,11 +100,11 @@ class MessageHistory(BaseModel):
 			content='',
 			tool_calls=tool_calls,
 		)
-		self.add_message(msg, MessageMetadata(tokens=100))  # Estimate tokens for tool calls
+		self.add_message(msg, MessageMetadata(tokens=tokenizer.count_text(str(tool_calls))))
 
 		# Empty tool response
 		tool_message = ToolMessage(content='', tool_call_id='1')
-		self.add_message(tool_message, MessageMetadata(tokens=10))  # Estimate tokens for empty response
+		self.add_message(tool_message, MessageMetadata(tokens=0))
 
 	def get_messages(self) -> list[BaseMessage]:
 		"""Get all messages"""
@@ -113,6 +122,14 @@ class MessageHistory(BaseModel):
 				self.messages.pop(i)
 				break
 
+	def remove_steps(self, last_step: int) -> list[ManagedMessage]:
+		"""Remove the messages of steps 0 to last_step from history"""
+		removed = [m for m in self.messages if m.metadata.step is not None and m.metadata.step <= last_step]
+		if removed:
+			self.messages = [m for m in self.messages if not (m.metadata.step is not None and m.metadata.step <= last_step)]
+			self.total_tokens -= sum(m.metadata.tokens for m in removed)
+		return removed
+
 	def remove_last_state_message(self) -> None:
 		"""Remove last state message from history"""
 		if len(self.messages) > 2 and isinstance(self.messages[-1].message, HumanMessage):
@@ -125,5 +142,10 @@ class MessageManagerState(BaseModel):
 
 	history: MessageHistory = Field(default_factory=MessageHistory)
 	tool_id: int = 1
+	# Model outputs so far
+	step: int = 0
+	# Summary of every step which is not compacted yet, and the memory of the compacted steps
+	step_summaries: dict[int, str] = Field(default_factory=dict)
+	memory: list[str] = Field(default_factory=list)
 
 	model_config = ConfigDict(arbitrary_types_allowed=True)
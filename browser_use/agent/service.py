@@ -1,9 +1,12 @@
 from __future__ import annotations
 
 import asyncio
+import base64
+import dataclasses
 import json
 import logging
 import re
+import time
 from pathlib import Path
 from typing import Any, Awaitable, Callable, Dict, Generic, List, Optional, Type, TypeVar
 
@@ -18,6 +21,7 @@ from langchain_core.messages import (
 # from lmnr.sdk.decorators import observe
 from pydantic import BaseModel, ValidationError
 
+from browser_use.agent.action_trace.service import ActionTrace
 from browser_use.agent.gif import create_history_gif
 from browser_use.agent.message_manager.service import MessageManager, MessageManagerSettings
 from browser_use.agent.message_manager.utils import convert_input_messages, extract_json_from_model_output, save_conversation
@@ -31,10 +35,12 @@ from browser_use.agent.views import (
 	AgentSettings,
 	AgentState,
 	AgentStepInfo,
+	StepMetadata,
 	ToolCallingMethod,
 )
 from browser_use.browser.browser import Browser
 from browser_use.browser.context import BrowserContext
+from browser_use.browser.screenshot import ScreenshotHash, hash_screenshot
 from browser_use.browser.views import BrowserState, BrowserStateHistory
 from browser_use.controller.registry.views import ActionModel
 from browser_use.controller.service import Controller
@@ -42,13 +48,16 @@ from browser_use.dom.history_tree_processor.service import (
 	DOMHistoryElement,
 	HistoryTreeProcessor,
 )
+from browser_use.llm.rate_limiter import is_rate_limit_error
+from browser_use.llm.service import LLMInvoker
+from browser_use.llm.tokenizer import get_tokenizer, prompt_usage
 from browser_use.telemetry.service import ProductTelemetry
 from browser_use.telemetry.views import (
 	AgentEndTelemetryEvent,
 	AgentRunTelemetryEvent,
 	AgentStepTelemetryEvent,
 )
-from browser_use.utils import time_execution_async
+from browser_use.utils import collect_timings, get_version_and_source, time_execution_async, timer
 
 load_dotenv()
 logger = logging.getLogger(__name__)
@@ -88,6 +97,8 @@ class Agent(Generic[Context]):
 		initial_actions: Optional[List[Dict[str, Dict[str, Any]]]] = None,
 		# Cloud Callbacks
 		register_new_step_callback: Callable[['BrowserState', 'AgentOutput', int], Awaitable[None]] | None = None,
+		# Called with every streamed chunk of the model output and the step number, enables streaming
+		register_new_token_callback: Callable[[str, int], Awaitable[None]] | None = None,
 		register_done_callback: Callable[['AgentHistoryList'], Awaitable[None]] | None = None,
 		register_external_agent_status_raise_error_callback: Callable[[], Awaitable[bool]] | None = None,
 		# Agent settings
@@ -99,6 +110,12 @@ class Agent(Generic[Context]):
 		retry_delay: int = 10,
 		system_prompt_class: Type[SystemPrompt] = SystemPrompt,
 		max_input_tokens: int = 128000,
+		# Keep the last steps in the prompt and compact older steps into a memory, None keeps every step
+		keep_last_steps: Optional[int] = None,
+		# Keep the prompt prefix stable for the prompt cache of the provider, see MessageManagerSettings
+		cache_aware_layout: bool = False,
+		# Do not resend screenshots whose perceptual hash is this close to the last one, see MessageManagerSettings
+		screenshot_unchanged_threshold: Optional[int] = None,
 		validate_output: bool = False,
 		message_context: Optional[str] = None,
 		generate_gif: bool | str = False,
@@ -120,10 +137,12 @@ class Agent(Generic[Context]):
 		page_extraction_llm: Optional[BaseChatModel] = None,
 		planner_llm: Optional[BaseChatModel] = None,
 		planner_interval: int = 1,  # Run planner every N steps
+		llm_timeout: Optional[float] = 120.0,
 		# Inject state
 		injected_agent_state: Optional[AgentState] = None,
 		#
 		context: Context | None = None,
+		action_trace: Optional[ActionTrace] = None,
 	):
 		self.settings = AgentSettings(
 			use_vision=use_vision,
@@ -134,6 +153,9 @@ class Agent(Generic[Context]):
 			retry_delay=retry_delay,
 			system_prompt_class=system_prompt_class,
 			max_input_tokens=max_input_tokens,
+			keep_last_steps=keep_last_steps,
+			cache_aware_layout=cache_aware_layout,
+			screenshot_unchanged_threshold=screenshot_unchanged_threshold,
 			validate_output=validate_output,
 			message_context=message_context,
 			generate_gif=generate_gif,
@@ -144,11 +166,16 @@ class Agent(Generic[Context]):
 			page_extraction_llm=page_extraction_llm,
 			planner_llm=planner_llm,
 			planner_interval=planner_interval,
+			llm_timeout=llm_timeout,
 		)
 
 		# Initialize state
 		self.state = injected_agent_state or AgentState()
 
+		# Model setup, the message manager counts tokens with the tokenizer of the model
+		self.llm = llm
+		self._set_model_names()
+
 		# Initialize message manager with state
 		self._message_manager = MessageManager(
 			task=task,
@@ -158,17 +185,22 @@ class Agent(Generic[Context]):
 			).get_system_message(),
 			settings=MessageManagerSettings(
 				max_input_tokens=self.settings.max_input_tokens,
+				keep_last_steps=self.settings.keep_last_steps,
+				cache_aware_layout=self.settings.cache_aware_layout,
+				screenshot_unchanged_threshold=self.settings.screenshot_unchanged_threshold,
 				include_attributes=self.settings.include_attributes,
 				message_context=self.settings.message_context,
 				sensitive_data=sensitive_data,
 				available_file_paths=self.settings.available_file_paths,
 			),
 			state=self.state.message_manager_state,
+			tokenizer=get_tokenizer(self.model_name),
 		)
 
 		# Core components
 		self.task = task
-		self.llm = llm
+		# All model calls go through the invoker, stop() cancels the calls in flight
+		self.llm_invoker = LLMInvoker(timeout=self.settings.llm_timeout)
 		self.controller = controller
 		self.sensitive_data = sensitive_data
 
@@ -186,6 +218,7 @@ class Agent(Generic[Context]):
 
 		# Callbacks
 		self.register_new_step_callback = register_new_step_callback
+		self.register_new_token_callback = register_new_token_callback
 		self.register_done_callback = register_done_callback
 		self.register_external_agent_status_raise_error_callback = register_external_agent_status_raise_error_callback
 
@@ -195,12 +228,20 @@ class Agent(Generic[Context]):
 		self.initial_actions = self._convert_initial_actions(initial_actions) if initial_actions else None
 
 		# Model setup
-		self._set_model_names()
 		self.tool_calling_method = self.set_tool_calling_method(self.settings.tool_calling_method)
 
 		# Context
 		self.context = context
 
+		# Latency of the last model call, see StepMetadata.time_to_first_token
+		self._llm_call_start_time: float | None = None
+		self._time_to_first_token: float | None = None
+		# Usage of the last model call as reported by the provider, see StepMetadata.cached_input_tokens
+		self._usage: dict[str, int] = {}
+
+		# Executed actions with their target elements, e.g. to generate a script from the run
+		self.action_trace = action_trace if action_trace is not None else ActionTrace()
+
 		# Telemetry
 		self.telemetry = ProductTelemetry()
 
@@ -209,23 +250,8 @@ class Agent(Generic[Context]):
 
 	def _set_browser_use_version_and_source(self) -> None:
 		"""Get the version and source of the browser-user package (git or pip in a nutshell)"""
-		try:
-			import pkg_resources
-
-			version = pkg_resources.get_distribution('browser-user').version
-			source = 'pip'
-		except Exception:
-			try:
-				import subprocess
-
-				version = subprocess.check_output(['git', 'describe', '--tags']).decode('utf-8').strip()
-				source = 'git'
-			except Exception:
-				version = 'unknown'
-				source = 'unknown'
-		logger.debug(f'Version: {version}, Source: {source}')
-		self.version = version
-		self.source = source
+		self.version, self.source = get_version_and_source()
+		logger.debug(f'Version: {self.version}, Source: {self.source}')
 
 	def _set_model_names(self) -> None:
 		self.chat_model_library = self.llm.__class__.__name__
@@ -284,86 +310,121 @@ class Agent(Generic[Context]):
 	@time_execution_async('--step')
 	async def step(self, step_info: Optional[AgentStepInfo] = None) -> None:
 		"""Execute one step of the task"""
-		logger.info(f'📍 Step {self.state.n_steps}')
-		state = None
-		model_output = None
-		result: list[ActionResult] = []
-
-		try:
-			state = await self.browser_context.get_state()
-
-			await self._raise_if_stopped_or_paused()
-
-			self._message_manager.add_state_message(state, self.state.last_result, step_info, self.settings.use_vision)
+		with collect_timings() as timings:
+			logger.info(f'📍 Step {self.state.n_steps}')
+			state = None
+			model_output = None
+			result: list[ActionResult] = []
+			step_start_time = time.time()
+			input_tokens = 0
+			self._time_to_first_token = None
+			self._usage = {}
 
-			# Run planner at specified intervals if planner is configured
-			if self.settings.planner_llm and self.state.n_steps % self.settings.planner_interval == 0:
-				plan = await self._run_planner()
-				# add plan before last state message
-				self._message_manager.add_plan(plan, position=-1)
+			try:
+				state = await self.browser_context.get_state()
 
-			input_messages = self._message_manager.get_messages()
+				await self._raise_if_stopped_or_paused()
 
-			try:
-				## TODO next goal
-				model_output = await self.get_next_action(input_messages)
+				with timer('prompt_build'):
+					screenshot_hash = await self._hash_screenshot(state)
+					sent_screenshot = self._message_manager.add_state_message(
+						state, self.state.last_result, step_info, self.settings.use_vision, screenshot_hash
+					)
+				if sent_screenshot is not None:
+					# the history keeps the unchanged screenshot which was sent instead of another copy
+					state = dataclasses.replace(state, screenshot=sent_screenshot)
+
+				# Run planner at specified intervals if planner is configured
+				if self.settings.planner_llm and self.state.n_steps % self.settings.planner_interval == 0:
+					with timer('planner_call'):
+						self.state.last_plan = await self._run_planner()
+					# add plan before last state message
+					self._message_manager.add_plan(self.state.last_plan, position=-1)
+				elif self.settings.cache_aware_layout:
+					# the plan is not kept in the history, repeat it until the next planner call
+					self._message_manager.add_plan(self.state.last_plan)
+
+				input_messages = self._message_manager.get_messages()
+				input_tokens = self._message_manager.state.history.total_tokens
 
-				self.state.n_steps += 1
+				try:
+					## TODO next goal
+					with timer('llm_call'):
+						model_output = await self.get_next_action(input_messages)
 
-				if self.register_new_step_callback:
-					await self.register_new_step_callback(state, model_output, self.state.n_steps)
+					self.state.n_steps += 1
 
-				if self.settings.save_conversation_path:
-					target = self.settings.save_conversation_path + f'_{self.state.n_steps}.txt'
-					save_conversation(input_messages, model_output, target, self.settings.save_conversation_path_encoding)
+					if self.register_new_step_callback:
+						await self.register_new_step_callback(state, model_output, self.state.n_steps)
 
-				self._message_manager._remove_last_state_message()  # we dont want the whole state in the chat history
+					if self.settings.save_conversation_path:
+						target = self.settings.save_conversation_path + f'_{self.state.n_steps}.txt'
+						save_conversation(input_messages, model_output, target, self.settings.save_conversation_path_encoding)
 
-				await self._raise_if_stopped_or_paused()
+					self._message_manager._remove_last_state_message()  # we dont want the whole state in the chat history
 
-				self._message_manager.add_model_output(model_output)
-			except Exception as e:
-				# model call failed, remove last state message from history
-				self._message_manager._remove_last_state_message()
-				raise e
+					await self._raise_if_stopped_or_paused()
 
-			result: list[ActionResult] = await self.multi_act(model_output.action)
+					self._message_manager.add_model_output(model_output)
+				except Exception as e:
+					# model call failed, remove last state message from history
+					self._message_manager._remove_last_state_message()
+					raise e
 
-			self.state.last_result = result
+				result: list[ActionResult] = await self.multi_act(model_output.action)
 
-			if len(result) > 0 and result[-1].is_done:
-				logger.info(f'📄 Result: {result[-1].extracted_content}')
+				self.state.last_result = result
 
-			self.state.consecutive_failures = 0
+				if len(result) > 0 and result[-1].is_done:
+					logger.info(f'📄 Result: {result[-1].extracted_content}')
 
-		except InterruptedError:
-			logger.debug('Agent paused')
-			self.state.last_result = [
-				ActionResult(
-					error='The agent was paused - now continuing actions might need to be repeated', include_in_memory=True
-				)
-			]
-			return
-		except Exception as e:
-			result = await self._handle_step_error(e)
-			self.state.last_result = result
+				self.state.consecutive_failures = 0
 
-		finally:
-			actions = [a.model_dump(exclude_unset=True) for a in model_output.action] if model_output else []
-			self.telemetry.capture(
-				AgentStepTelemetryEvent(
-					agent_id=self.state.agent_id,
-					step=self.state.n_steps,
-					actions=actions,
-					consecutive_failures=self.state.consecutive_failures,
-					step_error=[r.error for r in result if r.error] if result else ['No result'],
-				)
-			)
-			if not result:
+			except InterruptedError:
+				logger.debug('Agent paused')
+				self.state.last_result = [
+					ActionResult(
+						error='The agent was paused - now continuing actions might need to be repeated', include_in_memory=True
+					)
+				]
 				return
+			except Exception as e:
+				result = await self._handle_step_error(e)
+				self.state.last_result = result
 
-			if state:
-				self._make_history_item(model_output, state, result)
+			finally:
+				actions = [a.model_dump(exclude_unset=True) for a in model_output.action] if model_output else []
+				self.telemetry.capture(
+					AgentStepTelemetryEvent(
+						agent_id=self.state.agent_id,
+						step=self.state.n_steps,
+						actions=actions,
+						consecutive_failures=self.state.consecutive_failures,
+						step_error=[r.error for r in result if r.error] if result else ['No result'],
+					)
+				)
+				if not result:
+					return
+
+				if state:
+					metadata = StepMetadata(
+						step_number=self.state.n_steps,
+						step_start_time=step_start_time,
+						step_end_time=time.time(),
+						input_tokens=input_tokens,
+						time_to_first_token=self._time_to_first_token,
+						reported_input_tokens=self._usage.get('input_tokens'),
+						cached_input_tokens=self._usage.get('cached_input_tokens'),
+						timings=timings,
+					)
+					self._make_history_item(model_output, state, result, metadata)
+
+	async def _hash_screenshot(self, state: BrowserState) -> Optional[ScreenshotHash]:
+		"""Perceptual hash of the screenshot if unchanged screenshots are not resent"""
+		if self.settings.screenshot_unchanged_threshold is None or not self.settings.use_vision or not state.screenshot:
+			return None
+		# Decoding the screenshot takes milliseconds, keep it off the event loop
+		return await asyncio.to_thread(lambda: hash_screenshot(base64.b64decode(state.screenshot)))
 
 	async def _handle_step_error(self, error: Exception) -> list[ActionResult]:
 		"""Handle all types of errors that can occur during a step"""
@@ -385,17 +446,13 @@ class Agent(Generic[Context]):
 				error_msg += '\n\nReturn a valid JSON object with the required fields.'
 
 			self.state.consecutive_failures += 1
+		elif is_rate_limit_error(error):
+			# The invoker already retried with backoff and blocked the rate limiter until the provider accepts
+			# requests again, the next step waits there. Waiting for the provider is not a failure of the agent.
+			logger.warning(f'⏳ Rate limited, retrying in the next step: {error_msg}')
 		else:
-			from google.api_core.exceptions import ResourceExhausted
-			from openai import RateLimitError
-
-			if isinstance(error, RateLimitError) or isinstance(error, ResourceExhausted):
-				logger.warning(f'{prefix}{error_msg}')
-				await asyncio.sleep(self.settings.retry_delay)
-				self.state.consecutive_failures += 1
-			else:
-				logger.error(f'{prefix}{error_msg}')
-				self.state.consecutive_failures += 1
+			logger.error(f'{prefix}{error_msg}')
+			self.state.consecutive_failures += 1
 
 		return [ActionResult(error=error_msg, include_in_memory=True)]
 
@@ -404,6 +461,7 @@ class Agent(Generic[Context]):
 		model_output: AgentOutput | None,
 		state: BrowserState,
 		result: list[ActionResult],
+		metadata: Optional[StepMetadata] = None,
 	) -> None:
 		"""Create and store history item"""
 
@@ -418,9 +476,10 @@ class Agent(Generic[Context]):
 			tabs=state.tabs,
 			interacted_element=interacted_elements,
 			screenshot=state.screenshot,
+			screenshot_format=state.screenshot_format,
 		)
 
-		history_item = AgentHistory(model_output=model_output, result=result, state=state_history)
+		history_item = AgentHistory(model_output=model_output, result=result, state=state_history, metadata=metadata)
 
 		self.state.history.history.append(history_item)
 
@@ -433,9 +492,17 @@ class Agent(Generic[Context]):
 	@time_execution_async('--get_next_action')
 	async def get_next_action(self, input_messages: list[BaseMessage]) -> AgentOutput:
 		"""Get next action from LLM based on current state"""
+		self._llm_call_start_time = time.time()
+		self._time_to_first_token = None
 		if self.model_name == 'deepseek-reasoner' or self.model_name.startswith('deepseek-r1'):
 			converted_input_messages = convert_input_messages(input_messages, self.model_name)
-			output = self.llm.invoke(converted_input_messages)
+			if self.register_new_token_callback:
+				output = await self._stream_model_output(converted_input_messages)
+			else:
+				output = await self.llm_invoker.ainvoke(
+					self.llm, converted_input_messages, name='get_next_action', tokens=self._input_tokens()
+				)
+			self._usage = prompt_usage(output)
 			output.content = self._remove_think_tags(str(output.content))
 			# TODO: currently invoke does not return reasoning_content, we should override invoke
 			try:
@@ -444,14 +511,25 @@ class Agent(Generic[Context]):
 			except (ValueError, ValidationError) as e:
 				logger.warning(f'Failed to parse model output: {output} {str(e)}')
 				raise ValueError('Could not parse response.')
-		elif self.tool_calling_method is None:
-			structured_llm = self.llm.with_structured_output(self.AgentOutput, include_raw=True)
-			response: dict[str, Any] = await structured_llm.ainvoke(input_messages)  # type: ignore
-			parsed: AgentOutput | None = response['parsed']
 		else:
-			structured_llm = self.llm.with_structured_output(self.AgentOutput, include_raw=True, method=self.tool_calling_method)
-			response: dict[str, Any] = await structured_llm.ainvoke(input_messages)  # type: ignore
+			if self.tool_calling_method is None:
+				structured_llm = self.llm.with_structured_output(self.AgentOutput, include_raw=True)
+			else:
+				structured_llm = self.llm.with_structured_output(
+					self.AgentOutput, include_raw=True, method=self.tool_calling_method
+				)
+			if self.register_new_token_callback:
+				response = await self._stream_structured_output(structured_llm, input_messages)
+			else:
+				response: dict[str, Any] = await self.llm_invoker.ainvoke(
+					structured_llm, input_messages, name='get_next_action', tokens=self._input_tokens()
+				)
 			parsed: AgentOutput | None = response['parsed']
+			self._usage = prompt_usage(response.get('raw'))
+
+		if self._time_to_first_token is None:
+			# Not streamed, the first byte arrived with the complete response
+			self._time_to_first_token = time.time() - self._llm_call_start_time
 
 		if parsed is None:
 			raise ValueError('Could not parse response.')
@@ -463,6 +541,50 @@ class Agent(Generic[Context]):
 
 		return parsed
 
+	def _input_tokens(self) -> int:
+		"""Input tokens of the next model call as counted by the message manager, used for the rate limits"""
+		return self._message_manager.state.history.total_tokens
+
+	async def _stream_model_output(self, input_messages: list[BaseMessage]) -> BaseMessage:
+		"""Stream the plain model output, every chunk is passed to the token callback"""
+		output = None
+		stream = self.llm_invoker.astream(self.llm, input_messages, name='get_next_action', tokens=self._input_tokens())
+		async for chunk in stream:
+			await self._on_new_token(chunk)
+			output = chunk if output is None else output + chunk
+		if output is None:
+			raise ValueError('Could not parse response.')
+		return output
+
+	async def _stream_structured_output(self, structured_llm: Any, input_messages: list[BaseMessage]) -> dict[str, Any]:
+		"""
+		Stream a structured output runnable. The runnable only emits the raw message once it is complete,
+		so the chunks are taken from the events of the chat model inside it.
+		"""
+		response: dict[str, Any] = {'parsed': None}
+		async for event in self.llm_invoker.astream_events(
+			structured_llm, input_messages, name='get_next_action', tokens=self._input_tokens(), version='v2'
+		):
+			if event['event'] == 'on_chat_model_stream':
+				await self._on_new_token(event['data']['chunk'])
+			elif event['event'] == 'on_chain_end' and not event['parent_ids']:
+				response = event['data']['output']
+		return response
+
+	async def _on_new_token(self, chunk: BaseMessage) -> None:
+		# Tool calls stream their arguments as partial JSON instead of content
+		if isinstance(chunk.content, str) and chunk.content:
+			text = chunk.content
+		else:
+			text = ''.join(tool_call['args'] or '' for tool_call in getattr(chunk, 'tool_call_chunks', []))
+		if not text:
+			return
+
+		if self._time_to_first_token is None and self._llm_call_start_time is not None:
+			self._time_to_first_token = time.time() - self._llm_call_start_time
+		if self.register_new_token_callback:
+			await self.register_new_token_callback(text, self.state.n_steps)
+
 	def _log_agent_run(self) -> None:
 		"""Log the agent run"""
 		logger.info(f'🚀 Starting task: {self.task}')
@@ -596,14 +718,19 @@ class Agent(Generic[Context]):
 
 			await self._raise_if_stopped_or_paused()
 
-			result = await self.controller.act(
-				action,
-				self.browser_context,
-				self.settings.page_extraction_llm,
-				self.sensitive_data,
-				self.settings.available_file_paths,
-				context=self.context,
-			)
+			self.action_trace.step = self.state.n_steps
+			action_name = next(iter(action.model_dump(exclude_unset=True)), 'unknown')
+			with timer(f'action.{action_name}'):
+				result = await self.controller.act(
+					action,
+					self.browser_context,
+					self.settings.page_extraction_llm,
+					self.sensitive_data,
+					self.settings.available_file_paths,
+					context=self.context,
+					action_trace=self.action_trace,
+					llm_invoker=self.llm_invoker,
+				)
 
 			results.append(result)
 
@@ -611,7 +738,8 @@ class Agent(Generic[Context]):
 			if results[-1].is_done or results[-1].error or i == len(actions) - 1:
 				break
 
-			await asyncio.sleep(self.browser_context.config.wait_between_actions)
+			with timer('sleep'):
+				await asyncio.sleep(self.browser_context.config.wait_between_actions)
 			# hash all elements. if it is a subset of cached_state its fine - else break (new elements on page)
 
 		return results
@@ -650,7 +778,7 @@ class Agent(Generic[Context]):
 			reason: str
 
 		validator = self.llm.with_structured_output(ValidationResult, include_raw=True)
-		response: dict[str, Any] = await validator.ainvoke(msg)  # type: ignore
+		response: dict[str, Any] = await self.llm_invoker.ainvoke(validator, msg, name='validate_output')
 		parsed: ValidationResult = response['parsed']
 		is_valid = parsed.is_valid
 		if not is_valid:
@@ -801,6 +929,7 @@ class Agent(Generic[Context]):
 		"""Stop the agent"""
 		logger.info('⏹️ Agent stopping')
 		self.state.stopped = True
+		self.llm_invoker.cancel()
 
 	def _convert_initial_actions(self, actions: List[Dict[str, Dict[str, Any]]]) -> List[ActionModel]:
 		"""Convert dictionary-based actions to ActionModel instances"""
@@ -856,7 +985,7 @@ class Agent(Generic[Context]):
 		# Get planner output
 		##TODO 调用 AI
 		logger.info("调用AI的提示词 : "+planner_messages.__str__())
-		response = await self.settings.planner_llm.ainvoke(planner_messages)
+		response = await self.llm_invoker.ainvoke(self.settings.planner_llm, planner_messages, name='planner')
 		plan = str(response.content)
 		logger.info("调用AI后输出 : " + plan)
 		# if deepseek-reasoner, remove think tags
@@ -1,16 +1,40 @@
+import asyncio
+import base64
+import dataclasses
+import gc
+import json
+import weakref
+from types import SimpleNamespace
+from typing import Optional
+
+import httpx
 import pytest
-
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGenerationChunk
+from langchain_openai import ChatOpenAI
+from pydantic import SecretStr
+
+from browser_use.agent.message_manager.service import MessageManager, MessageManagerSettings
+from browser_use.agent.message_manager.utils import convert_input_messages
+from browser_use.agent.prompts import AgentMessagePrompt
+from browser_use.agent.service import Agent
 from browser_use.agent.views import (
 	ActionResult,
 	AgentBrain,
 	AgentHistory,
 	AgentHistoryList,
 	AgentOutput,
+	MessageManagerState,
+	StepMetadata,
 )
+from browser_use.browser.screenshot import ScreenshotHash
 from browser_use.browser.views import BrowserState, BrowserStateHistory, TabInfo
 from browser_use.controller.registry.service import Registry
+from browser_use.controller.service import Controller
 from browser_use.controller.views import ClickElementAction, DoneAction, ExtractPageContentAction
 from browser_use.dom.views import DOMElementNode
+from browser_use.utils import add_timing_hook, collect_timings, remove_timing_hook, timer
 
 
 @pytest.fixture
@@ -198,3 +222,483 @@ def test_action_creation(action_registry):
 
 # run this with:
 # pytest browser_use/agent/tests.py
+
+
+AGENT_OUTPUT = {
+	'current_state': {'page_summary': '', 'evaluation_previous_goal': 'Success', 'memory': '', 'next_goal': 'Finish'},
+	'action': [{'done': {'text': 'ok'}}],
+}
+
+
+class StreamingChatModel(BaseChatModel):
+	"""Streams AGENT_OUTPUT in small chunks, as content or as tool call arguments"""
+
+	model_name: str = 'fake'
+	as_tool_call: bool = True
+	usage: Optional[dict] = None
+
+	@property
+	def _llm_type(self) -> str:
+		return 'streaming-fake'
+
+	def bind_tools(self, tools, **kwargs):
+		return self.bind(tools=tools, **kwargs)
+
+	def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+		raise AssertionError('The model should be streamed')
+
+	async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+		payload = json.dumps(AGENT_OUTPUT)
+		for i in range(0, len(payload), 16):
+			if self.as_tool_call:
+				message = AIMessageChunk(
+					content='',
+					tool_call_chunks=[
+						{'name': 'AgentOutput' if i == 0 else None, 'args': payload[i : i + 16], 'id': '1', 'index': 0}
+					],
+				)
+			else:
+				message = AIMessageChunk(content=payload[i : i + 16])
+			if self.usage and i + 16 >= len(payload):
+				message.usage_metadata = self.usage
+			chunk = ChatGenerationChunk(message=message)
+			if run_manager:
+				await run_manager.on_llm_new_token(message.content, chunk=chunk)
+			yield chunk
+
+
+@pytest.mark.parametrize(
+	'llm,tool_calling_method',
+	[
+		(StreamingChatModel(), None),
+		(StreamingChatModel(model_name='deepseek-reasoner', as_tool_call=False), None),
+	],
+)
+async def test_get_next_action_streams_tokens(llm, tool_calling_method):
+	tokens = []
+
+	async def on_token(token: str, step: int):
+		tokens.append(token)
+
+	agent = Agent(
+		task='Finish',
+		llm=llm,
+		browser_context=SimpleNamespace(),
+		tool_calling_method=tool_calling_method,
+		register_new_token_callback=on_token,
+	)
+	output = await agent.get_next_action([HumanMessage(content='Finish')])
+
+	assert len(tokens) > 1
+	assert json.loads(''.join(tokens)) == AGENT_OUTPUT
+	assert output.action[0].model_dump(exclude_unset=True) == {'done': {'text': 'ok'}}
+	assert agent._time_to_first_token is not None
+
+
+def test_step_metadata_in_history_dump():
+	metadata = StepMetadata(step_number=1, step_start_time=10.0, step_end_time=12.5, input_tokens=300, time_to_first_token=0.4)
+	state = BrowserStateHistory(url='https://example.com', title='Example', tabs=[], interacted_element=[])
+	history = AgentHistoryList(
+		history=[
+			AgentHistory(model_output=None, result=[], state=state, metadata=metadata),
+			AgentHistory(model_output=None, result=[], state=state),
+		]
+	)
+
+	dump = history.model_dump()
+
+	assert dump['history'][0]['metadata']['time_to_first_token'] == 0.4
+	assert dump['history'][1]['metadata'] is None
+	assert metadata.duration_seconds == 2.5
+
+
+class FakeBrowserContext:
+	config = SimpleNamespace(wait_between_actions=0)
+
+	def __init__(self, state: BrowserState):
+		self.state = state
+
+	async def get_state(self) -> BrowserState:
+		with timer('network_wait'):
+			await asyncio.sleep(0.01)
+		return self.state
+
+	async def get_selector_map(self):
+		return {}
+
+	async def remove_highlights(self):
+		pass
+
+
+async def test_step_records_phase_timings(sample_browser_state):
+	exported = []
+
+	def export(name: str, seconds: float):
+		exported.append(name)
+
+	add_timing_hook(export)
+
+	async def on_token(token: str, step: int):
+		pass
+
+	try:
+		agent = Agent(
+			task='Finish',
+			llm=StreamingChatModel(),
+			browser_context=FakeBrowserContext(sample_browser_state),
+			register_new_token_callback=on_token,
+		)
+		await agent.step()
+	finally:
+		remove_timing_hook(export)
+
+	timings = agent.state.history.history[0].metadata.timings
+	assert {'network_wait', 'prompt_build', 'llm_call', 'action.done'} <= set(timings)
+	assert timings['network_wait'] >= 0.01
+	assert set(exported) == set(timings)
+
+	summary = agent.state.history.timing_summary()
+	assert summary['step']['count'] == 1
+	assert summary['network_wait']['p95'] == timings['network_wait']
+
+
+def test_timer_without_collector_or_hooks_records_nothing():
+	with timer('outside'):
+		pass
+
+	with collect_timings() as timings:
+		with timer('inside'):
+			pass
+		with timer('inside'):
+			pass
+
+	assert list(timings) == ['inside']
+
+
+def test_action_models_are_reused_until_registry_changes():
+	controller = Controller()
+	first = Agent(task='Finish', llm=StreamingChatModel(), browser_context=SimpleNamespace(), controller=controller)
+	second = Agent(task='Finish', llm=StreamingChatModel(), browser_context=SimpleNamespace(), controller=controller)
+
+	assert second.ActionModel is first.ActionModel
+	assert second.AgentOutput is first.AgentOutput
+
+	@controller.action('Say hello')
+	def say_hello(name: str):
+		return ActionResult(extracted_content=f'Hello {name}')
+
+	third = Agent(task='Finish', llm=StreamingChatModel(), browser_context=SimpleNamespace(), controller=controller)
+
+	assert third.ActionModel is not first.ActionModel
+	assert 'say_hello' in third.ActionModel.model_fields
+	assert 'say_hello' in controller.registry.get_prompt_description()
+
+
+def test_output_models_of_discarded_controllers_are_freed():
+	action_model = Controller().registry.create_action_model()
+	output_model = weakref.ref(AgentOutput.type_with_custom_actions(action_model))
+	assert AgentOutput.type_with_custom_actions(action_model) is output_model()
+	action_model = weakref.ref(action_model)
+
+	# Agents which each build their own controller
+	for _ in range(AgentOutput.type_with_custom_actions.cache_info().maxsize):
+		AgentOutput.type_with_custom_actions(Controller().registry.create_action_model())
+	gc.collect()
+
+	assert action_model() is None
+	assert output_model() is None
+
+
+def test_history_keeps_last_steps_and_compacts_older_steps(sample_browser_state, action_registry):
+	manager = MessageManager(
+		task='Collect the prices',
+		system_message=SystemMessage(content='You are a browser agent'),
+		settings=MessageManagerSettings(keep_last_steps=2),
+		state=MessageManagerState(),
+	)
+	initial = len(manager.state.history.messages)
+	AgentOutputModel = AgentOutput.type_with_custom_actions(action_registry)
+
+	result = None
+	for step in range(1, 6):
+		manager.add_state_message(sample_browser_state, result, use_vision=False)
+		manager._remove_last_state_message()
+		output = AgentOutputModel(
+			current_state=AgentBrain(page_summary='', evaluation_previous_goal='', memory='', next_goal=f'Goal {step}'),
+			action=[action_registry(click_element={'index': step})],
+		)
+		manager.add_model_output(output)
+		result = [ActionResult(extracted_content=f'Price {step}', include_in_memory=True)]
+
+	messages = manager.state.history.messages
+	memory = messages[initial]
+	assert [m.metadata.step for m in messages[initial:]] == [None, 4, 4, 4, 5, 5]
+	assert memory.metadata.memory
+	assert memory.message.content.splitlines() == [
+		'[Memory of steps 1-3]',
+		'Step 1 on https://example.com: Goal 1 - click_element {"index": 1}',
+		'  Action result: Price 1',
+		'Step 2 on https://example.com: Goal 2 - click_element {"index": 2}',
+		'  Action result: Price 2',
+		'Step 3 on https://example.com: Goal 3 - click_element {"index": 3}',
+		'  Action result: Price 3',
+	]
+	assert manager.state.history.total_tokens == sum(m.metadata.tokens for m in messages)
+	assert list(manager.state.step_summaries) == [4, 5]
+
+
+def test_compaction_folds_initial_actions_and_plan_into_memory(sample_browser_state, action_registry):
+	manager = MessageManager(
+		task='Collect the prices',
+		system_message=SystemMessage(content='You are a browser agent'),
+		settings=MessageManagerSettings(keep_last_steps=2),
+		state=MessageManagerState(),
+	)
+	initial = len(manager.state.history.messages)
+	AgentOutputModel = AgentOutput.type_with_custom_actions(action_registry)
+
+	result = [ActionResult(extracted_content='Navigated to https://initial', include_in_memory=True)]
+	# the plan of the planner before the first model output
+	manager.add_plan('Plan 1')
+	for step in range(1, 7):
+		manager.add_state_message(sample_browser_state, result, use_vision=False)
+		manager._remove_last_state_message()
+		output = AgentOutputModel(
+			current_state=AgentBrain(page_summary='', evaluation_previous_goal='', memory='', next_goal=f'Goal {step}'),
+			action=[action_registry(click_element={'index': step})],
+		)
+		manager.add_model_output(output)
+		result = [ActionResult(extracted_content=f'Price {step}', include_in_memory=True)]
+
+	messages = manager.state.history.messages
+	memory = messages[initial]
+	assert [m.metadata.step for m in messages[initial:]] == [None, 5, 5, 5, 6, 6]
+	assert memory.metadata.memory
+	assert memory.message.content.splitlines() == [
+		'[Memory of steps 1-4]',
+		'Initial actions',
+		'  Action result: Navigated to https://initial',
+		'Step 1 on https://example.com: Goal 1 - click_element {"index": 1}',
+		'  Action result: Price 1',
+		'Step 2 on https://example.com: Goal 2 - click_element {"index": 2}',
+		'  Action result: Price 2',
+		'Step 3 on https://example.com: Goal 3 - click_element {"index": 3}',
+		'  Action result: Price 3',
+		'Step 4 on https://example.com: Goal 4 - click_element {"index": 4}',
+		'  Action result: Price 4',
+	]
+	assert not any(isinstance(m.message, AIMessage) and m.message.content == 'Plan 1' for m in messages)
+	assert manager.state.history.total_tokens == sum(m.metadata.tokens for m in messages)
+
+
+def test_cache_aware_layout_keeps_prompt_prefix_stable(sample_browser_state, action_registry):
+	manager = MessageManager(
+		task='Collect the prices',
+		system_message=SystemMessage(content='You are a browser agent'),
+		settings=MessageManagerSettings(keep_last_steps=2, cache_aware_layout=True),
+		state=MessageManagerState(),
+	)
+	AgentOutputModel = AgentOutput.type_with_custom_actions(action_registry)
+
+	prompts = []
+	for step in range(1, 7):
+		result = [ActionResult(extracted_content=f'Price {step - 1}', include_in_memory=True)] if step > 1 else None
+		manager.add_state_message(sample_browser_state, result, use_vision=False)
+		manager.add_plan(f'Plan {step}')
+		prompts.append([str(m.content) for m in convert_input_messages(manager.get_messages(), 'deepseek-reasoner')])
+		manager._remove_last_state_message()
+		output = AgentOutputModel(
+			current_state=AgentBrain(page_summary='', evaluation_previous_goal='', memory='', next_goal=f'Goal {step}'),
+			action=[action_registry(click_element={'index': step})],
+		)
+		manager.add_model_output(output)
+
+	assert prompts[-1][-1].endswith('Current plan: Plan 6')
+	assert all('Plan' not in content for prompt in prompts for content in prompt[:-1])
+	# the memory is rewritten once after step 4, every other prompt extends the prefix of the previous one
+	stable = [prompt[:-1] == following[: len(prompt) - 1] for prompt, following in zip(prompts, prompts[1:])]
+	assert stable == [True, True, True, False, True]
+	assert manager.state.history.total_tokens == sum(m.metadata.tokens for m in manager.state.history.messages)
+
+
+def test_convert_input_messages_does_not_change_history():
+	history = [HumanMessage(content='Task'), HumanMessage(content='Example'), AIMessage(content='Plan')]
+
+	converted = convert_input_messages(history, 'deepseek-reasoner')
+
+	assert [m.content for m in converted] == ['TaskExample', 'Plan']
+	assert [m.content for m in history] == ['Task', 'Example', 'Plan']
+
+
+async def test_step_records_prompt_cache_usage(sample_browser_state):
+	usage = {'input_tokens': 1000, 'output_tokens': 50, 'total_tokens': 1050, 'input_token_details': {'cache_read': 800}}
+
+	async def on_token(token: str, step: int):
+		pass
+
+	agent = Agent(
+		task='Finish',
+		llm=StreamingChatModel(usage=usage),
+		browser_context=FakeBrowserContext(sample_browser_state),
+		register_new_token_callback=on_token,
+	)
+	await agent.step()
+
+	metadata = agent.state.history.history[0].metadata
+	assert (metadata.reported_input_tokens, metadata.cached_input_tokens) == (1000, 800)
+	assert metadata.cached_input_fraction == 0.8
+	assert agent.state.history.cached_input_fraction() == 0.8
+
+
+def deepseek_stream(request: httpx.Request) -> httpx.Response:
+	"""Streams AGENT_OUTPUT like the DeepSeek API, the usage comes in a last chunk only if it is requested"""
+	body = json.loads(request.content)
+	payload = json.dumps(AGENT_OUTPUT)
+	chunks = [
+		{'choices': [{'index': 0, 'delta': {'role': 'assistant', 'content': payload[i : i + 16]}, 'finish_reason': None}]}
+		for i in range(0, len(payload), 16)
+	]
+	chunks.append({'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]})
+	if (body.get('stream_options') or {}).get('include_usage'):
+		usage = {
+			'prompt_tokens': 1000,
+			'completion_tokens': 50,
+			'total_tokens': 1050,
+			'prompt_tokens_details': {'cached_tokens': 800},
+			'prompt_cache_hit_tokens': 800,
+			'prompt_cache_miss_tokens': 200,
+		}
+		chunks.append({'choices': [], 'usage': usage})
+	events = [{'id': '1', 'object': 'chat.completion.chunk', 'model': body['model'], **chunk} for chunk in chunks]
+	lines = [f'data: {json.dumps(event)}\n\n' for event in events]
+	return httpx.Response(200, headers={'content-type': 'text/event-stream'}, text=''.join(lines) + 'data: [DONE]\n\n')
+
+
+@pytest.mark.parametrize('stream_usage,expected', [(True, (1000, 800)), (False, (None, None))])
+async def test_step_records_prompt_cache_usage_of_streamed_openai_model(sample_browser_state, stream_usage, expected):
+	async def on_token(token: str, step: int):
+		pass
+
+	llm = ChatOpenAI(
+		base_url='https://api.deepseek.com/v1',
+		model='deepseek-reasoner',
+		api_key=SecretStr('key'),
+		stream_usage=stream_usage,
+		http_async_client=httpx.AsyncClient(transport=httpx.MockTransport(deepseek_stream)),
+	)
+	agent = Agent(
+		task='Finish',
+		llm=llm,
+		browser_context=FakeBrowserContext(sample_browser_state),
+		register_new_token_callback=on_token,
+	)
+	await agent.step()
+
+	# OpenAI compatible APIs only report the usage of a stream with stream_usage
+	metadata = agent.state.history.history[0].metadata
+	assert (metadata.reported_input_tokens, metadata.cached_input_tokens) == expected
+
+
+def test_state_message_uses_screenshot_format(sample_browser_state):
+	sample_browser_state.screenshot_format = 'webp'
+
+	message = AgentMessagePrompt(sample_browser_state).get_user_message(use_vision=True)
+
+	assert message.content[1]['image_url']['url'].startswith('data:image/webp;base64,')
+
+
+class RecordingChatModel(StreamingChatModel):
+	"""Records the prompt of every call, the call number `fail_call` fails"""
+
+	prompts: list = []
+	fail_call: Optional[int] = None
+
+	async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+		self.prompts.append(list(messages))
+		if len(self.prompts) == self.fail_call:
+			raise ConnectionError('Connection reset')
+		async for chunk in super()._astream(messages, stop, run_manager, **kwargs):
+			yield chunk
+
+
+class FramesBrowserContext(FakeBrowserContext):
+	session = None
+
+	def __init__(self, state: BrowserState, frames: list[bytes]):
+		super().__init__(state)
+		self.frames = iter(frames)
+
+	async def get_state(self) -> BrowserState:
+		return dataclasses.replace(self.state, screenshot=base64.b64encode(next(self.frames)).decode())
+
+
+async def test_unchanged_screenshot_stays_in_the_prompt(sample_browser_state):
+	async def on_token(token: str, step: int):
+		pass
+
+	frames = [b'first frame', b'first frame', b'first frame', b'changed frame']
+	llm = RecordingChatModel(prompts=[], fail_call=2)
+	agent = Agent(
+		task='Finish',
+		llm=llm,
+		browser_context=FramesBrowserContext(sample_browser_state, frames),
+		register_new_token_callback=on_token,
+		screenshot_unchanged_threshold=0,
+	)
+
+	for _ in frames:
+		await agent.step()
+
+	def images(prompt: list[BaseMessage]) -> list[str]:
+		return [
+			part['image_url']['url'].removeprefix('data:image/png;base64,')
+			for message in prompt
+			if isinstance(message.content, list)
+			for part in message.content
+			if part.get('type') == 'image_url'
+		]
+
+	first, changed = base64.b64encode(b'first frame').decode(), base64.b64encode(b'changed frame').decode()
+	# the state message is removed after every call, also after the failed second call, the screenshot is not
+	assert [images(prompt) for prompt in llm.prompts] == [[first], [first], [first], [changed]]
+	assert [prompt[-1].content.endswith('unchanged since the last screenshot above') for prompt in llm.prompts] == [
+		False,
+		True,
+		True,
+		False,
+	]
+	# the history stores the unchanged screenshot once
+	screenshots = [item.state.screenshot for item in agent.state.history.history]
+	assert screenshots == [first, first, first, changed]
+	assert screenshots[1] is screenshots[0] and screenshots[2] is screenshots[0]
+	assert agent.state.consecutive_failures == 0
+
+
+def test_kept_screenshot_survives_compaction(sample_browser_state, action_registry):
+	manager = MessageManager(
+		task='Collect the prices',
+		system_message=SystemMessage(content='You are a browser agent'),
+		settings=MessageManagerSettings(keep_last_steps=1, screenshot_unchanged_threshold=0),
+		state=MessageManagerState(),
+	)
+	AgentOutputModel = AgentOutput.type_with_custom_actions(action_registry)
+	frame = ScreenshotHash(exact='frame')
+
+	for step in range(1, 5):
+		manager.add_state_message(sample_browser_state, screenshot_hash=frame)
+		manager._remove_last_state_message()
+		output = AgentOutputModel(
+			current_state=AgentBrain(page_summary='', evaluation_previous_goal='', memory='', next_goal=f'Goal {step}'),
+			action=[action_registry(click_element={'index': step})],
+		)
+		manager.add_model_output(output)
+
+	assert manager.state.memory
+	assert sum(m.metadata.screenshot for m in manager.state.history.messages) == 1
+	assert manager.add_state_message(sample_browser_state, screenshot_hash=frame) == sample_browser_state.screenshot
+	manager._remove_last_state_message()
+
+	# a state without screenshot, the kept one would be outdated
+	manager.add_state_message(dataclasses.replace(sample_browser_state, screenshot=None), screenshot_hash=None)
+	assert not any(m.metadata.screenshot for m in manager.state.history.messages)
+	assert manager.state.history.total_tokens == sum(m.metadata.tokens for m in manager.state.history.messages)
@@ -4,6 +4,7 @@ import json
 import traceback
 import uuid
 from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
 from typing import Any, Dict, List, Literal, Optional, Type
 
@@ -21,6 +22,7 @@ from browser_use.dom.history_tree_processor.service import (
 	HistoryTreeProcessor,
 )
 from browser_use.dom.views import SelectorMap
+from browser_use.utils import percentile
 
 ToolCallingMethod = Literal['function_calling', 'auto']
 
@@ -36,6 +38,9 @@ class AgentSettings(BaseModel):
 	retry_delay: int = 10
 	system_prompt_class: Type[SystemPrompt] = SystemPrompt
 	max_input_tokens: int = 128000
+	keep_last_steps: Optional[int] = None  # Steps kept verbatim in the prompt, older steps are compacted
+	cache_aware_layout: bool = False  # Keep the prompt prefix stable for the prompt cache of the provider
+	screenshot_unchanged_threshold: Optional[int] = None  # Do not resend screenshots which look unchanged
 	validate_output: bool = False
 	message_context: Optional[str] = None
 	generate_gif: bool | str = False
@@ -58,6 +63,7 @@ class AgentSettings(BaseModel):
 	page_extraction_llm: Optional[BaseChatModel] = None
 	planner_llm: Optional[BaseChatModel] = None
 	planner_interval: int = 1  # Run planner every N steps
+	llm_timeout: Optional[float] = 120.0  # Seconds per model call, None waits forever
 
 
 class AgentState(BaseModel):
@@ -118,8 +124,12 @@ class AgentOutput(BaseModel):
 	)
 
 	@staticmethod
+	@lru_cache(maxsize=32)
 	def type_with_custom_actions(custom_actions: Type[ActionModel]) -> Type['AgentOutput']:
-		"""Extend actions with custom actions"""
+		"""
+		Extend actions with custom actions, the model is created once per action model.
+		The cache is bounded, agents which each build their own controller do not keep all their models alive.
+		"""
 		model_ = create_model(
 			'AgentOutput',
 			__base__=AgentOutput,
@@ -130,12 +140,41 @@ class AgentOutput(BaseModel):
 		return model_
 
 
+class StepMetadata(BaseModel):
+	"""Timing and token information of a single step"""
+
+	step_number: int
+	step_start_time: float
+	step_end_time: float
+	# Estimated tokens of the messages sent to the model in this step
+	input_tokens: int = 0
+	# Seconds from sending the request to the first streamed token, or to the complete response if not streamed
+	time_to_first_token: Optional[float] = None
+	# Input tokens reported by the provider and how many of them were read from its prompt cache, None if not reported
+	reported_input_tokens: Optional[int] = None
+	cached_input_tokens: Optional[int] = None
+	# Seconds per phase, e.g. network_wait, dom_build, js_eval, llm_call, action.click_element, sleep
+	timings: dict[str, float] = Field(default_factory=dict)
+
+	@property
+	def duration_seconds(self) -> float:
+		return self.step_end_time - self.step_start_time
+
+	@property
+	def cached_input_fraction(self) -> Optional[float]:
+		"""Fraction of the input tokens which hit the prompt cache of the provider"""
+		if not self.reported_input_tokens or self.cached_input_tokens is None:
+			return None
+		return self.cached_input_tokens / self.reported_input_tokens
+
+
 class AgentHistory(BaseModel):
 	"""History item for agent actions"""
 
 	model_output: AgentOutput | None
 	result: list[ActionResult]
 	state: BrowserStateHistory
+	metadata: Optional[StepMetadata] = None
 
 	model_config = ConfigDict(arbitrary_types_allowed=True, protected_namespaces=())
 
@@ -167,6 +206,7 @@ class AgentHistory(BaseModel):
 			'model_output': model_output_dump,
 			'result': [r.model_dump(exclude_none=True) for r in self.result],
 			'state': self.state.to_dict(),
+			'metadata': self.metadata.model_dump() if self.metadata else None,
 		}
 
 
@@ -229,6 +269,38 @@ class AgentHistoryList(BaseModel):
 			errors.extend([r.error for r in h.result if r.error])
 		return errors
 
+	def timings(self) -> dict[str, list[float]]:
+		"""Seconds per phase over all steps which ran the phase, `step` is the duration of the whole step"""
+		timings: dict[str, list[float]] = {}
+		for h in self.history:
+			if h.metadata is None:
+				continue
+			for phase, seconds in h.metadata.timings.items():
+				timings.setdefault(phase, []).append(seconds)
+			timings.setdefault('step', []).append(h.metadata.duration_seconds)
+		return timings
+
+	def timing_summary(self) -> dict[str, dict[str, float]]:
+		"""Count, total, mean, p50 and p95 in seconds of every phase"""
+		return {
+			phase: {
+				'count': len(values),
+				'total': sum(values),
+				'mean': sum(values) / len(values),
+				'p50': percentile(values, 50),
+				'p95': percentile(values, 95),
+			}
+			for phase, values in self.timings().items()
+		}
+
+	def cached_input_fraction(self) -> Optional[float]:
+		"""Fraction of the reported input tokens of all steps which hit the prompt cache of the provider"""
+		steps = [h.metadata for h in self.history if h.metadata and h.metadata.cached_input_fraction is not None]
+		input_tokens = sum(m.reported_input_tokens or 0 for m in steps)
+		if not input_tokens:
+			return None
+		return sum(m.cached_input_tokens or 0 for m in steps) / input_tokens
+
 	def final_result(self) -> None | str:
 		"""Final result from history"""
 		if self.history and self.history[-1].result[-1].extracted_content:
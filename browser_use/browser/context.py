@@ -3,7 +3,6 @@ Playwright browser on steroids.
 """
 
 import asyncio
-import base64
 import gc
 import json
 import logging
@@ -11,6 +10,7 @@ import os
 import re
 import time
 import uuid
+import weakref
 from dataclasses import dataclass, field
 from typing import TYPE_CHECKING, Optional, TypedDict
 
@@ -25,15 +25,17 @@ from playwright.async_api import (
 	Page,
 )
 
+from browser_use.browser.network import IGNORED_URL_PATTERNS, NetworkIdleTracker, RequestClassifier
+from browser_use.browser.screenshot import HIGHLIGHTS_BOUNDING_BOX_JS, ScreenshotFormat, encode_screenshot, needs_processing
 from browser_use.browser.views import (
 	BrowserError,
 	BrowserState,
 	TabInfo,
 	URLNotAllowedError,
 )
-from browser_use.dom.service import DomService
+from browser_use.dom.service import DomService, DOMWireFormat
 from browser_use.dom.views import DOMElementNode, SelectorMap
-from browser_use.utils import time_execution_sync
+from browser_use.utils import time_execution_async, timer
 
 if TYPE_CHECKING:
 	from browser_use.browser.browser import Browser
@@ -106,6 +108,38 @@ class BrowserContextConfig:
 
 	    include_dynamic_attributes: bool = True
 	        Include dynamic attributes in the CSS selector. If you want to reuse the css_selectors, it might be better to set this to False.
+
+	    incremental_dom_snapshots: False
+	        Keep a MutationObserver in the page and only re-serialize the subtrees that changed since the last state. Scrolling, resizing or navigating triggers a full rebuild.
+
+	    dom_wire_format: 'json'
+	        How the DOM snapshot is transferred from the page. 'packed' sends interned strings and int32 columns in a single string, which is faster to transfer and decode on large pages.
+
+	    compact_dom_tree: False
+	        Keep the DOM tree of every state in a compact array-backed store instead of one object per node. Ignored with incremental_dom_snapshots.
+
+	    ignored_url_patterns: IGNORED_URL_PATTERNS
+	        Substrings of request URLs which are not waited for when waiting for the network to be idle (analytics, ads, chat widgets, ...).
+	        Example: [*IGNORED_URL_PATTERNS, '/api/poll']
+
+	    ignored_hosts: []
+	        Hosts whose requests are not waited for, subdomains included.
+	        Example: ['tracker.example.com']
+
+	    screenshot_format: 'png'
+	        Image format of the screenshots sent to the model and kept in the history: 'png', 'jpeg' or 'webp'. WebP needs Pillow.
+
+	    screenshot_quality: 80
+	        Quality of JPEG and WebP screenshots, from 1 to 100.
+
+	    screenshot_max_dimension: None
+	        Downscale screenshots so that the longer side has at most this many pixels. Needs Pillow.
+
+	    screenshot_crop_to_highlights: False
+	        Crop the screenshot to the bounding box of the highlighted elements in the viewport.
+
+	    screenshot_grayscale: False
+	        Convert screenshots to grayscale. Needs Pillow.
 	"""
 
 	cookies_file: str | None = None
@@ -131,6 +165,17 @@ class BrowserContextConfig:
 	viewport_expansion: int = 500
 	allowed_domains: list[str] | None = None
 	include_dynamic_attributes: bool = True
+	incremental_dom_snapshots: bool = False
+	dom_wire_format: DOMWireFormat = 'json'
+	compact_dom_tree: bool = False
+	ignored_url_patterns: list[str] = field(default_factory=lambda: list(IGNORED_URL_PATTERNS))
+	ignored_hosts: list[str] = field(default_factory=list)
+
+	screenshot_format: ScreenshotFormat = 'png'
+	screenshot_quality: int = 80
+	screenshot_max_dimension: Optional[int] = None
+	screenshot_crop_to_highlights: bool = False
+	screenshot_grayscale: bool = False
 
 	_force_keep_context_alive: bool = False
 
@@ -162,12 +207,20 @@ class BrowserContext:
 
 		self.config = config
 		self.browser = browser
+		self.request_classifier = RequestClassifier(
+			ignored_url_patterns=self.config.ignored_url_patterns,
+			ignored_hosts=self.config.ignored_hosts,
+		)
 
 		self.state = state or BrowserContextState()
 
 		# Initialize these as None - they'll be set up when needed
 		self.session: BrowserSession | None = None
 
+		# One DOM service per page, so incremental snapshots can reuse the cached tree
+		self._dom_services: weakref.WeakKeyDictionary[Page, DomService] = weakref.WeakKeyDictionary()
+		self._network_trackers: weakref.WeakKeyDictionary[Page, NetworkIdleTracker] = weakref.WeakKeyDictionary()
+
 	async def __aenter__(self):
 		"""Async context manager entry"""
 		await self._initialize_session()
@@ -194,6 +247,12 @@ class BrowserContext:
 					logger.debug(f'Failed to remove CDP listener: {e}')
 				self._page_event_handler = None
 
+			try:
+				self.session.context.remove_listener('page', self._on_new_page)
+			except Exception as e:
+				logger.debug(f'Failed to remove page listener: {e}')
+			self._detach_network_trackers()
+
 			await self.save_cookies()
 
 			if self.config.trace_path:
@@ -213,6 +272,7 @@ class BrowserContext:
 			# Dereference everything
 			self.session = None
 			self._page_event_handler = None
+			self._dom_services.clear()
 
 	def __del__(self):
 		"""Cleanup when object is destroyed"""
@@ -244,6 +304,11 @@ class BrowserContext:
 			cached_state=None,
 		)
 
+		# Track the network activity of every page from its creation on
+		for page in pages:
+			self._on_new_page(page)
+		context.on('page', self._on_new_page)
+
 		active_page = None
 		if self.browser.config.cdp_url:
 			# If we have a saved target ID, try to find and activate it
@@ -265,6 +330,7 @@ class BrowserContext:
 				logger.debug('Using existing page')
 			else:
 				active_page = await context.new_page()
+				self._on_new_page(active_page)
 				logger.debug('Created new page')
 
 			# Get target ID for the active page
@@ -376,172 +442,35 @@ class BrowserContext:
 
 	async def _wait_for_stable_network(self):
 		page = await self.get_current_page()
-
-		pending_requests = set()
-		last_activity = asyncio.get_event_loop().time()
-
-		# Define relevant resource types and content types
-		RELEVANT_RESOURCE_TYPES = {
-			'document',
-			'stylesheet',
-			'image',
-			'font',
-			'script',
-			'iframe',
-		}
-
-		RELEVANT_CONTENT_TYPES = {
-			'text/html',
-			'text/css',
-			'application/javascript',
-			'image/',
-			'font/',
-			'application/json',
-		}
-
-		# Additional patterns to filter out
-		IGNORED_URL_PATTERNS = {
-			# Analytics and tracking
-			'analytics',
-			'tracking',
-			'telemetry',
-			'beacon',
-			'metrics',
-			# Ad-related
-			'doubleclick',
-			'adsystem',
-			'adserver',
-			'advertising',
-			# Social media widgets
-			'facebook.com/plugins',
-			'platform.twitter',
-			'linkedin.com/embed',
-			# Live chat and support
-			'livechat',
-			'zendesk',
-			'intercom',
-			'crisp.chat',
-			'hotjar',
-			# Push notifications
-			'push-notifications',
-			'onesignal',
-			'pushwoosh',
-			# Background sync/heartbeat
-			'heartbeat',
-			'ping',
-			'alive',
-			# WebRTC and streaming
-			'webrtc',
-			'rtmp://',
-			'wss://',
-			# Common CDNs for dynamic content
-			'cloudfront.net',
-			'fastly.net',
-		}
-
-		async def on_request(request):
-			# Filter by resource type
-			if request.resource_type not in RELEVANT_RESOURCE_TYPES:
-				return
-
-			# Filter out streaming, websocket, and other real-time requests
-			if request.resource_type in {
-				'websocket',
-				'media',
-				'eventsource',
-				'manifest',
-				'other',
-			}:
-				return
-
-			# Filter out by URL patterns
-			url = request.url.lower()
-			if any(pattern in url for pattern in IGNORED_URL_PATTERNS):
-				return
-
-			# Filter out data URLs and blob URLs
-			if url.startswith(('data:', 'blob:')):
-				return
-
-			# Filter out requests with certain headers
-			headers = request.headers
-			if headers.get('purpose') == 'prefetch' or headers.get('sec-fetch-dest') in [
-				'video',
-				'audio',
-			]:
-				return
-
-			nonlocal last_activity
-			pending_requests.add(request)
-			last_activity = asyncio.get_event_loop().time()
-			# logger.debug(f'Request started: {request.url} ({request.resource_type})')
-
-		async def on_response(response):
-			request = response.request
-			if request not in pending_requests:
-				return
-
-			# Filter by content type if available
-			content_type = response.headers.get('content-type', '').lower()
-
-			# Skip if content type indicates streaming or real-time data
-			if any(
-				t in content_type
-				for t in [
-					'streaming',
-					'video',
-					'audio',
-					'webm',
-					'mp4',
-					'event-stream',
-					'websocket',
-					'protobuf',
-				]
-			):
-				pending_requests.remove(request)
-				return
-
-			# Only process relevant content types
-			if not any(ct in content_type for ct in RELEVANT_CONTENT_TYPES):
-				pending_requests.remove(request)
-				return
-
-			# Skip if response is too large (likely not essential for page load)
-			content_length = response.headers.get('content-length')
-			if content_length and int(content_length) > 5 * 1024 * 1024:  # 5MB
-				pending_requests.remove(request)
-				return
-
-			nonlocal last_activity
-			pending_requests.remove(request)
-			last_activity = asyncio.get_event_loop().time()
-			# logger.debug(f'Request resolved: {request.url} ({content_type})')
-
-		# Attach event listeners
-		page.on('request', on_request)
-		page.on('response', on_response)
-
-		try:
-			# Wait for idle time
-			start_time = asyncio.get_event_loop().time()
-			while True:
-				await asyncio.sleep(0.1)
-				now = asyncio.get_event_loop().time()
-				if len(pending_requests) == 0 and (now - last_activity) >= self.config.wait_for_network_idle_page_load_time:
-					break
-				if now - start_time > self.config.maximum_wait_page_load_time:
-					logger.debug(
-						f'Network timeout after {self.config.maximum_wait_page_load_time}s with {len(pending_requests)} '
-						f'pending requests: {[r.url for r in pending_requests]}'
-					)
-					break
-
-		finally:
-			# Clean up event listeners
-			page.remove_listener('request', on_request)
-			page.remove_listener('response', on_response)
-
-		logger.debug(f'Network stabilized for {self.config.wait_for_network_idle_page_load_time} seconds')
+		tracker = self._get_network_tracker(page)
+
+		if await tracker.wait_for_idle(self.config.maximum_wait_page_load_time):
+			logger.debug(f'Network stabilized for {self.config.wait_for_network_idle_page_load_time} seconds')
+
+	def _get_network_tracker(self, page: Page) -> NetworkIdleTracker:
+		"""Network trackers live as long as their page, so requests started between two states are tracked too"""
+		tracker = self._network_trackers.get(page)
+		if tracker is None:
+			tracker = NetworkIdleTracker(page, self.config.wait_for_network_idle_page_load_time, self.request_classifier)
+			tracker.attach()
+			self._network_trackers[page] = tracker
+		return tracker
+
+	def _on_new_page(self, page: Page) -> None:
+		if page in self._network_trackers:
+			return
+		self._get_network_tracker(page)
+		page.once('close', self._on_page_close)
+
+	def _on_page_close(self, page: Page) -> None:
+		tracker = self._network_trackers.pop(page, None)
+		if tracker is not None:
+			tracker.detach()
+
+	def _detach_network_trackers(self) -> None:
+		for tracker in list(self._network_trackers.values()):
+			tracker.detach()
+		self._network_trackers.clear()
 
 	async def _wait_for_page_and_frames_load(self, timeout_overwrite: float | None = None):
 		"""
@@ -554,7 +483,8 @@ class BrowserContext:
 
 		# Wait for page load
 		try:
-			await self._wait_for_stable_network()
+			with timer('network_wait'):
+				await self._wait_for_stable_network()
 
 			# Check if the loaded URL is allowed
 			page = await self.get_current_page()
@@ -573,7 +503,8 @@ class BrowserContext:
 
 		# Sleep remaining time if needed
 		if remaining > 0:
-			await asyncio.sleep(remaining)
+			with timer('sleep'):
+				await asyncio.sleep(remaining)
 
 	def _is_url_allowed(self, url: str) -> bool:
 		"""Check if a URL is allowed based on the whitelist configuration."""
@@ -666,7 +597,7 @@ class BrowserContext:
 		page = await self.get_current_page()
 		return await page.evaluate(script)
 
-	@time_execution_sync('--get_state')  # This decorator might need to be updated to handle async
+	@time_execution_async('--get_state')
 	async def get_state(self) -> BrowserState:
 		"""Get the current state of the browser"""
 		await self._wait_for_page_and_frames_load()
@@ -683,41 +614,51 @@ class BrowserContext:
 		"""Update and return state."""
 		session = await self.get_session()
 
-		# Check if current page is still valid, if not switch to another available page
-		try:
-			page = await self.get_current_page()
-			# Test if page is still accessible
-			await page.evaluate('1')
-		except Exception as e:
-			logger.debug(f'Current page is no longer accessible: {str(e)}')
+		# Check if current page is still valid, if not switch to another available page.
+		# is_closed() needs no round trip, a crashed page fails in the DOM evaluation below.
+		page = await self.get_current_page()
+		if page.is_closed():
+			logger.debug('Current page is no longer accessible')
 			# Get all available pages
-			pages = session.context.pages
+			pages = [p for p in session.context.pages if not p.is_closed()]
 			if pages:
 				self.state.target_id = None
 				page = await self._get_current_page(session)
-				logger.debug(f'Switched to page: {await page.title()}')
+				logger.debug(f'Switched to page: {page.url}')
 			else:
 				raise BrowserError('Browser closed: no valid pages available')
 
 		try:
-			await self.remove_highlights()
-			dom_service = DomService(page)
+			# The DOM evaluation also removes old highlights and collects title and scroll position
+			dom_service = self._get_dom_service(page)
 			content = await dom_service.get_clickable_elements(
 				focus_element=focus_element,
 				viewport_expansion=self.config.viewport_expansion,
 				highlight_elements=self.config.highlight_elements,
+				incremental=self.config.incremental_dom_snapshots,
+				wire_format=self.config.dom_wire_format,
+				compact=self.config.compact_dom_tree,
 			)
 
-			screenshot_b64 = await self.take_screenshot()
-			pixels_above, pixels_below = await self.get_scroll_info(page)
+			screenshot_b64, tabs = await asyncio.gather(self.take_screenshot(), self.get_tabs_info())
+
+			page_info = content.page_info
+			if page_info is not None:
+				title = page_info.title
+				pixels_above, pixels_below = page_info.pixels_above, page_info.pixels_below
+			else:
+				title = await page.title()
+				pixels_above, pixels_below = await self.get_scroll_info(page)
 
 			self.current_state = BrowserState(
 				element_tree=content.element_tree,
 				selector_map=content.selector_map,
+				page_info=page_info,
 				url=page.url,
-				title=await page.title(),
-				tabs=await self.get_tabs_info(),
+				title=title,
+				tabs=tabs,
 				screenshot=screenshot_b64,
+				screenshot_format=self.config.screenshot_format,
 				pixels_above=pixels_above,
 				pixels_below=pixels_below,
 			)
@@ -730,23 +671,54 @@ class BrowserContext:
 				return self.current_state
 			raise
 
+	def _get_dom_service(self, page: Page) -> DomService:
+		dom_service = self._dom_services.get(page)
+		if dom_service is None:
+			dom_service = DomService(page)
+			self._dom_services[page] = dom_service
+		return dom_service
+
 	# region - Browser Actions
 
 	async def take_screenshot(self, full_page: bool = False) -> str:
 		"""
-		Returns a base64 encoded screenshot of the current page.
+		Returns a base64 encoded screenshot of the current page, in the format of screenshot_format.
 		"""
 		page = await self.get_current_page()
+		config = self.config
+		processed = needs_processing(config.screenshot_format, config.screenshot_max_dimension, config.screenshot_grayscale)
 
-		await page.bring_to_front()
-		await page.wait_for_load_state()
+		with timer('screenshot'):
+			await page.bring_to_front()
+			await page.wait_for_load_state()
 
-		screenshot = await page.screenshot(
-			full_page=full_page,
-			animations='disabled',
-		)
+			clip = None
+			if config.screenshot_crop_to_highlights and not full_page:
+				clip = await page.evaluate(HIGHLIGHTS_BOUNDING_BOX_JS, 8)
+
+			# Playwright encodes JPEG itself, everything else is captured lossless and encoded afterwards
+			options = {'type': 'png'}
+			if config.screenshot_format == 'jpeg' and not processed:
+				options = {'type': 'jpeg', 'quality': config.screenshot_quality}
+			screenshot = await page.screenshot(
+				full_page=full_page,
+				animations='disabled',
+				clip=clip,
+				# downscaled anyway, device pixels would only make the capture larger
+				scale='css' if config.screenshot_max_dimension else 'device',
+				**options,
+			)
 
-		screenshot_b64 = base64.b64encode(screenshot).decode('utf-8')
+		# Encoding a large screenshot takes milliseconds, keep it off the event loop
+		with timer('screenshot_encode'):
+			screenshot_b64 = await asyncio.to_thread(
+				encode_screenshot,
+				screenshot,
+				format=config.screenshot_format,
+				quality=config.screenshot_quality,
+				max_dimension=config.screenshot_max_dimension,
+				grayscale=config.screenshot_grayscale,
+			)
 
 		# await self.remove_highlights()
 
@@ -1088,12 +1060,10 @@ class BrowserContext:
 		"""Get information about all tabs"""
 		session = await self.get_session()
 
-		tabs_info = []
-		for page_id, page in enumerate(session.context.pages):
-			tab_info = TabInfo(page_id=page_id, url=page.url, title=await page.title())
-			tabs_info.append(tab_info)
+		pages = session.context.pages
+		titles = await asyncio.gather(*(page.title() for page in pages))
 
-		return tabs_info
+		return [TabInfo(page_id=page_id, url=page.url, title=title) for page_id, (page, title) in enumerate(zip(pages, titles))]
 
 	async def switch_to_tab(self, page_id: int) -> None:
 		"""Switch to a specific tab by its page_id"""
@@ -1222,9 +1192,9 @@ class BrowserContext:
 
 	async def get_scroll_info(self, page: Page) -> tuple[int, int]:
 		"""Get scroll position information for the current page."""
-		scroll_y = await page.evaluate('window.scrollY')
-		viewport_height = await page.evaluate('window.innerHeight')
-		total_height = await page.evaluate('document.documentElement.scrollHeight')
+		scroll_y, viewport_height, total_height = await page.evaluate(
+			'[window.scrollY, window.innerHeight, document.documentElement.scrollHeight]'
+		)
 		pixels_above = scroll_y
 		pixels_below = total_height - (scroll_y + viewport_height)
 		return pixels_above, pixels_below
@@ -1242,6 +1212,7 @@ class BrowserContext:
 
 		session.cached_state = None
 		self.state.target_id = None
+		self._dom_services.clear()
 
 	async def _get_unique_filename(self, directory, filename):
 		"""Generate a unique filename by appending (1), (2), etc., if a file already exists."""
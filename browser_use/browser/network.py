@@ -0,0 +1,302 @@
+"""
+Network idle detection for pages of a browser context.
+"""
+
+import asyncio
+import logging
+import re
+from typing import TYPE_CHECKING, Iterable, Optional
+from urllib.parse import urlsplit
+
+if TYPE_CHECKING:
+	from playwright.async_api import Page, Request, Response
+
+logger = logging.getLogger(__name__)
+
+# Requests which have to finish before the page counts as loaded
+RELEVANT_RESOURCE_TYPES = frozenset(
+	{
+		'document',
+		'stylesheet',
+		'image',
+		'font',
+		'script',
+		'iframe',
+	}
+)
+
+RELEVANT_CONTENT_TYPES = (
+	'text/html',
+	'text/css',
+	'application/javascript',
+	'image/',
+	'font/',
+	'application/json',
+)
+
+# Responses of these content types are streams and never finish on their own
+STREAMING_CONTENT_TYPES = (
+	'streaming',
+	'video',
+	'audio',
+	'webm',
+	'mp4',
+	'event-stream',
+	'websocket',
+	'protobuf',
+)
+
+IGNORED_URL_PATTERNS = (
+	# Analytics and tracking
+	'analytics',
+	'tracking',
+	'telemetry',
+	'beacon',
+	'metrics',
+	# Ad-related
+	'doubleclick',
+	'adsystem',
+	'adserver',
+	'advertising',
+	# Social media widgets
+	'facebook.com/plugins',
+	'platform.twitter',
+	'linkedin.com/embed',
+	# Live chat and support
+	'livechat',
+	'zendesk',
+	'intercom',
+	'crisp.chat',
+	'hotjar',
+	# Push notifications
+	'push-notifications',
+	'onesignal',
+	'pushwoosh',
+	# Background sync/heartbeat
+	'heartbeat',
+	'ping',
+	'alive',
+	# WebRTC and streaming
+	'webrtc',
+	'rtmp://',
+	'wss://',
+	# Common CDNs for dynamic content
+	'cloudfront.net',
+	'fastly.net',
+)
+
+MAX_RELEVANT_CONTENT_LENGTH = 5 * 1024 * 1024  # 5MB
+
+
+def _trie_pattern(patterns: Iterable[str]) -> str:
+	"""
+	Regular expression matching any of the literal `patterns`, factored into a prefix tree.
+
+	A plain alternation tries every pattern at every position of the URL, the prefix tree
+	only follows the branches matching the current character.
+	"""
+	trie: dict = {}
+	for pattern in patterns:
+		node = trie
+		for char in pattern:
+			node = node.setdefault(char, {})
+		node[''] = {}
+
+	def build(node: dict) -> str:
+		# A shorter pattern ending here already matches, longer ones are not needed for a search
+		if '' in node:
+			return ''
+		branches = [re.escape(char) + build(child) for char, child in sorted(node.items())]
+		return branches[0] if len(branches) == 1 else f'(?:{"|".join(branches)})'
+
+	return build(trie)
+
+
+class RequestClassifier:
+	"""
+	Decides which requests a page has to wait for before it counts as loaded.
+
+	The ignored URL patterns are compiled once into a single prefix tree regular expression and ignored hosts
+	are matched by their domain suffixes with set lookups, so classifying a request does not depend
+	on the number of patterns. Instances are immutable and can be shared between contexts.
+
+	Example:
+		RequestClassifier(
+			ignored_url_patterns=[*IGNORED_URL_PATTERNS, '/api/poll'],
+			ignored_hosts=['tracker.example.com', 'ads.example.net'],
+		)
+	"""
+
+	def __init__(
+		self,
+		ignored_url_patterns: Iterable[str] = IGNORED_URL_PATTERNS,
+		ignored_hosts: Iterable[str] = (),
+		relevant_resource_types: Iterable[str] = RELEVANT_RESOURCE_TYPES,
+	):
+		patterns = {pattern.lower() for pattern in ignored_url_patterns if pattern}
+		self.ignored_url_regex = re.compile(_trie_pattern(patterns)) if patterns else None
+		self.ignored_hosts = frozenset(host.lower().strip('.') for host in ignored_hosts if host)
+		self.relevant_resource_types = frozenset(relevant_resource_types)
+
+	def is_ignored_url(self, url: str) -> bool:
+		url = url.lower()
+
+		# Filter out data URLs and blob URLs
+		if url.startswith(('data:', 'blob:')):
+			return True
+
+		if self.ignored_url_regex is not None and self.ignored_url_regex.search(url):
+			return True
+
+		if self.ignored_hosts:
+			host = urlsplit(url).hostname or ''
+			# api.ads.example.com is matched by api.ads.example.com, ads.example.com, example.com and com
+			while host:
+				if host in self.ignored_hosts:
+					return True
+				_, _, host = host.partition('.')
+
+		return False
+
+	def is_relevant_request(self, request: 'Request') -> bool:
+		"""Whether the page has to wait for this request before it counts as loaded"""
+		if request.resource_type not in self.relevant_resource_types:
+			return False
+
+		if self.is_ignored_url(request.url):
+			return False
+
+		headers = request.headers
+		if headers.get('purpose') == 'prefetch' or headers.get('sec-fetch-dest') in ('video', 'audio'):
+			return False
+
+		return True
+
+	def is_relevant_response(self, response: 'Response') -> bool:
+		"""Whether a response counts as page activity, streams and large downloads do not"""
+		content_type = response.headers.get('content-type', '').lower()
+		if any(t in content_type for t in STREAMING_CONTENT_TYPES):
+			return False
+
+		if not any(ct in content_type for ct in RELEVANT_CONTENT_TYPES):
+			return False
+
+		content_length = response.headers.get('content-length')
+		if content_length and content_length.isdigit() and int(content_length) > MAX_RELEVANT_CONTENT_LENGTH:
+			return False
+
+		return True
+
+
+DEFAULT_REQUEST_CLASSIFIER = RequestClassifier()
+
+
+class NetworkIdleTracker:
+	"""
+	Tracks the relevant requests of a page for the lifetime of the page.
+
+	The page is idle once no relevant request is pending and there was no activity for `idle_time`
+	seconds. Finished and failed requests are removed as well, so a request without response does
+	not keep the page busy. Instead of polling, a debounce timer sets an event when the page
+	becomes idle.
+	"""
+
+	def __init__(self, page: 'Page', idle_time: float, classifier: RequestClassifier = DEFAULT_REQUEST_CLASSIFIER):
+		self.page = page
+		self.idle_time = idle_time
+		self.classifier = classifier
+
+		self.pending_requests: set['Request'] = set()
+		self._loop = asyncio.get_running_loop()
+		self._last_activity = self._loop.time()
+		self._idle = asyncio.Event()
+		self._idle_timer: Optional[asyncio.TimerHandle] = None
+		self._attached = False
+
+	def attach(self) -> None:
+		if self._attached:
+			return
+		self.page.on('request', self._on_request)
+		self.page.on('response', self._on_response)
+		self.page.on('requestfinished', self._on_request_done)
+		self.page.on('requestfailed', self._on_request_done)
+		self._attached = True
+		self._schedule_idle()
+
+	def detach(self) -> None:
+		if not self._attached:
+			return
+		for event, handler in (
+			('request', self._on_request),
+			('response', self._on_response),
+			('requestfinished', self._on_request_done),
+			('requestfailed', self._on_request_done),
+		):
+			try:
+				self.page.remove_listener(event, handler)
+			except Exception as e:
+				logger.debug(f'Failed to remove {event} listener: {e}')
+		self._attached = False
+		self._cancel_idle_timer()
+		self.pending_requests.clear()
+
+	@property
+	def is_idle(self) -> bool:
+		return self._idle.is_set()
+
+	async def wait_for_idle(self, timeout: float) -> bool:
+		"""Wait until the page is idle, returns False if `timeout` seconds passed first"""
+		if self._idle.is_set():
+			return True
+		try:
+			await asyncio.wait_for(self._idle.wait(), timeout)
+			return True
+		except asyncio.TimeoutError:
+			logger.debug(
+				f'Network timeout after {timeout}s with {len(self.pending_requests)} '
+				f'pending requests: {[r.url for r in self.pending_requests]}'
+			)
+			return False
+
+	def _on_request(self, request: 'Request') -> None:
+		if not self.classifier.is_relevant_request(request):
+			return
+		self.pending_requests.add(request)
+		self._mark_activity()
+
+	def _on_response(self, response: 'Response') -> None:
+		request = response.request
+		if request not in self.pending_requests:
+			return
+		self.pending_requests.discard(request)
+		if self.classifier.is_relevant_response(response):
+			self._mark_activity()
+		else:
+			self._schedule_idle()
+
+	def _on_request_done(self, request: 'Request') -> None:
+		if request in self.pending_requests:
+			self.pending_requests.discard(request)
+			self._schedule_idle()
+
+	def _mark_activity(self) -> None:
+		self._last_activity = self._loop.time()
+		self._schedule_idle()
+
+	def _schedule_idle(self) -> None:
+		self._cancel_idle_timer()
+		if self.pending_requests:
+			self._idle.clear()
+			return
+
+		remaining = self._last_activity + self.idle_time - self._loop.time()
+		if remaining <= 0:
+			self._idle.set()
+		else:
+			self._idle.clear()
+			self._idle_timer = self._loop.call_later(remaining, self._idle.set)
+
+	def _cancel_idle_timer(self) -> None:
+		if self._idle_timer is not None:
+			self._idle_timer.cancel()
+			self._idle_timer = None
@@ -0,0 +1,324 @@
+"""
+Pool of pre-warmed browsers and browser contexts shared by concurrent tasks.
+"""
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Optional
+
+from browser_use.browser.browser import Browser, BrowserConfig
+from browser_use.browser.context import BrowserContext, BrowserContextConfig
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BrowserPoolConfig:
+	"""
+	Configuration for the BrowserPool.
+
+	Default values:
+		browser_count: 1
+			Number of Chromium processes kept running
+
+		contexts_per_browser: 2
+			Number of warm browser contexts kept open in every browser
+
+		max_context_uses: 20
+			Tasks a context serves before it is closed and replaced by a fresh one
+
+		max_browser_uses: 200
+			Tasks a browser serves before it is drained and relaunched
+
+		acquire_timeout: 60.0
+			Seconds to wait for a free context before giving up
+
+		health_check_timeout: 5.0
+			Seconds a context has to answer the health check before it is replaced
+	"""
+
+	browser_count: int = 1
+	contexts_per_browser: int = 2
+	max_context_uses: int = 20
+	max_browser_uses: int = 200
+	acquire_timeout: float = 60.0
+	health_check_timeout: float = 5.0
+
+	browser_config: BrowserConfig = field(default_factory=lambda: BrowserConfig(headless=True))
+	context_config: BrowserContextConfig = field(default_factory=BrowserContextConfig)
+
+	@property
+	def size(self) -> int:
+		return self.browser_count * self.contexts_per_browser
+
+
+@dataclass(eq=False)
+class PooledBrowser:
+	browser: Browser
+	ready: 'asyncio.Future'
+	uses: int = 0
+	contexts: int = 0
+	retiring: bool = False
+
+
+@dataclass(eq=False)
+class PooledContext:
+	context: BrowserContext
+	owner: PooledBrowser
+	uses: int = 0
+	tenant_id: Optional[str] = None
+
+
+class BrowserPool:
+	"""
+	Keeps `browser_count` Chromium processes and `browser_count * contexts_per_browser` initialized
+	browser contexts ready, so a task does not pay for launching a browser.
+
+	Contexts are handed out with `acquire`. A context is only reused for the tenant it served last,
+	after `reset_context` closed its tabs, a context of another tenant is replaced by a fresh one so
+	cookies and storage never leak between tenants. Contexts used without a tenant are replaced when
+	they are returned, anonymous requests never share a session. Contexts failing the health check or reaching
+	`max_context_uses` are replaced as well, browsers reaching `max_browser_uses` are relaunched once
+	their contexts are returned.
+
+	Example:
+		pool = BrowserPool(BrowserPoolConfig(browser_count=2, contexts_per_browser=4))
+		await pool.start()
+		async with pool.acquire(tenant_id='customer-42') as browser_context:
+			agent = Agent(task=task, llm=llm, browser_context=browser_context)
+			await agent.run()
+		await pool.close()
+	"""
+
+	def __init__(self, config: BrowserPoolConfig = BrowserPoolConfig()):
+		self.config = config
+		self._browsers: list[PooledBrowser] = []
+		self._idle: list[PooledContext] = []
+		self._in_use: set[PooledContext] = set()
+		# Contexts which could not be replaced after a failure, they are reopened on demand
+		self._lost = 0
+		self._available = asyncio.Condition()
+		self._started = False
+		self._closed = False
+
+	async def __aenter__(self):
+		await self.start()
+		return self
+
+	async def __aexit__(self, exc_type, exc_val, exc_tb):
+		await self.close()
+
+	@property
+	def idle_count(self) -> int:
+		return len(self._idle)
+
+	@property
+	def in_use_count(self) -> int:
+		return len(self._in_use)
+
+	async def start(self) -> None:
+		"""Launch the browsers and open the warm contexts"""
+		if self._started:
+			return
+		self._started = True
+		self._closed = False
+
+		contexts = await asyncio.gather(*(self._new_context() for _ in range(self.config.size)))
+		self._idle.extend(contexts)
+		logger.info(f'Browser pool ready with {len(self._browsers)} browsers and {len(self._idle)} contexts')
+
+	async def close(self) -> None:
+		"""Close all contexts and browsers, contexts still in use are closed as well"""
+		self._closed = True
+		async with self._available:
+			contexts = self._idle + list(self._in_use)
+			self._idle.clear()
+			self._in_use.clear()
+			self._available.notify_all()
+
+		for pooled in contexts:
+			await self._close_context(pooled)
+		for owner in self._browsers:
+			await owner.browser.close()
+		self._browsers.clear()
+		self._started = False
+
+	@asynccontextmanager
+	async def acquire(self, tenant_id: Optional[str] = None) -> AsyncIterator[BrowserContext]:
+		"""Borrow a healthy browser context for `tenant_id`, it is returned to the pool on exit"""
+		if not self._started:
+			await self.start()
+
+		pooled = await self._take(tenant_id)
+		try:
+			pooled = await self._prepare(pooled, tenant_id)
+		except BaseException:
+			await self._give_back(pooled, discard=True)
+			raise
+
+		try:
+			yield pooled.context
+		finally:
+			await self._give_back(pooled)
+
+	async def _take(self, tenant_id: Optional[str]) -> PooledContext:
+		async with self._available:
+			try:
+				await asyncio.wait_for(
+					self._available.wait_for(lambda: bool(self._idle) or self._lost > 0 or self._closed),
+					self.config.acquire_timeout,
+				)
+			except asyncio.TimeoutError:
+				raise TimeoutError(f'No browser context became available within {self.config.acquire_timeout}s')
+			if self._closed:
+				raise RuntimeError('Browser pool is closed')
+
+			if self._idle:
+				# Prefer the context which already served this tenant, its cookies can be reused
+				pooled = next((p for p in self._idle if tenant_id is not None and p.tenant_id == tenant_id), self._idle[0])
+				self._idle.remove(pooled)
+				self._in_use.add(pooled)
+				return pooled
+
+			self._lost -= 1
+
+		try:
+			pooled = await self._new_context()
+		except BaseException:
+			async with self._available:
+				self._lost += 1
+				self._available.notify()
+			raise
+		self._in_use.add(pooled)
+		return pooled
+
+	async def _prepare(self, pooled: PooledContext, tenant_id: Optional[str]) -> PooledContext:
+		"""
+		Replace the context if it belongs to another tenant, its browser retires or it is unhealthy.
+		Idle contexts without a tenant are fresh, contexts are replaced when returned by an anonymous request.
+		"""
+		if pooled.owner.retiring or (pooled.tenant_id is not None and pooled.tenant_id != tenant_id):
+			pooled = await self._replace(pooled)
+		elif not await self._is_healthy(pooled):
+			logger.warning('Replacing unhealthy browser context')
+			pooled = await self._replace(pooled)
+
+		pooled.tenant_id = tenant_id
+		return pooled
+
+	async def _give_back(self, pooled: PooledContext, discard: bool = False) -> None:
+		if pooled not in self._in_use:
+			# The pool was closed while the context was borrowed
+			return
+
+		pooled.uses += 1
+		pooled.owner.uses += 1
+		if pooled.owner.uses >= self.config.max_browser_uses:
+			pooled.owner.retiring = True
+
+		try:
+			if discard or pooled.tenant_id is None or pooled.owner.retiring or pooled.uses >= self.config.max_context_uses:
+				# reset_context keeps cookies and storage, without a tenant they must not be reused
+				pooled = await self._replace(pooled)
+			else:
+				await pooled.context.reset_context()
+		except Exception as e:
+			logger.warning(f'Failed to recycle browser context: {e}')
+			try:
+				pooled = await self._replace(pooled)
+			except Exception as e:
+				logger.error(f'Failed to replace browser context: {e}')
+				await self._drop(pooled)
+				return
+
+		async with self._available:
+			if self._closed:
+				await self._close_context(pooled)
+				return
+			self._in_use.discard(pooled)
+			self._idle.append(pooled)
+			self._available.notify()
+
+	async def _replace(self, pooled: PooledContext) -> PooledContext:
+		"""Close `pooled` and open a fresh context in its place"""
+		replacement = await self._new_context()
+		self._in_use.discard(pooled)
+		self._in_use.add(replacement)
+		await self._close_context(pooled)
+		return replacement
+
+	async def _is_healthy(self, pooled: PooledContext) -> bool:
+		if not self._is_connected(pooled.owner):
+			return False
+		try:
+			page = await pooled.context.get_current_page()
+			await asyncio.wait_for(page.evaluate('1'), self.config.health_check_timeout)
+			return True
+		except Exception as e:
+			logger.debug(f'Browser context health check failed: {e}')
+			return False
+
+	async def _drop(self, pooled: PooledContext) -> None:
+		self._in_use.discard(pooled)
+		await self._close_context(pooled)
+		async with self._available:
+			self._lost += 1
+			self._available.notify()
+
+	async def _new_context(self) -> PooledContext:
+		owner = self._reserve_browser()
+		try:
+			await owner.ready
+			context = BrowserContext(browser=owner.browser, config=self.config.context_config)
+			await context.get_session()
+		except Exception:
+			await self._release_browser(owner)
+			raise
+		return PooledContext(context=context, owner=owner)
+
+	def _reserve_browser(self) -> PooledBrowser:
+		"""
+		Reserve a context slot on the least loaded healthy browser, a new browser is launched while
+		there are fewer than `browser_count`. Slots are taken before awaiting anything, so concurrent
+		callers share the launch of a browser instead of launching one each.
+		"""
+		candidates = [owner for owner in self._browsers if not owner.retiring and self._is_connected(owner)]
+		free = [owner for owner in candidates if owner.contexts < self.config.contexts_per_browser]
+		if free:
+			owner = min(free, key=lambda owner: owner.contexts)
+		elif candidates and len(candidates) >= self.config.browser_count:
+			owner = min(candidates, key=lambda owner: owner.contexts)
+		else:
+			browser = Browser(config=self.config.browser_config)
+			owner = PooledBrowser(browser=browser, ready=asyncio.ensure_future(browser.get_playwright_browser()))
+			self._browsers.append(owner)
+
+		owner.contexts += 1
+		return owner
+
+	@staticmethod
+	def _is_connected(owner: PooledBrowser) -> bool:
+		if not owner.ready.done():
+			# Still launching
+			return True
+		if owner.ready.cancelled() or owner.ready.exception() is not None:
+			return False
+		playwright_browser = owner.browser.playwright_browser
+		return playwright_browser is not None and playwright_browser.is_connected()
+
+	async def _close_context(self, pooled: PooledContext) -> None:
+		try:
+			await pooled.context.close()
+		except Exception as e:
+			logger.debug(f'Failed to close browser context: {e}')
+		await self._release_browser(pooled.owner)
+
+	async def _release_browser(self, owner: PooledBrowser) -> None:
+		"""Free a context slot, the browser is closed once it is retired or dead and has no contexts left"""
+		owner.contexts -= 1
+		if owner.contexts <= 0 and (owner.retiring or not self._is_connected(owner) or self._closed):
+			if owner in self._browsers:
+				self._browsers.remove(owner)
+			await owner.browser.close()
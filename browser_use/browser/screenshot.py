@@ -0,0 +1,129 @@
+"""
+Encoding of the screenshots which are sent to the model and kept in the history.
+"""
+
+import base64
+import hashlib
+import io
+from dataclasses import dataclass
+from typing import Literal, Optional, TypedDict
+
+ScreenshotFormat = Literal['png', 'jpeg', 'webp']
+
+# Union of the highlight overlays, or of the highlighted elements if the overlays are disabled, clipped to the viewport
+HIGHLIGHTS_BOUNDING_BOX_JS = """
+(padding) => {
+	const container = document.getElementById('playwright-highlight-container');
+	const elements = container ? container.children : document.querySelectorAll('[browser-user-highlight-id]');
+	let left = Infinity, top = Infinity, right = -Infinity, bottom = -Infinity;
+	for (const element of elements) {
+		const rect = element.getBoundingClientRect();
+		if (rect.width === 0 || rect.height === 0) continue;
+		left = Math.min(left, rect.left);
+		top = Math.min(top, rect.top);
+		right = Math.max(right, rect.right);
+		bottom = Math.max(bottom, rect.bottom);
+	}
+	left = Math.max(0, left - padding);
+	top = Math.max(0, top - padding);
+	right = Math.min(window.innerWidth, right + padding);
+	bottom = Math.min(window.innerHeight, bottom + padding);
+	if (right <= left || bottom <= top) return null;
+	return {x: left, y: top, width: right - left, height: bottom - top};
+}
+"""
+
+
+class ClipBox(TypedDict):
+	x: float
+	y: float
+	width: float
+	height: float
+
+
+def needs_processing(format: ScreenshotFormat, max_dimension: Optional[int], grayscale: bool) -> bool:
+	"""Whether the screenshot has to go through Pillow, Playwright itself only writes PNG and JPEG"""
+	return format == 'webp' or max_dimension is not None or grayscale
+
+
+def process_screenshot(
+	data: bytes,
+	format: ScreenshotFormat = 'png',
+	quality: int = 80,
+	max_dimension: Optional[int] = None,
+	grayscale: bool = False,
+) -> bytes:
+	"""Downscale the longer side to max_dimension, convert to grayscale and encode in the format, needs Pillow"""
+	try:
+		from PIL import Image
+	except ImportError as e:
+		raise ImportError('Screenshot processing requires Pillow, install it with `pip install pillow`') from e
+
+	with Image.open(io.BytesIO(data)) as image:
+		image.load()
+		if grayscale:
+			image = image.convert('L')
+		elif image.mode not in ('RGB', 'L'):
+			image = image.convert('RGB')
+		if max_dimension is not None and max(image.size) > max_dimension:
+			# thumbnail keeps the aspect ratio
+			image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+
+		output = io.BytesIO()
+		if format == 'png':
+			image.save(output, format='PNG', optimize=False)
+		else:
+			image.save(output, format=format.upper(), quality=quality)
+		return output.getvalue()
+
+
+@dataclass(frozen=True)
+class ScreenshotHash:
+	"""Difference hash of a screenshot, None without Pillow, and the hash of its bytes"""
+
+	exact: str
+	perceptual: Optional[int] = None
+
+	def matches(self, other: 'ScreenshotHash', threshold: int) -> bool:
+		"""Whether the screenshots differ in at most threshold bits, or are identical if one has no perceptual hash"""
+		if self.perceptual is None or other.perceptual is None:
+			return self.exact == other.exact
+		return (self.perceptual ^ other.perceptual).bit_count() <= threshold
+
+
+def hash_screenshot(data: bytes, hash_size: int = 16) -> ScreenshotHash:
+	"""Difference hash of the brightness gradients of the screenshot scaled to hash_size + 1 by hash_size pixels"""
+	exact = hashlib.sha256(data).hexdigest()
+	try:
+		from PIL import Image
+	except ImportError:
+		return ScreenshotHash(exact=exact)
+
+	try:
+		with Image.open(io.BytesIO(data)) as image:
+			# JPEG can be decoded at a fraction of its size, the hash only needs a thumbnail
+			image.draft('L', (hash_size * 8, hash_size * 8))
+			pixels = list(image.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.BOX).getdata())
+	except OSError:
+		# not an image Pillow can read
+		return ScreenshotHash(exact=exact)
+
+	bits = 0
+	for row in range(hash_size):
+		for column in range(hash_size):
+			left = pixels[row * (hash_size + 1) + column]
+			bits = (bits << 1) | (left > pixels[row * (hash_size + 1) + column + 1])
+	return ScreenshotHash(exact=exact, perceptual=bits)
+
+
+def encode_screenshot(
+	data: bytes,
+	format: ScreenshotFormat = 'png',
+	quality: int = 80,
+	max_dimension: Optional[int] = None,
+	grayscale: bool = False,
+) -> str:
+	"""Base64 of the processed screenshot, meant to run in a worker thread"""
+	if needs_processing(format, max_dimension, grayscale):
+		data = process_screenshot(data, format, quality, max_dimension, grayscale)
+	return base64.b64encode(data).decode('utf-8')
@@ -0,0 +1,131 @@
+import asyncio
+from dataclasses import dataclass, field
+
+from browser_use.browser.network import IGNORED_URL_PATTERNS, NetworkIdleTracker, RequestClassifier
+
+
+@dataclass(eq=False)
+class FakeRequest:
+	url: str
+	resource_type: str = 'script'
+	headers: dict = field(default_factory=dict)
+
+
+@dataclass
+class FakeResponse:
+	request: FakeRequest
+	headers: dict = field(default_factory=lambda: {'content-type': 'application/javascript'})
+
+
+class FakePage:
+	def __init__(self):
+		self.listeners: dict[str, list] = {}
+
+	def on(self, event, handler):
+		self.listeners.setdefault(event, []).append(handler)
+
+	def remove_listener(self, event, handler):
+		self.listeners[event].remove(handler)
+
+	def emit(self, event, payload):
+		for handler in list(self.listeners.get(event, [])):
+			handler(payload)
+
+
+async def test_idle_after_quiet_period():
+	page = FakePage()
+	tracker = NetworkIdleTracker(page, idle_time=0.05)
+	tracker.attach()
+	assert not tracker.is_idle
+
+	assert await tracker.wait_for_idle(timeout=1)
+	# Stays idle without new requests, later waits return immediately
+	assert await tracker.wait_for_idle(timeout=0)
+
+
+async def test_pending_request_keeps_page_busy_until_response():
+	page = FakePage()
+	tracker = NetworkIdleTracker(page, idle_time=0.02)
+	tracker.attach()
+
+	request = FakeRequest('https://example.com/app.js')
+	page.emit('request', request)
+	assert not await tracker.wait_for_idle(timeout=0.1)
+
+	page.emit('response', FakeResponse(request))
+	assert await tracker.wait_for_idle(timeout=1)
+
+
+async def test_failed_and_finished_requests_are_not_pending():
+	page = FakePage()
+	tracker = NetworkIdleTracker(page, idle_time=0.02)
+	tracker.attach()
+
+	failed = FakeRequest('https://example.com/missing.js')
+	finished = FakeRequest('https://example.com/style.css', resource_type='stylesheet')
+	page.emit('request', failed)
+	page.emit('request', finished)
+	page.emit('requestfailed', failed)
+	page.emit('requestfinished', finished)
+
+	assert tracker.pending_requests == set()
+	assert await tracker.wait_for_idle(timeout=1)
+
+
+async def test_ignored_requests_do_not_delay_idle():
+	page = FakePage()
+	tracker = NetworkIdleTracker(page, idle_time=0.05)
+	tracker.attach()
+	await tracker.wait_for_idle(timeout=1)
+
+	for request in [
+		FakeRequest('https://www.google-analytics.com/collect'),
+		FakeRequest('https://example.com/stream', resource_type='media'),
+		FakeRequest('data:image/png;base64,AAAA', resource_type='image'),
+		FakeRequest('https://example.com/next', resource_type='document', headers={'purpose': 'prefetch'}),
+	]:
+		page.emit('request', request)
+
+	assert tracker.is_idle
+
+
+async def test_detach_removes_listeners():
+	page = FakePage()
+	tracker = NetworkIdleTracker(page, idle_time=0.01)
+	tracker.attach()
+	tracker.detach()
+
+	assert all(not handlers for handlers in page.listeners.values())
+	page.emit('request', FakeRequest('https://example.com/app.js'))
+	assert tracker.pending_requests == set()
+	await asyncio.sleep(0)
+
+
+def test_request_classifier_matches_substring_scan():
+	classifier = RequestClassifier()
+	urls = [
+		'https://www.google-analytics.com/collect?v=1',
+		'https://example.com/static/app.js',
+		'https://cdn.example.com/img/logo.png',
+		'https://d1234.CloudFront.net/bundle.js',
+		'https://example.com/api/heartbeat',
+		'data:image/png;base64,AAAA',
+		'https://widget.intercom.io/widget/abc',
+		'https://example.com/shopping-cart',
+	]
+	for url in urls:
+		expected = url.lower().startswith(('data:', 'blob:')) or any(p in url.lower() for p in IGNORED_URL_PATTERNS)
+		assert classifier.is_ignored_url(url) == expected, url
+
+
+def test_request_classifier_custom_lists():
+	classifier = RequestClassifier(ignored_url_patterns=['/api/poll'], ignored_hosts=['ads.example.net'])
+
+	assert classifier.is_ignored_url('https://example.com/api/poll?since=1')
+	assert classifier.is_ignored_url('https://ads.example.net/banner.js')
+	assert classifier.is_ignored_url('https://eu.ads.example.net/banner.js')
+	assert not classifier.is_ignored_url('https://example.net/ads.example.net.js')
+	assert not classifier.is_ignored_url('https://www.google-analytics.com/collect')
+
+	assert classifier.is_relevant_request(FakeRequest('https://example.com/app.js'))
+	assert not classifier.is_relevant_request(FakeRequest('https://example.com/app.js', resource_type='xhr'))
@@ -0,0 +1,190 @@
+import asyncio
+
+import pytest
+
+from browser_use.browser import pool as pool_module
+from browser_use.browser.pool import BrowserPool, BrowserPoolConfig
+
+
+class FakePlaywrightBrowser:
+	def __init__(self):
+		self.connected = True
+
+	def is_connected(self):
+		return self.connected
+
+
+class FakeBrowser:
+	launched: list['FakeBrowser'] = []
+
+	def __init__(self, config=None):
+		self.playwright_browser = None
+		self.closed = False
+
+	async def get_playwright_browser(self):
+		if self.playwright_browser is None:
+			await asyncio.sleep(0)
+			self.playwright_browser = FakePlaywrightBrowser()
+			FakeBrowser.launched.append(self)
+		return self.playwright_browser
+
+	async def close(self):
+		self.closed = True
+
+
+class FakePage:
+	def __init__(self, context):
+		self.context = context
+
+	async def evaluate(self, script):
+		if self.context.crashed:
+			raise RuntimeError('Target crashed')
+		return 1
+
+
+class FakeBrowserContext:
+	def __init__(self, browser, config=None):
+		self.browser = browser
+		self.session = None
+		self.cookies: dict = {}
+		self.crashed = False
+		self.resets = 0
+		self.closed = False
+
+	async def get_session(self):
+		self.session = object()
+		return self.session
+
+	async def get_current_page(self):
+		return FakePage(self)
+
+	async def reset_context(self):
+		self.resets += 1
+
+	async def close(self):
+		self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def fake_browsers(monkeypatch):
+	FakeBrowser.launched = []
+	monkeypatch.setattr(pool_module, 'Browser', FakeBrowser)
+	monkeypatch.setattr(pool_module, 'BrowserContext', FakeBrowserContext)
+
+
+async def test_start_warms_browsers_and_contexts():
+	pool = BrowserPool(BrowserPoolConfig(browser_count=2, contexts_per_browser=3))
+	await pool.start()
+
+	assert len(FakeBrowser.launched) == 2
+	assert pool.idle_count == 6
+	assert all(context.session is not None for context in (p.context for p in pool._idle))
+
+	await pool.close()
+	assert all(browser.closed for browser in FakeBrowser.launched)
+
+
+async def test_context_is_reused_for_same_tenant_only():
+	pool = BrowserPool(BrowserPoolConfig(browser_count=1, contexts_per_browser=1))
+	await pool.start()
+
+	async with pool.acquire('tenant-a') as first:
+		first.cookies['session'] = 'a'
+		assert pool.in_use_count == 1
+	assert first.resets == 1
+
+	async with pool.acquire('tenant-a') as second:
+		assert second is first
+		assert second.cookies == {'session': 'a'}
+
+	async with pool.acquire('tenant-b') as third:
+		assert third is not first
+		assert third.cookies == {}
+	assert first.closed
+
+	await pool.close()
+
+
+async def test_anonymous_contexts_are_not_shared():
+	pool = BrowserPool(BrowserPoolConfig(browser_count=1, contexts_per_browser=1))
+	await pool.start()
+
+	async with pool.acquire() as first:
+		first.cookies['session'] = 'anonymous'
+	assert first.closed
+
+	async with pool.acquire() as second:
+		assert second is not first
+		assert second.cookies == {}
+		second.cookies['session'] = 'anonymous'
+
+	async with pool.acquire('tenant-a') as third:
+		assert third is not second
+		assert third.cookies == {}
+		third.cookies['session'] = 'a'
+
+	async with pool.acquire() as fourth:
+		assert fourth is not third
+		assert fourth.cookies == {}
+	assert pool.idle_count == 1
+
+	await pool.close()
+
+
+async def test_unhealthy_context_is_replaced():
+	pool = BrowserPool(BrowserPoolConfig(browser_count=1, contexts_per_browser=1))
+	await pool.start()
+
+	async with pool.acquire('tenant-a') as context:
+		context.crashed = True
+
+	async with pool.acquire('tenant-a') as replacement:
+		assert replacement is not context
+		assert context.closed
+
+	await pool.close()
+
+
+async def test_contexts_and_browsers_are_recycled_after_max_uses():
+	pool = BrowserPool(BrowserPoolConfig(browser_count=1, contexts_per_browser=1, max_context_uses=2, max_browser_uses=3))
+	await pool.start()
+	first_browser = FakeBrowser.launched[0]
+
+	contexts = []
+	for _ in range(3):
+		async with pool.acquire('tenant-a') as context:
+			contexts.append(context)
+
+	assert contexts[0] is contexts[1]
+	assert contexts[2] is not contexts[1]
+	assert contexts[1].closed
+	# The third use retired the browser, its last context was replaced on a new browser
+	assert first_browser.closed
+	assert len(FakeBrowser.launched) == 2
+	assert pool.idle_count == 1
+
+	await pool.close()
+
+
+async def test_acquire_waits_for_a_free_context():
+	pool = BrowserPool(BrowserPoolConfig(browser_count=1, contexts_per_browser=1, acquire_timeout=0.05))
+	await pool.start()
+
+	async with pool.acquire():
+		with pytest.raises(TimeoutError):
+			async with pool.acquire():
+				pass
+
+	order = []
+
+	async def task(name):
+		async with pool.acquire():
+			order.append(name)
+			await asyncio.sleep(0.01)
+
+	pool.config.acquire_timeout = 1
+	await asyncio.gather(task('a'), task('b'), task('c'))
+	assert sorted(order) == ['a', 'b', 'c']
+	assert pool.idle_count == 1
+
+	await pool.close()
@@ -0,0 +1,79 @@
+"""
+Micro-benchmark of the request classifier used by the network idle tracker.
+
+Run with `pytest browser_use/browser/tests/request_classifier_benchmark_test.py --benchmark-only`.
+"""
+
+import random
+from dataclasses import dataclass, field
+
+import pytest
+
+from browser_use.browser.network import IGNORED_URL_PATTERNS, RELEVANT_RESOURCE_TYPES, RequestClassifier
+
+pytest.importorskip('pytest_benchmark')
+
+pytestmark = pytest.mark.slow
+
+
+@dataclass(eq=False)
+class HarRequest:
+	url: str
+	resource_type: str
+	headers: dict = field(default_factory=dict)
+
+
+def make_har_requests(count: int = 5_000, seed: int = 0) -> list[HarRequest]:
+	"""Request log shaped like the HAR of an ad-heavy news page"""
+	rng = random.Random(seed)
+	first_party = [
+		('https://www.news-site.com/{}/article-{}.html', 'document'),
+		('https://static.news-site.com/js/chunk-{}.{}.js', 'script'),
+		('https://static.news-site.com/css/main-{}.{}.css', 'stylesheet'),
+		('https://img.news-site.com/{}/photo-{}.jpg', 'image'),
+		('https://fonts.gstatic.com/s/{}/font-{}.woff2', 'font'),
+		('https://www.news-site.com/api/{}/comments?page={}', 'xhr'),
+	]
+	third_party = [
+		('https://www.google-analytics.com/g/collect?v=2&tid={}&_p={}', 'xhr'),
+		('https://securepubads.g.doubleclick.net/gampad/ads?iu={}&sz={}', 'script'),
+		('https://pixel.adsystem.example/{}/beacon?id={}', 'image'),
+		('https://d3k{}.cloudfront.net/prebid/{}.js', 'script'),
+		('https://widget.intercom.io/widget/{}?v={}', 'script'),
+		('https://connect.facebook.net/{}/sdk.js?hash={}', 'script'),
+	]
+	requests = []
+	for _ in range(count):
+		template, resource_type = rng.choice(third_party if rng.random() < 0.7 else first_party)
+		requests.append(HarRequest(template.format(rng.randint(0, 999), rng.randint(0, 99_999)), resource_type))
+	return requests
+
+
+def substring_scan_is_relevant(request: HarRequest) -> bool:
+	"""The per request substring scan the classifier replaces"""
+	if request.resource_type not in RELEVANT_RESOURCE_TYPES:
+		return False
+	url = request.url.lower()
+	if any(pattern in url for pattern in IGNORED_URL_PATTERNS):
+		return False
+	if url.startswith(('data:', 'blob:')):
+		return False
+	return True
+
+
+HAR_REQUESTS = make_har_requests()
+
+
+def test_substring_scan(benchmark):
+	relevant = benchmark(lambda: sum(substring_scan_is_relevant(request) for request in HAR_REQUESTS))
+	benchmark.extra_info['requests'] = len(HAR_REQUESTS)
+	benchmark.extra_info['relevant'] = relevant
+
+
+def test_request_classifier(benchmark):
+	classifier = RequestClassifier()
+	relevant = benchmark(lambda: sum(classifier.is_relevant_request(request) for request in HAR_REQUESTS))
+	benchmark.extra_info['requests'] = len(HAR_REQUESTS)
+	benchmark.extra_info['relevant'] = relevant
+
+	assert relevant == sum(substring_scan_is_relevant(request) for request in HAR_REQUESTS)
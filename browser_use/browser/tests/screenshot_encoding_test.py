@@ -0,0 +1,93 @@
+import base64
+import io
+
+import pytest
+
+from browser_use.browser.context import BrowserContext, BrowserContextConfig
+from browser_use.browser.screenshot import ScreenshotHash, encode_screenshot, hash_screenshot
+from browser_use.llm.tokenizer import CharacterTokenizer, image_size
+
+Image = pytest.importorskip('PIL.Image')
+
+
+def image(width: int, height: int, format: str = 'png') -> bytes:
+	output = io.BytesIO()
+	Image.new('RGB', (width, height), (200, 40, 40)).save(output, format=format.upper())
+	return output.getvalue()
+
+
+def page(*boxes: tuple[int, int, int, int]) -> bytes:
+	screenshot = Image.new('RGB', (1280, 1100), (255, 255, 255))
+	for box in boxes:
+		screenshot.paste((30, 30, 30), box)
+	output = io.BytesIO()
+	screenshot.save(output, format='PNG')
+	return output.getvalue()
+
+
+class FakePage:
+	def __init__(self):
+		self.screenshot_options = {}
+
+	async def bring_to_front(self):
+		pass
+
+	async def wait_for_load_state(self):
+		pass
+
+	async def evaluate(self, script, padding):
+		return {'x': 10, 'y': 20, 'width': 300, 'height': 200}
+
+	async def screenshot(self, **options):
+		self.screenshot_options = options
+		clip = options['clip']
+		width, height = (int(clip['width']), int(clip['height'])) if clip else (1280, 1100)
+		return image(width, height, options['type'])
+
+
+@pytest.mark.parametrize('format', ['png', 'jpeg', 'webp'])
+def test_encode_screenshot_downscales_and_converts(format):
+	encoded = encode_screenshot(image(1280, 1100), format=format, max_dimension=640, grayscale=True)
+
+	with Image.open(io.BytesIO(base64.b64decode(encoded))) as screenshot:
+		assert screenshot.format == format.upper()
+		assert screenshot.size == (640, 550)
+		red, green, blue = screenshot.convert('RGB').getpixel((0, 0))
+		assert abs(red - green) <= 2 and abs(green - blue) <= 2
+	assert image_size(f'data:image/{format};base64,{encoded}') == (640, 550)
+
+
+async def test_take_screenshot_crops_to_highlights_and_sizes_tokens():
+	page = FakePage()
+	context = BrowserContext(
+		browser=None,
+		config=BrowserContextConfig(screenshot_format='jpeg', screenshot_crop_to_highlights=True),
+	)
+
+	async def get_current_page():
+		return page
+
+	context.get_current_page = get_current_page
+
+	encoded = await context.take_screenshot()
+
+	# Playwright encodes JPEG without a processing step
+	assert page.screenshot_options['type'] == 'jpeg'
+	assert page.screenshot_options['clip'] == {'x': 10, 'y': 20, 'width': 300, 'height': 200}
+	url = f'data:image/jpeg;base64,{encoded}'
+	assert image_size(url) == (300, 200)
+	assert CharacterTokenizer().count_image(url) == 85 + 170
+
+
+def test_hash_screenshot_matches_nearly_identical_frames():
+	frame = hash_screenshot(page((100, 100, 600, 160), (100, 400, 900, 800)))
+	# a blinking cursor
+	cursor = hash_screenshot(page((100, 100, 600, 160), (100, 400, 900, 800), (610, 110, 612, 150)))
+	other = hash_screenshot(page((700, 100, 1200, 500)))
+
+	assert frame.exact != cursor.exact
+	assert frame.matches(cursor, threshold=4)
+	assert not frame.matches(other, threshold=4)
+	# without a perceptual hash only identical screenshots match
+	assert not ScreenshotHash(exact=frame.exact).matches(cursor, threshold=4)
+	assert ScreenshotHash(exact=frame.exact).matches(frame, threshold=0)
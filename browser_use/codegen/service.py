@@ -0,0 +1,315 @@
+"""
+Compiles the history of an agent run into a standalone Playwright script.
+"""
+
+import logging
+import re
+from typing import Awaitable, Callable, Optional
+from urllib.parse import quote_plus
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import HumanMessage
+
+from browser_use.agent.views import AgentHistoryList
+from browser_use.codegen.views import CompiledAction, EmitContext, PlaywrightScriptConfig
+from browser_use.dom.history_tree_processor.view import DOMHistoryElement
+from browser_use.llm.service import LLMInvoker
+
+logger = logging.getLogger(__name__)
+
+Emitter = Callable[[CompiledAction, EmitContext], list[str]]
+
+SECRET_PATTERN = re.compile(r'<secret>(.*?)</secret>')
+INDENT = '    '
+
+
+class PlaywrightScriptCompiler:
+	"""
+	Turns an AgentHistoryList into a runnable Playwright script without calling an LLM.
+
+	Every controller action is translated by one emitter into Playwright statements. Elements are
+	located by the css selector recorded in the history, with the xpath as fallback. Placeholders
+	of sensitive data are read from environment variables of the same name. Actions without an
+	emitter, e.g. custom actions, become a comment unless an emitter is registered for them.
+
+	Example:
+		compiler = PlaywrightScriptCompiler(PlaywrightScriptConfig(mode='async'))
+		compiler.register_emitter('upload_file', emit_upload_file)
+		script = compiler.compile(agent.state.history)
+	"""
+
+	def __init__(self, config: PlaywrightScriptConfig = PlaywrightScriptConfig()):
+		self.config = config
+		self.emitters: dict[str, Emitter] = {
+			'search_google': self._emit_search_google,
+			'go_to_url': self._emit_go_to_url,
+			'go_back': self._emit_go_back,
+			'click_element': self._emit_click_element,
+			'input_text': self._emit_input_text,
+			'switch_tab': self._emit_switch_tab,
+			'open_tab': self._emit_open_tab,
+			'extract_content': self._emit_extract_content,
+			'scroll_down': self._emit_scroll_down,
+			'scroll_up': self._emit_scroll_up,
+			'send_keys': self._emit_send_keys,
+			'scroll_to_text': self._emit_scroll_to_text,
+			'get_dropdown_options': self._emit_get_dropdown_options,
+			'select_dropdown_option': self._emit_select_dropdown_option,
+			'done': self._emit_done,
+		}
+
+	def register_emitter(self, action_name: str, emitter: Emitter) -> None:
+		"""Translate `action_name` with `emitter`, replaces the emitter of a default action"""
+		self.emitters[action_name] = emitter
+
+	def compile(self, history: AgentHistoryList) -> str:
+		"""The Playwright script replaying the executed actions of `history`"""
+		context = EmitContext(config=self.config)
+		body: list[str] = []
+		for action in self.executed_actions(history):
+			emitter = self.emitters.get(action.name)
+			if emitter is None:
+				body.append(f'# Unsupported action {action.name}({action.params})')
+				continue
+			try:
+				body.extend(emitter(action, context))
+			except ValueError as e:
+				logger.warning(f'Could not compile action {action.name}: {e}')
+				body.append(f'# {e}')
+
+		if self.config.screenshot:
+			context.imports.add('import datetime')
+			body.append(
+				f"{context.aw}page.screenshot(path='screenshot' + datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%S') + '.png')"
+			)
+
+		return self._render(body, context)
+
+	def executed_actions(self, history: AgentHistoryList) -> list[CompiledAction]:
+		"""The actions of `history` which were executed, in order"""
+		actions = []
+		for item in history.history:
+			if item.model_output is None:
+				continue
+			for i, action in enumerate(item.model_output.action):
+				# Actions after a failed or done action of a step were not executed
+				if i >= len(item.result):
+					break
+				result = item.result[i]
+				if result.error and self.config.skip_failed_actions:
+					continue
+
+				name, params = next(iter(action.model_dump(exclude_unset=True).items()), (None, None))
+				if name is None:
+					continue
+				element = item.state.interacted_element[i] if i < len(item.state.interacted_element) else None
+				actions.append(CompiledAction(name=name, params=params or {}, element=element, result=result))
+		return actions
+
+	# Script -----------------------------------------------------------------
+
+	def _render(self, body: list[str], context: EmitContext) -> str:
+		headless = 'True' if self.config.headless else 'False'
+		if self.config.mode == 'async':
+			imports = sorted(context.imports | {'import asyncio'})
+			playwright_import = 'from playwright.async_api import async_playwright'
+			head = [
+				'async def run(playwright):',
+				f'{INDENT}browser = await playwright.chromium.launch(headless={headless})',
+				f'{INDENT}context = await browser.new_context()',
+				f'{INDENT}page = await context.new_page()',
+			]
+			tail = [
+				f'{INDENT}await browser.close()',
+				'',
+				'',
+				'async def main():',
+				f'{INDENT}async with async_playwright() as playwright:',
+				f'{INDENT}{INDENT}await run(playwright)',
+				'',
+				'',
+				"if __name__ == '__main__':",
+				f'{INDENT}asyncio.run(main())',
+			]
+		else:
+			imports = sorted(context.imports)
+			playwright_import = 'from playwright.sync_api import sync_playwright'
+			head = [
+				'def run(playwright):',
+				f'{INDENT}browser = playwright.chromium.launch(headless={headless})',
+				f'{INDENT}context = browser.new_context()',
+				f'{INDENT}page = context.new_page()',
+			]
+			tail = [
+				f'{INDENT}browser.close()',
+				'',
+				'',
+				"if __name__ == '__main__':",
+				f'{INDENT}with sync_playwright() as playwright:',
+				f'{INDENT}{INDENT}run(playwright)',
+			]
+
+		lines = [*imports, '', playwright_import] if imports else [playwright_import]
+		lines += ['', '', *head, *(f'{INDENT}{line}' if line else '' for line in body), *tail]
+		return '\n'.join(lines) + '\n'
+
+	def _locator(self, element: Optional[DOMHistoryElement], action: CompiledAction) -> str:
+		if element is None:
+			xpath = action.params.get('xpath')
+			if not xpath:
+				raise ValueError(f'No element recorded for {action.name}({action.params})')
+			return f'page.locator({repr("xpath=//" + xpath.lstrip("/"))})'
+
+		xpath_locator = f'page.locator({repr("xpath=//" + element.xpath.lstrip("/"))})'
+		if element.css_selector:
+			return f'page.locator({element.css_selector!r}).or_({xpath_locator}).first'
+		return xpath_locator
+
+	def _text_expression(self, text: str, context: EmitContext) -> str:
+		"""Python expression for `text`, placeholders of sensitive data are read from the environment"""
+		parts = SECRET_PATTERN.split(text)
+		if len(parts) == 1:
+			return repr(text)
+
+		context.imports.add('import os')
+		expressions = []
+		for i, part in enumerate(parts):
+			if i % 2:
+				expressions.append(f'os.environ[{part!r}]')
+			elif part:
+				expressions.append(repr(part))
+		return ' + '.join(expressions)
+
+	def _wait_after_navigation(self, context: EmitContext) -> list[str]:
+		lines = [f'{context.aw}page.wait_for_load_state()']
+		if self.config.wait_after_navigation:
+			lines.append(f'{context.aw}page.wait_for_timeout({self.config.wait_after_navigation})')
+		return lines
+
+	# Emitters ---------------------------------------------------------------
+
+	def _emit_search_google(self, action: CompiledAction, context: EmitContext) -> list[str]:
+		url = f'https://www.google.com/search?q={quote_plus(action.params["query"])}&udm=14'
+		return [f'{context.aw}page.goto({url!r})', *self._wait_after_navigation(context)]
+
+	def _emit_go_to_url(self, action: CompiledAction, context: EmitContext) -> list[str]:
+		return [f'{context.aw}page.goto({action.params["url"]!r})', *self._wait_after_navigation(context)]
+
+	def _emit_go_back(self, action: CompiledAction, context: EmitContext) -> list[str]:
+		return [f'{context.aw}page.go_back()', *self._wait_after_navigation(context)]
+
+	def _emit_click_element(self, action: CompiledAction, context: EmitContext) -> list[str]:
+		locator = self._locator(action.element, action)
+		message = (action.result.extracted_content or '') if action.result else ''
+		if 'New tab opened' not in message:
+			return [f'{context.aw}{locator}.click()']
+
+		# The click opened a new tab, continue in it like the agent did
+		if self.config.mode == 'async':
+			return [
+				'async with context.expect_page() as new_page_info:',
+				f'{INDENT}await {locator}.click()',
+				'page = await new_page_info.value',
+				*self._wait_after_navigation(context),
+			]
+		return [
+			'with context.expect_page() as new_page_info:',
+			f'{INDENT}{locator}.click()',
+			'page = new_page_info.value',
+			*self._wait_after_navigation(context),
+		]
+
+	def _emit_input_text(self, action: CompiledAction, context: EmitContext) -> list[str]:
+		locator = self._locator(action.element, action)
+		return [f'{context.aw}{locator}.fill({self._text_expression(action.params["text"], context)})']
+
+	def _emit_switch_tab(self, action: CompiledAction, context: EmitContext) -> list[str]:
+		return [f'page = context.pages[{action.params["page_id"]}]', f'{context.aw}page.bring_to_front()']
+
+	def _emit_open_tab(self, action: CompiledAction, context: EmitContext) -> list[str]:
+		return [
+			f'page = {context.aw}context.new_page()',
+			f'{context.aw}page.goto({action.params["url"]!r})',
+			*self._wait_after_navigation(context),
+		]
+
+	def _emit_extract_content(self, action: CompiledAction, context: EmitContext) -> list[str]:
+		return [
+			f'# Extraction goal: {action.params.get("goal", "")}'.rstrip(),
+			f"print({context.aw}page.inner_text('body'))",
+		]
+
+	def _emit_scroll_down(self, action: CompiledAction, context: EmitContext) -> list[str]:
+		amount = action.params.get('amount')
+		if amount is None:
+			return [f"{context.aw}page.evaluate('window.scrollBy(0, window.innerHeight)')"]
+		return [f'{context.aw}page.mouse.wheel(0, {int(amount)})']
+
+	def _emit_scroll_up(self, action: CompiledAction, context: EmitContext) -> list[str]:
+		amount = action.params.get('amount')
+		if amount is None:
+			return [f"{context.aw}page.evaluate('window.scrollBy(0, -window.innerHeight)')"]
+		return [f'{context.aw}page.mouse.wheel(0, -{int(amount)})']
+
+	def _emit_send_keys(self, action: CompiledAction, context: EmitContext) -> list[str]:
+		return [f'{context.aw}page.keyboard.press({action.params["keys"]!r})']
+
+	def _emit_scroll_to_text(self, action: CompiledAction, context: EmitContext) -> list[str]:
+		return [f'{context.aw}page.get_by_text({action.params["text"]!r}).first.scroll_into_view_if_needed()']
+
+	def _emit_get_dropdown_options(self, action: CompiledAction, context: EmitContext) -> list[str]:
+		# Only reads the page, the option is chosen by select_dropdown_option
+		return []
+
+	def _emit_select_dropdown_option(self, action: CompiledAction, context: EmitContext) -> list[str]:
+		locator = self._locator(action.element, action)
+		return [f'{context.aw}{locator}.select_option(label={action.params["text"]!r})']
+
+	def _emit_done(self, action: CompiledAction, context: EmitContext) -> list[str]:
+		return []
+
+
+POLISH_PROMPT = """You are given a Playwright script which was generated from a recorded browser automation run.
+Improve its readability without changing what it does: add short comments, name repeated locators, keep all selectors,
+waits and the order of the actions. Answer with the complete script in a single ```python code block.
+{task}
+```python
+{script}
+```"""
+
+
+async def polish_script(
+	script: str,
+	llm: BaseChatModel,
+	task: Optional[str] = None,
+	on_token: Optional[Callable[[str], Awaitable[None]]] = None,
+	llm_invoker: Optional[LLMInvoker] = None,
+) -> str:
+	"""
+	Let `llm` tidy up a compiled script. The compiled script is returned unchanged if the answer
+	contains no code block or the code does not compile. If `on_token` is set the answer is streamed
+	and every chunk is passed to it. The call uses the timeout of `llm_invoker`.
+	"""
+	prompt = POLISH_PROMPT.format(script=script, task=f'The task of the run was: {task}' if task else '')
+	llm_invoker = llm_invoker or LLMInvoker()
+	if on_token is None:
+		content = str((await llm_invoker.ainvoke(llm, [HumanMessage(content=prompt)], name='polish_script')).content)
+	else:
+		chunks = []
+		async for chunk in llm_invoker.astream(llm, [HumanMessage(content=prompt)], name='polish_script'):
+			if isinstance(chunk.content, str) and chunk.content:
+				chunks.append(chunk.content)
+				await on_token(chunk.content)
+		content = ''.join(chunks)
+	match = re.search(r'```python\s*\n(.*?)```', content, re.DOTALL)
+	if match is None:
+		logger.warning('Polished script contains no code block, keeping the compiled script')
+		return script
+
+	polished = match.group(1).strip() + '\n'
+	try:
+		compile(polished, '<polished script>', 'exec')
+	except SyntaxError as e:
+		logger.warning(f'Polished script does not compile, keeping the compiled script: {e}')
+		return script
+	return polished
@@ -0,0 +1,144 @@
+"""
+Golden file tests of the Playwright script compiler.
+
+Run with `UPDATE_GOLDEN=1 pytest browser_use/codegen/tests` to rewrite the golden files after an
+intended change of the generated scripts.
+"""
+
+import os
+from pathlib import Path
+
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from browser_use.agent.views import ActionResult, AgentBrain, AgentHistory, AgentHistoryList, AgentOutput
+from browser_use.browser.views import BrowserStateHistory
+from browser_use.codegen.service import PlaywrightScriptCompiler, polish_script
+from browser_use.codegen.views import PlaywrightScriptConfig
+from browser_use.controller.service import Controller
+from browser_use.dom.history_tree_processor.view import DOMHistoryElement
+
+GOLDEN_DIR = Path(__file__).parent / 'golden'
+
+ActionModel = Controller().registry.create_action_model()
+
+
+def element(xpath: str, css_selector: str | None, **attributes) -> DOMHistoryElement:
+	return DOMHistoryElement(
+		tag_name=xpath.rsplit('/', 1)[-1].split('[')[0],
+		xpath=xpath,
+		highlight_index=1,
+		entire_parent_branch_path=xpath.split('/'),
+		attributes=attributes,
+		css_selector=css_selector,
+	)
+
+
+def step(
+	actions: list[dict], results: list[ActionResult], elements: list[DOMHistoryElement | None] | None = None
+) -> AgentHistory:
+	brain = AgentBrain(page_summary='', evaluation_previous_goal='', memory='', next_goal='')
+	return AgentHistory(
+		model_output=AgentOutput(current_state=brain, action=[ActionModel(**action) for action in actions]),
+		result=results,
+		state=BrowserStateHistory(
+			url='https://shop.example.com',
+			title='Shop',
+			tabs=[],
+			interacted_element=elements or [None] * len(actions),
+		),
+	)
+
+
+def ok(message: str = '') -> ActionResult:
+	return ActionResult(extracted_content=message, include_in_memory=True)
+
+
+SEARCH_BOX = element('html/body/header/form/input', 'html > body > header > form > input[name="q"]', name='q')
+LOGIN_LINK = element('html/body/header/a[2]', None, href='/login')
+PASSWORD = element('html/body/main/form/input[2]', 'input[type="password"]', type='password')
+COUNTRY = element('html/body/main/form/select', 'select[name="country"]', name='country')
+ORDERS = element('html/body/nav/a[3]', 'a[href="/orders"]', href='/orders')
+
+HISTORY = AgentHistoryList(
+	history=[
+		step([{'go_to_url': {'url': 'https://shop.example.com'}}], [ok()]),
+		step(
+			[
+				{'input_text': {'index': 1, 'text': 'running shoes'}},
+				{'send_keys': {'keys': 'Enter'}},
+				# Not executed, the step stopped before it and it has no result
+				{'click_element': {'index': 9}},
+			],
+			[ok(), ok()],
+			[SEARCH_BOX, None, None],
+		),
+		step([{'click_element': {'index': 2}}], [ActionResult(error='Element not clickable')], [LOGIN_LINK]),
+		step([{'click_element': {'index': 2}}], [ok('Clicked button with index 2: Login')], [LOGIN_LINK]),
+		step(
+			[
+				{'input_text': {'index': 3, 'text': 'pre-<secret>password</secret>'}},
+				{'get_dropdown_options': {'index': 4}},
+				{'select_dropdown_option': {'index': 4, 'text': 'Germany'}},
+			],
+			[ok(), ok(), ok()],
+			[PASSWORD, COUNTRY, COUNTRY],
+		),
+		step([{'scroll_down': {}}, {'scroll_up': {'amount': 200}}], [ok(), ok()]),
+		step(
+			[{'click_element': {'index': 5}}],
+			[ok('Clicked button with index 5: Orders - New tab opened - switching to it')],
+			[ORDERS],
+		),
+		step([{'extract_content': {'goal': 'order numbers'}}, {'switch_tab': {'page_id': 0}}], [ok(), ok()]),
+		step([{'done': {'text': 'Found 3 orders'}}], [ActionResult(is_done=True, extracted_content='Found 3 orders')]),
+	]
+)
+
+
+def assert_matches_golden(script: str, name: str) -> None:
+	path = GOLDEN_DIR / name
+	if os.getenv('UPDATE_GOLDEN'):
+		path.write_text(script)
+	assert script == path.read_text()
+
+
+@pytest.mark.parametrize('mode', ['sync', 'async'])
+def test_compile_history(mode):
+	script = PlaywrightScriptCompiler(PlaywrightScriptConfig(mode=mode)).compile(HISTORY)
+
+	compile(script, f'history_{mode}.py', 'exec')
+	assert_matches_golden(script, f'history_{mode}.py.golden')
+
+
+def test_failed_actions_can_be_kept():
+	config = PlaywrightScriptConfig(skip_failed_actions=False, screenshot=False, wait_after_navigation=0)
+	script = PlaywrightScriptCompiler(config).compile(HISTORY)
+
+	assert script.count("page.locator('xpath=//html/body/header/a[2]').click()") == 2
+	assert 'datetime' not in script
+	assert 'wait_for_timeout' not in script
+
+
+def test_custom_emitter():
+	history = AgentHistoryList(history=[step([{'done': {'text': 'ok'}}], [ok()])])
+	compiler = PlaywrightScriptCompiler(PlaywrightScriptConfig(screenshot=False))
+	compiler.register_emitter('done', lambda action, context: [f'print({action.params["text"]!r})'])
+
+	assert "    print('ok')\n" in compiler.compile(history)
+
+
+async def test_polish_script_streams_answer():
+	answer = "Tidied up:\n```python\nprint('polished')\n```"
+	llm = GenericFakeChatModel(messages=iter([AIMessage(content=answer)]))
+	tokens = []
+
+	async def on_token(token: str):
+		tokens.append(token)
+
+	polished = await polish_script("print('compiled')\n", llm, on_token=on_token)
+
+	assert polished == "print('polished')\n"
+	assert len(tokens) > 1
+	assert ''.join(tokens) == answer
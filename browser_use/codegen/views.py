@@ -0,0 +1,59 @@
+from dataclasses import dataclass, field
+from typing import Literal, Optional
+
+from browser_use.agent.views import ActionResult
+from browser_use.dom.history_tree_processor.view import DOMHistoryElement
+
+ScriptMode = Literal['sync', 'async']
+
+
+@dataclass
+class PlaywrightScriptConfig:
+	"""
+	Configuration for compiling an agent history into a Playwright script.
+
+	Default values:
+		mode: 'sync'
+			Generate a script for the sync or the async Playwright API
+
+		headless: False
+			Whether the generated script launches the browser in headless mode
+
+		wait_after_navigation: 3000
+			Milliseconds the script waits after every navigation before the next action
+
+		skip_failed_actions: True
+			Leave out actions which failed during the agent run
+
+		screenshot: True
+			Take a screenshot named 'screenshot<timestamp>.png' at the end of the script
+	"""
+
+	mode: ScriptMode = 'sync'
+	headless: bool = False
+	wait_after_navigation: int = 3000
+	skip_failed_actions: bool = True
+	screenshot: bool = True
+
+
+@dataclass
+class EmitContext:
+	"""State of the script while it is being compiled, passed to every emitter"""
+
+	config: PlaywrightScriptConfig
+	imports: set[str] = field(default_factory=set)
+
+	@property
+	def aw(self) -> str:
+		"""Prefix for calls which are awaited in the async API"""
+		return 'await ' if self.config.mode == 'async' else ''
+
+
+@dataclass
+class CompiledAction:
+	"""One action of the history with everything an emitter needs"""
+
+	name: str
+	params: dict
+	element: Optional[DOMHistoryElement]
+	result: Optional[ActionResult]
@@ -11,6 +11,7 @@ from browser_use.controller.registry.views import (
 	ActionRegistry,
 	RegisteredAction,
 )
+from browser_use.llm.service import LLMInvoker
 from browser_use.telemetry.service import ProductTelemetry
 from browser_use.telemetry.views import (
 	ControllerRegisteredFunctionsTelemetryEvent,
@@ -27,6 +28,10 @@ class Registry(Generic[Context]):
 		self.registry = ActionRegistry()
 		self.telemetry = ProductTelemetry()
 		self.exclude_actions = exclude_actions
+		# Incremented by every registered action, the action model is rebuilt only for a new revision
+		self.revision = 0
+		self._action_model: Optional[tuple[int, Type[ActionModel]]] = None
+		self._prompt_description: Optional[tuple[int, str]] = None
 
 	def _create_param_model(self, function: Callable) -> Type[BaseModel]:
 		"""Creates a Pydantic model from function signature"""
@@ -34,7 +39,7 @@ class Registry(Generic[Context]):
 		params = {
 			name: (param.annotation, ... if param.default == param.empty else param.default)
 			for name, param in sig.parameters.items()
-			if name != 'browser' and name != 'page_extraction_llm' and name != 'available_file_paths'
+			if name not in ('browser', 'page_extraction_llm', 'available_file_paths', 'llm_invoker')
 		}
 		# TODO: make the types here work
 		return create_model(
@@ -79,6 +84,7 @@ class Registry(Generic[Context]):
 				param_model=actual_param_model,
 			)
 			self.registry.actions[func.__name__] = action
+			self.revision += 1
 			return func
 
 		return decorator
@@ -93,6 +99,7 @@ class Registry(Generic[Context]):
 		available_file_paths: Optional[list[str]] = None,
 		#
 		context: Context | None = None,
+		llm_invoker: Optional[LLMInvoker] = None,
 	) -> Any:
 		"""Execute a registered action"""
 		if action_name not in self.registry.actions:
@@ -133,6 +140,8 @@ class Registry(Generic[Context]):
 				extra_args['page_extraction_llm'] = page_extraction_llm
 			if 'available_file_paths' in parameter_names:
 				extra_args['available_file_paths'] = available_file_paths
+			if 'llm_invoker' in parameter_names:
+				extra_args['llm_invoker'] = llm_invoker or LLMInvoker()
 			if action_name == 'input_text' and sensitive_data:
 				extra_args['has_sensitive_data'] = True
 			if is_pydantic:
@@ -168,7 +177,10 @@ class Registry(Generic[Context]):
 		return params
 
 	def create_action_model(self) -> Type[ActionModel]:
-		"""Creates a Pydantic model from registered actions"""
+		"""Creates a Pydantic model from registered actions, the model is reused until another action is registered"""
+		if self._action_model is not None and self._action_model[0] == self.revision:
+			return self._action_model[1]
+
 		fields = {
 			name: (
 				Optional[action.param_model],
@@ -186,8 +198,12 @@ class Registry(Generic[Context]):
 			)
 		)
 
-		return create_model('ActionModel', __base__=ActionModel, **fields)  # type:ignore
+		action_model = create_model('ActionModel', __base__=ActionModel, **fields)  # type:ignore
+		self._action_model = (self.revision, action_model)
+		return action_model
 
 	def get_prompt_description(self) -> str:
 		"""Get a description of all actions for the prompt"""
-		return self.registry.get_prompt_description()
+		if self._prompt_description is None or self._prompt_description[0] != self.revision:
+			self._prompt_description = (self.revision, self.registry.get_prompt_description())
+		return self._prompt_description[1]
@@ -1,6 +1,7 @@
 import asyncio
 import json
 import logging
+import time
 from typing import Dict, Generic, Optional, Type, TypeVar
 
 from browser_use.browser.context import BrowserContext
@@ -10,6 +11,7 @@ from langchain_core.prompts import PromptTemplate
 # from lmnr.sdk.laminar import Laminar
 from pydantic import BaseModel
 
+from browser_use.agent.action_trace.service import ActionTrace
 from browser_use.agent.views import ActionModel, ActionResult
 from browser_use.controller.registry.service import Registry
 from browser_use.controller.views import (
@@ -24,24 +26,12 @@ from browser_use.controller.views import (
 	SendKeysAction,
 	SwitchTabAction,
 )
+from browser_use.dom.views import DOMElementNode
+from browser_use.llm.service import LLMInvoker
 from browser_use.utils import time_execution_sync
 
 logger = logging.getLogger(__name__)
 
-# 1. 创建一个日志记录器对象
-logger_p = logging.getLogger('logger_p')
-logger_p.setLevel(logging.DEBUG)  # 设置日志级别为DEBUG
-
-# 2. 创建一个日志处理器，用于将日志写入文件
-import os
-# 获取项目根目录
-ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-file_handler = logging.FileHandler(os.path.join(ROOT_DIR, 'examples/rpa/llm_context.log'))
-file_handler.setLevel(logging.DEBUG)
-
-# 3. 将处理器添加到日志记录器中
-logger_p.addHandler(file_handler)
-
 Context = TypeVar('Context')
 
 
@@ -53,63 +43,6 @@ class Controller(Generic[Context]):
 	):
 		self.registry = Registry[Context](exclude_actions)
 
-		# 添加内部方法用于日志记录元素关键信息
-		def _log_element_info(element_node, action_type: str = "Element info"):
-			"""记录可被 Playwright 识别的元素关键属性信息"""
-			attributes_info = {}
-			
-			# 收集关键属性
-			for key, value in element_node.attributes.items():
-				# 只保留 Playwright 常用的识别属性
-				if key in ['id', 'class', 'name', 'type', 'value', 'placeholder', 'role', 'aria-label', 'data-testid', 'title']:
-					attributes_info[key] = value
-			
-			# 构建元素选择器信息
-			selectors = []
-			
-			# ID 选择器 (优先级最高)
-			if 'id' in attributes_info:
-				selectors.append(f"#id selector: #{attributes_info['id']}")
-			
-			# CSS 类选择器
-			if 'class' in attributes_info:
-				class_names = attributes_info['class'].strip().split()
-				if class_names:
-					selectors.append(f"CSS class selector: .{'.'.join(class_names)}")
-			
-			# 其他属性选择器
-			for key, value in attributes_info.items():
-				if key not in ['id', 'class']:
-					selectors.append(f"Attribute selector: [{key}=\"{value}\"]")
-			
-			# XPath 选择器
-			selectors.append(f"XPath: {element_node.xpath}")
-			
-			# 文本选择器 (如果有文本内容)
-			text_content = element_node.get_all_text_till_next_clickable_element(max_depth=1)
-			if text_content and len(text_content) < 100:  # 限制文本长度
-				selectors.append(f"Text selector: :text(\"{text_content}\")")
-			
-			# 确定元素是否在视口内
-			viewport_status = "in viewport" if element_node.is_in_viewport else "not in viewport"
-			
-			# 记录日志
-			logger_p.debug(f"------------------ {action_type} ------------------")
-			logger_p.debug(f"Element: <{element_node.tag_name}> ")
-			logger_p.debug(f"Interactive: {element_node.is_interactive}, Top element: {element_node.is_top_element}")
-			
-			if attributes_info:
-				logger_p.debug(f"Key attributes: {attributes_info}")
-			
-			logger_p.debug("Playwright selectors:")
-			for i, selector in enumerate(selectors, 1):
-				logger_p.debug(f"  {i}. {selector}")
-				
-			if element_node.viewport_coordinates:
-				logger_p.debug(f"Viewport coordinates: {element_node.viewport_coordinates}")
-				
-			logger_p.debug("--------------------------------------------------")
-
 		"""Register all default browser actions"""
 
 		if output_model is not None:
@@ -140,7 +73,6 @@ class Controller(Generic[Context]):
 		@self.registry.action('Navigate to URL in the current tab', param_model=GoToUrlAction)
 		async def go_to_url(params: GoToUrlAction, browser: BrowserContext):
 			logger.debug("ME_go_to_url "+params.url)
-			logger_p.debug(" Navigate action, navigate to URL in the current tab , and url is " + params.url)
 			page = await browser.get_current_page()
 			await page.goto(params.url)
 			await page.wait_for_load_state()
@@ -153,7 +85,6 @@ class Controller(Generic[Context]):
 			await browser.go_back()
 			msg = '🔙  Navigated back'
 			logger.info(msg)
-			logger_p.debug(" Navigated back ")
 			return ActionResult(extracted_content=msg, include_in_memory=True)
 
 		# Element Interaction Actions
@@ -176,9 +107,6 @@ class Controller(Generic[Context]):
 			msg = None
 
 			try:
-				# 在点击前记录元素信息
-				_log_element_info(element_node, "Click element")
-				
 				download_path = await browser._click_element_node(element_node)
 				if download_path:
 					msg = f'💾  Downloaded file to {download_path}'
@@ -207,10 +135,7 @@ class Controller(Generic[Context]):
 				raise Exception(f'Element index {params.index} does not exist - retry or use alternative actions')
 
 			element_node = await browser.get_dom_element_by_index(params.index)
-			
-			# 在输入前记录元素信息
-			_log_element_info(element_node, "Input text")
-			
+
 			await browser._input_text_element_node(element_node, params.text)
 			if not has_sensitive_data:
 				msg = f'⌨️  Input {params.text} into index {params.index}'
@@ -230,8 +155,6 @@ class Controller(Generic[Context]):
 			await page.wait_for_load_state()
 			msg = f'🔄  Switched to tab {params.page_id}'
 			logger.info(msg)
-			logger_p.debug(
-				" This is a switch tab, and page_id : "+{params.page_id}.__str__())
 			return ActionResult(extracted_content=msg, include_in_memory=True)
 
 		@self.registry.action('Open url in new tab', param_model=OpenTabAction)
@@ -240,23 +163,26 @@ class Controller(Generic[Context]):
 			msg = f'🔗  Opened new tab with {params.url}'
 			logger.info(msg)
 			logger.debug(f' open_tab | : ')
-			logger_p.debug(" Open url in new tab , and url is : " + params.url)
 			return ActionResult(extracted_content=msg, include_in_memory=True)
 
 		# Content Actions
 		@self.registry.action(
 			'Extract page content to retrieve specific information from the page, e.g. all company names, a specifc description, all information about, links with companies in structured format or simply links',
 		)
-		async def extract_content(goal: str, browser: BrowserContext, page_extraction_llm: BaseChatModel):
+		async def extract_content(
+			goal: str, browser: BrowserContext, page_extraction_llm: BaseChatModel, llm_invoker: LLMInvoker
+		):
 			page = await browser.get_current_page()
 			import markdownify
-			# 把html 转换成 md
-			content = markdownify.markdownify(await page.content())
+			# 把html 转换成 md，大页面的转换很慢，放到线程中执行
+			content = await asyncio.to_thread(markdownify.markdownify, await page.content())
 
 			prompt = 'Your task is to extract the content of the page. You will be given a page and a goal and you should extract all relevant information around this goal from the page. If the goal is vague, summarize the page. Respond in json format. Extraction goal: {goal}, Page: {page}'
 			template = PromptTemplate(input_variables=['goal', 'page'], template=prompt)
 			try:
-				output = page_extraction_llm.invoke(template.format(goal=goal, page=content))
+				output = await llm_invoker.ainvoke(
+					page_extraction_llm, template.format(goal=goal, page=content), name='extract_content'
+				)
 				msg = f'📄  Extracted from page\n: {output.content}\n'
 				logger.info(msg)
 				return ActionResult(extracted_content=msg, include_in_memory=True)
@@ -279,8 +205,6 @@ class Controller(Generic[Context]):
 
 			amount = f'{params.amount} pixels' if params.amount is not None else 'one page'
 			msg = f'🔍  Scrolled down the page by {amount}'
-			logger_p.debug(
-				" Scrolled down the page by " + amount)
 			logger.info(msg)
 			return ActionResult(
 				extracted_content=msg,
@@ -301,8 +225,6 @@ class Controller(Generic[Context]):
 
 			amount = f'{params.amount} pixels' if params.amount is not None else 'one page'
 			msg = f'🔍  Scrolled up the page by {amount}'
-			logger_p.debug(
-				" Scrolled up the page by " + amount)
 			logger.info(msg)
 			return ActionResult(
 				extracted_content=msg,
@@ -331,10 +253,6 @@ class Controller(Generic[Context]):
 				else:
 					raise e
 			msg = f'⌨️  Sent keys: {params.keys}'
-			logger_p.debug("Send keys Action , first call browser.get_current_page(), then call page.keyboard.press "
-						   "  These keys are " +  {params.keys}.__str__())
-						   #+ " . And the page : " + browser.get_current_page().__str__()
-						   #+ " . Then start to load new page " )
 			logger.info(msg)
 			return ActionResult(extracted_content=msg, include_in_memory=True)
 
@@ -344,17 +262,6 @@ class Controller(Generic[Context]):
 		async def scroll_to_text(text: str, browser: BrowserContext):  # type: ignore
 			page = await browser.get_current_page()
 			try:
-				##TODO locator click
-				logger_p.debug(
-					" Scroll to text , and the resource code is  "
-					"""
-					locators = [
-					page.get_by_text(text, exact=False),
-					page.locator(f'text={text}'),
-					page.locator(f"//*[contains(text(), '{text}')]"),
-					]
-					"""
-				),
 				# Try different locator strategies
 				locators = [
 					page.get_by_text(text, exact=False),
@@ -476,7 +383,6 @@ class Controller(Generic[Context]):
 			logger.debug(f"Attempting to select '{text}' using xpath: {dom_element.xpath}")
 			logger.debug(f'Element attributes: {dom_element.attributes}')
 			logger.debug(f'Element tag: {dom_element.tag_name}')
-			logger_p.debug(f"Attempting to select '{text}' using xpath: {dom_element.xpath}, Attributes: {dom_element.attributes}'")
 			xpath = '//' + dom_element.xpath
 
 			try:
@@ -531,7 +437,6 @@ class Controller(Generic[Context]):
 
 							msg = f'selected option {text} with value {selected_option_values}'
 							logger.info(msg + f' in frame {frame_index}')
-							logger_p.debug(msg + f' in frame {frame_index}')
 							return ActionResult(extracted_content=msg, include_in_memory=True)
 
 					except Exception as frame_e:
@@ -572,8 +477,10 @@ class Controller(Generic[Context]):
 		available_file_paths: Optional[list[str]] = None,
 		#
 		context: Context | None = None,
+		action_trace: Optional[ActionTrace] = None,
+		llm_invoker: Optional[LLMInvoker] = None,
 	) -> ActionResult:
-		"""Execute an action"""
+		"""Execute an action, and add it to `action_trace` if given"""
 		## TODO 执行真正的Action
 		try:
 			for action_name, params in action.model_dump(exclude_unset=True).items():
@@ -586,27 +493,69 @@ class Controller(Generic[Context]):
 					# 	},
 					# 	span_type='TOOL',
 					# ):
+					if action_trace is not None:
+						url, element = self._get_action_target(action, browser_context)
+						started_at = time.time()
+						start = time.perf_counter()
+
 					logger.info(f'Executing action: {action_name}({params})')
-					result = await self.registry.execute_action(
-						action_name,
-						params,
-						browser=browser_context,
-						page_extraction_llm=page_extraction_llm,
-						sensitive_data=sensitive_data,
-						available_file_paths=available_file_paths,
-						context=context,
-					)
+					try:
+						result = await self.registry.execute_action(
+							action_name,
+							params,
+							browser=browser_context,
+							page_extraction_llm=page_extraction_llm,
+							sensitive_data=sensitive_data,
+							available_file_paths=available_file_paths,
+							context=context,
+							llm_invoker=llm_invoker,
+						)
+					except Exception as e:
+						if action_trace is not None:
+							action_trace.record(
+								action_name,
+								params,
+								started_at,
+								time.perf_counter() - start,
+								url=url,
+								element=element,
+								error=str(e),
+							)
+						raise
 
 					# Laminar.set_span_output(result)
 
 					if isinstance(result, str):
-						return ActionResult(extracted_content=result)
-					elif isinstance(result, ActionResult):
-						return result
+						result = ActionResult(extracted_content=result)
 					elif result is None:
-						return ActionResult()
-					else:
+						result = ActionResult()
+					elif not isinstance(result, ActionResult):
 						raise ValueError(f'Invalid action result type: {type(result)} of {result}')
+
+					if action_trace is not None:
+						action_trace.record(
+							action_name,
+							params,
+							started_at,
+							time.perf_counter() - start,
+							url=url,
+							element=element,
+							extracted_content=result.extracted_content,
+							error=result.error,
+						)
+					return result
 			return ActionResult()
 		except Exception as e:
 			raise e
+
+	@staticmethod
+	def _get_action_target(
+		action: ActionModel, browser_context: BrowserContext
+	) -> tuple[Optional[str], Optional[DOMElementNode]]:
+		"""The url and element the model saw when it chose the action, before the action changes them"""
+		cached_state = browser_context.session.cached_state if browser_context.session else None
+		if cached_state is None:
+			return None, None
+		index = action.get_index()
+		element = cached_state.selector_map.get(index) if index is not None else None
+		return cached_state.url, element
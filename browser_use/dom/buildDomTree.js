@@ -4,11 +4,25 @@
     focusHighlightIndex: -1,
     viewportExpansion: 0,
     debugMode: false,
+    incremental: false,
+    forceFullRebuild: false,
+    wireFormat: "json",
   }
 ) => {
-  const { doHighlightElements, focusHighlightIndex, viewportExpansion, debugMode } = args;
+  const {
+    doHighlightElements,
+    focusHighlightIndex,
+    viewportExpansion,
+    debugMode,
+    incremental = false,
+    forceFullRebuild = false,
+    wireFormat = "json",
+  } = args;
   let highlightIndex = 0; // Reset highlight index
 
+  // Persistent state of the incremental snapshot mode (null when disabled)
+  let incrementalState = null;
+
   // Add timing stack to handle recursion
   const TIMING_STACK = {
     nodeProcessing: [],
@@ -187,6 +201,220 @@
 
   const HIGHLIGHT_CONTAINER_ID = "playwright-highlight-container";
 
+  /**
+   * Incremental snapshots.
+   *
+   * A MutationObserver installed on the document records dirty nodes between
+   * two evaluations. The state lives on `window`, so it is dropped by the
+   * browser whenever the page navigates. Scrolling and resizing change the
+   * viewport filtering of every node and therefore always force a full rebuild.
+   */
+  const INCREMENTAL_STATE_KEY = "__browserUseIncrementalDom";
+  const MAX_DIRTY_ROOTS = 50;
+  const MUTATION_OBSERVER_OPTIONS = {
+    subtree: true,
+    childList: true,
+    attributes: true,
+    characterData: true,
+  };
+
+  function getIncrementalState() {
+    let state = window[INCREMENTAL_STATE_KEY];
+    if (state) return state;
+
+    state = {
+      observer: null,
+      dirty: new Set(),
+      needsFullRebuild: true,
+      url: null,
+      viewportExpansion: null,
+      rootId: null,
+      nextId: 0,
+      nextHighlightIndex: 0,
+      nodeIds: new WeakMap(), // element -> id of its serialized node
+      highlightIndices: new WeakMap(), // element -> highlight index, stable across patches
+      parentIframes: new WeakMap(), // element -> iframe element it lives in
+      childIds: new Map(), // id -> ids of the serialized children
+      parentIds: new Map(), // id -> id of the serialized parent
+      highlightOf: new Map(), // id -> highlight index
+      highlighted: new Map(), // highlight index -> element
+    };
+    state.observer = new MutationObserver((records) => recordMutations(state, records));
+    const markFullRebuild = () => {
+      state.needsFullRebuild = true;
+    };
+    window.addEventListener("scroll", markFullRebuild, { capture: true, passive: true });
+    window.addEventListener("resize", markFullRebuild, { passive: true });
+
+    window[INCREMENTAL_STATE_KEY] = state;
+    return state;
+  }
+
+  function isHighlightMutation(record) {
+    if (record.type === "attributes" && record.attributeName === "browser-user-highlight-id") {
+      return true;
+    }
+    const target = record.target;
+    const element = target.nodeType === Node.ELEMENT_NODE ? target : target.parentElement;
+    if (element && element.closest && element.closest(`#${HIGHLIGHT_CONTAINER_ID}`)) {
+      return true;
+    }
+    if (record.type === "childList") {
+      const changed = [...record.addedNodes, ...record.removedNodes];
+      return changed.length > 0 && changed.every((node) => node.id === HIGHLIGHT_CONTAINER_ID);
+    }
+    return false;
+  }
+
+  function recordMutations(state, records) {
+    for (const record of records) {
+      if (!isHighlightMutation(record)) {
+        state.dirty.add(record.target);
+      }
+    }
+  }
+
+  function observeRoot(root) {
+    if (incrementalState) {
+      incrementalState.observer.observe(root, MUTATION_OBSERVER_OPTIONS);
+    }
+  }
+
+  /**
+   * Returns the parent of a node, crossing shadow root and iframe boundaries.
+   */
+  function composedParent(node) {
+    const parent = node.parentNode;
+    if (!parent) return null;
+    if (parent instanceof ShadowRoot) return parent.host;
+    if (parent.nodeType === Node.DOCUMENT_NODE) {
+      return parent.defaultView ? parent.defaultView.frameElement : null;
+    }
+    return parent;
+  }
+
+  /**
+   * Reduces the dirty nodes to the outermost serialized elements containing
+   * them. Returns null if the changes require a full rebuild.
+   */
+  function collectDirtyRoots(state) {
+    const roots = new Set();
+    for (const node of state.dirty) {
+      // Removed nodes are covered by the childList mutation of their former parent
+      if (!node.isConnected) continue;
+
+      let current = node;
+      while (current && !(current.nodeType === Node.ELEMENT_NODE && state.nodeIds.has(current))) {
+        current = composedParent(current);
+      }
+      if (!current || current === document.body) return null;
+      roots.add(current);
+    }
+
+    const outermost = [];
+    for (const root of roots) {
+      let parent = composedParent(root);
+      while (parent && !roots.has(parent)) {
+        parent = composedParent(parent);
+      }
+      if (!parent) outermost.push(root);
+    }
+    return outermost.length > MAX_DIRTY_ROOTS ? null : outermost;
+  }
+
+  function resetIncrementalState(state) {
+    state.nodeIds = new WeakMap();
+    state.highlightIndices = new WeakMap();
+    state.parentIframes = new WeakMap();
+    state.childIds.clear();
+    state.parentIds.clear();
+    state.highlightOf.clear();
+    state.highlighted.clear();
+    state.nextHighlightIndex = 0;
+    state.observer.disconnect();
+    state.observer.observe(document, MUTATION_OBSERVER_OPTIONS);
+  }
+
+  function recordSerializedNode(node, id, nodeData, parentIframe) {
+    if (!incrementalState) return;
+
+    if (node.nodeType === Node.ELEMENT_NODE) {
+      incrementalState.nodeIds.set(node, id);
+      if (parentIframe) incrementalState.parentIframes.set(node, parentIframe);
+    }
+    if (nodeData.children) {
+      incrementalState.childIds.set(id, nodeData.children);
+      for (const childId of nodeData.children) {
+        incrementalState.parentIds.set(childId, id);
+      }
+    }
+    if (nodeData.highlightIndex !== undefined) {
+      incrementalState.highlightOf.set(id, nodeData.highlightIndex);
+      incrementalState.highlighted.set(nodeData.highlightIndex, node);
+    }
+  }
+
+  /**
+   * Forgets a serialized subtree and collects the ids of all its nodes.
+   */
+  function forgetSubtree(state, id, removed) {
+    const stack = [id];
+    while (stack.length > 0) {
+      const current = stack.pop();
+      removed.push(current);
+      const children = state.childIds.get(current);
+      if (children) stack.push(...children);
+      state.childIds.delete(current);
+      state.parentIds.delete(current);
+      if (state.highlightOf.has(current)) {
+        state.highlighted.delete(state.highlightOf.get(current));
+        state.highlightOf.delete(current);
+      }
+    }
+  }
+
+  function assignHighlightIndex(element) {
+    if (!incrementalState) return highlightIndex++;
+
+    let index = incrementalState.highlightIndices.get(element);
+    if (index === undefined) {
+      index = incrementalState.nextHighlightIndex++;
+      incrementalState.highlightIndices.set(element, index);
+    }
+    return index;
+  }
+
+  /**
+   * Re-serializes the dirty subtrees and returns the patch for the cached tree,
+   * or null if a full rebuild is needed instead.
+   */
+  function buildIncrementalPatch(state) {
+    const dirtyRoots = collectDirtyRoots(state);
+    if (dirtyRoots === null) return null;
+
+    const removed = [];
+    const replaced = {};
+    for (const root of dirtyRoots) {
+      const oldId = state.nodeIds.get(root);
+      const parentId = state.parentIds.get(oldId);
+      if (parentId === undefined) return null;
+
+      forgetSubtree(state, oldId, removed);
+      const newId = buildDomTree(root, state.parentIframes.get(root) || null);
+      replaced[oldId] = newId;
+
+      const siblings = state.childIds.get(parentId) || [];
+      const position = siblings.indexOf(oldId);
+      if (newId === null) {
+        if (position !== -1) siblings.splice(position, 1);
+      } else {
+        if (position !== -1) siblings[position] = newId;
+        state.parentIds.set(newId, parentId);
+      }
+    }
+    return { removed, replaced };
+  }
+
   /**
    * Highlights an element in the DOM and returns the index of the next element.
    */
@@ -783,6 +1011,7 @@
 
       const id = `${ID.current++}`;
       DOM_HASH_MAP[id] = nodeData;
+      recordSerializedNode(node, id, nodeData, parentIframe);
       if (debugMode) PERF_METRICS.nodeMetrics.processedNodes++;
       return id;
     }
@@ -865,9 +1094,10 @@
           nodeData.isInteractive = isInteractiveElement(node);
           if (nodeData.isInteractive) {
             nodeData.isInViewport = true;
-            nodeData.highlightIndex = highlightIndex++;
+            nodeData.highlightIndex = assignHighlightIndex(node);
 
-            if (doHighlightElements) {
+            // In incremental mode the overlays are redrawn once the whole patch is applied
+            if (doHighlightElements && !incrementalState) {
               if (focusHighlightIndex >= 0) {
                 if (focusHighlightIndex === nodeData.highlightIndex) {
                   highlightElement(node, nodeData.highlightIndex, parentIframe);
@@ -890,6 +1120,7 @@
         try {
           const iframeDoc = node.contentDocument || node.contentWindow?.document;
           if (iframeDoc) {
+            observeRoot(iframeDoc);
             for (const child of iframeDoc.childNodes) {
               const domElement = buildDomTree(child, node);
               if (domElement) nodeData.children.push(domElement);
@@ -916,6 +1147,7 @@
       // Handle shadow DOM
       else if (node.shadowRoot) {
         nodeData.shadowRoot = true;
+        observeRoot(node.shadowRoot);
         for (const child of node.shadowRoot.childNodes) {
           const domElement = buildDomTree(child, parentIframe);
           if (domElement) nodeData.children.push(domElement);
@@ -938,10 +1170,124 @@
 
     const id = `${ID.current++}`;
     DOM_HASH_MAP[id] = nodeData;
+    recordSerializedNode(node, id, nodeData, parentIframe);
     if (debugMode) PERF_METRICS.nodeMetrics.processedNodes++;
     return id;
   }
 
+  function removeHighlights() {
+    const container = document.getElementById(HIGHLIGHT_CONTAINER_ID);
+    if (container) container.remove();
+    for (const element of document.querySelectorAll('[browser-user-highlight-id^="playwright-highlight-"]')) {
+      element.removeAttribute("browser-user-highlight-id");
+    }
+  }
+
+  /**
+   * Packs the node map into a single JSON string holding a string table and a
+   * base64 encoded Int32Array. Every value of the map would otherwise be
+   * serialized separately by the CDP bridge.
+   *
+   * Layout of the Int32Array (one column per field, nodes in map order):
+   *   header:    [nodeCount, childCount, attributeCount]
+   *   ids:       node id
+   *   flags:     PACKED_FLAGS bitfield
+   *   tags:      string index of the tag name, -1 for text nodes
+   *   values:    string index of the xpath, or of the text for text nodes
+   *   highlight: highlight index, -1 if not highlighted
+   *   childOffsets, attributeOffsets: nodeCount + 1 offsets into the arrays below
+   *   children:  child node ids
+   *   attributeNames, attributeValues: string indices
+   */
+  const PACKED_FLAGS = {
+    text: 1,
+    visible: 2,
+    interactive: 4,
+    top: 8,
+    inViewport: 16,
+    shadowRoot: 32,
+  };
+
+  function packDomHashMap(map) {
+    const strings = [];
+    const stringIndices = new Map();
+    const intern = (value) => {
+      let index = stringIndices.get(value);
+      if (index === undefined) {
+        index = strings.length;
+        strings.push(value);
+        stringIndices.set(value, index);
+      }
+      return index;
+    };
+
+    const ids = Object.keys(map);
+    const nodeCount = ids.length;
+    const ints = [];
+    const flags = new Array(nodeCount);
+    const tags = new Array(nodeCount);
+    const values = new Array(nodeCount);
+    const highlights = new Array(nodeCount);
+    const childOffsets = new Array(nodeCount + 1);
+    const attributeOffsets = new Array(nodeCount + 1);
+    const children = [];
+    const attributeNames = [];
+    const attributeValues = [];
+
+    for (let i = 0; i < nodeCount; i++) {
+      const node = map[ids[i]];
+      childOffsets[i] = children.length;
+      attributeOffsets[i] = attributeNames.length;
+      highlights[i] = -1;
+
+      if (node.type === "TEXT_NODE") {
+        flags[i] = PACKED_FLAGS.text | (node.isVisible ? PACKED_FLAGS.visible : 0);
+        tags[i] = -1;
+        values[i] = intern(node.text);
+        continue;
+      }
+
+      flags[i] =
+        (node.isVisible ? PACKED_FLAGS.visible : 0) |
+        (node.isInteractive ? PACKED_FLAGS.interactive : 0) |
+        (node.isTopElement ? PACKED_FLAGS.top : 0) |
+        (node.isInViewport ? PACKED_FLAGS.inViewport : 0) |
+        (node.shadowRoot ? PACKED_FLAGS.shadowRoot : 0);
+      tags[i] = intern(node.tagName);
+      values[i] = intern(node.xpath);
+      if (node.highlightIndex !== undefined) highlights[i] = node.highlightIndex;
+
+      for (const childId of node.children) children.push(Number(childId));
+      for (const [name, value] of Object.entries(node.attributes)) {
+        attributeNames.push(intern(name));
+        attributeValues.push(intern(value));
+      }
+    }
+    childOffsets[nodeCount] = children.length;
+    attributeOffsets[nodeCount] = attributeNames.length;
+
+    ints.push(nodeCount, children.length, attributeNames.length);
+    const data = new Int32Array(
+      3 + nodeCount * 5 + (nodeCount + 1) * 2 + children.length + attributeNames.length * 2
+    );
+    let offset = 0;
+    for (const column of [
+      ints, ids.map(Number), flags, tags, values, highlights,
+      childOffsets, attributeOffsets, children, attributeNames, attributeValues,
+    ]) {
+      data.set(column, offset);
+      offset += column.length;
+    }
+
+    // btoa only accepts binary strings, convert in chunks to stay below the argument limit
+    const bytes = new Uint8Array(data.buffer);
+    let binary = "";
+    for (let i = 0; i < bytes.length; i += 0x8000) {
+      binary += String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000));
+    }
+    return JSON.stringify({ strings, data: btoa(binary) });
+  }
+
   // After all functions are defined, wrap them with performance measurement
   // Remove buildDomTree from here as we measure it separately
   highlightElement = measureTime(highlightElement);
@@ -952,7 +1298,50 @@
   isTextNodeVisible = measureTime(isTextNodeVisible);
   getEffectiveScroll = measureTime(getEffectiveScroll);
 
-  const rootId = buildDomTree(document.body);
+  // Overlays of the previous state are stale, remove them before drawing new ones
+  removeHighlights();
+
+  let rootId;
+  let patch = null;
+  if (incremental) {
+    incrementalState = getIncrementalState();
+    const state = incrementalState;
+    ID.current = state.nextId;
+
+    const canPatch =
+      !forceFullRebuild &&
+      !state.needsFullRebuild &&
+      state.rootId !== null &&
+      state.url === window.location.href &&
+      state.viewportExpansion === viewportExpansion;
+    if (canPatch) {
+      patch = buildIncrementalPatch(state);
+    }
+    if (patch === null) {
+      for (const key of Object.keys(DOM_HASH_MAP)) delete DOM_HASH_MAP[key];
+      resetIncrementalState(state);
+      state.rootId = buildDomTree(document.body);
+    }
+    rootId = state.rootId;
+
+    if (doHighlightElements) {
+      for (const [index, element] of [...state.highlighted.entries()].sort((a, b) => a[0] - b[0])) {
+        if (focusHighlightIndex < 0 || focusHighlightIndex === index) {
+          highlightElement(element, index, state.parentIframes.get(element) || null);
+        }
+      }
+    }
+
+    // Our own mutations (highlight overlays, attributes) must not mark the next snapshot dirty
+    state.observer.takeRecords();
+    state.dirty.clear();
+    state.needsFullRebuild = false;
+    state.nextId = ID.current;
+    state.url = window.location.href;
+    state.viewportExpansion = viewportExpansion;
+  } else {
+    rootId = buildDomTree(document.body);
+  }
 
   // Clear the cache before starting
   DOM_CACHE.clearCache();
@@ -1007,7 +1396,25 @@
     }
   }
 
-  return debugMode ? 
-    { rootId, map: DOM_HASH_MAP, perfMetrics: PERF_METRICS } : 
-    { rootId, map: DOM_HASH_MAP };
+  const result = {
+    rootId,
+    pageInfo: {
+      url: window.location.href,
+      title: document.title,
+      scrollY: window.scrollY,
+      viewportHeight: window.innerHeight,
+      scrollHeight: document.documentElement.scrollHeight,
+    },
+  };
+  if (wireFormat === "packed") {
+    result.packed = packDomHashMap(DOM_HASH_MAP);
+  } else {
+    result.map = DOM_HASH_MAP;
+  }
+  if (debugMode) result.perfMetrics = PERF_METRICS;
+  if (incremental) {
+    result.incremental = true;
+    if (patch !== null) result.patch = patch;
+  }
+  return result;
 };
@@ -1,24 +1,40 @@
-import gc
+import base64
 import json
 import logging
+import sys
+from array import array
 from dataclasses import dataclass
 from importlib import resources
-from typing import TYPE_CHECKING, Optional
+from typing import TYPE_CHECKING, Iterable, Iterator, Literal, Optional
 
 if TYPE_CHECKING:
 	from playwright.async_api import Page
 
+from browser_use.dom.tree_store.service import DOMTreeStoreBuilder
 from browser_use.dom.views import (
 	DOMBaseNode,
 	DOMElementNode,
 	DOMState,
 	DOMTextNode,
+	PageInfo,
 	SelectorMap,
 )
-from browser_use.utils import time_execution_async
+from browser_use.utils import time_execution_async, timer
 
 logger = logging.getLogger(__name__)
 
+DOMWireFormat = Literal['json', 'packed']
+
+# Flag bits of the packed wire format, keep in sync with PACKED_FLAGS in buildDomTree.js
+PACKED_TEXT = 1
+PACKED_VISIBLE = 2
+PACKED_INTERACTIVE = 4
+PACKED_TOP = 8
+PACKED_IN_VIEWPORT = 16
+PACKED_SHADOW_ROOT = 32
+
+ParsedNode = tuple[str, Optional[DOMBaseNode], list[str]]
+
 
 @dataclass
 class ViewportInfo:
@@ -33,6 +49,11 @@ class DomService:
 
 		self.js_code = resources.read_text('browser_use.dom', 'buildDomTree.js')
 
+		# Tree of the incremental snapshot mode, patched in place after every evaluation
+		self._incremental_root: Optional[DOMElementNode] = None
+		self._incremental_node_map: dict[str, DOMBaseNode] = {}
+		self._incremental_selector_map: SelectorMap = {}
+
 	# region - Clickable elements
 	@time_execution_async('--get_clickable_elements')
 	async def get_clickable_elements(
@@ -40,9 +61,34 @@ class DomService:
 		highlight_elements: bool = True,
 		focus_element: int = -1,
 		viewport_expansion: int = 0,
+		incremental: bool = False,
+		wire_format: DOMWireFormat = 'json',
+		compact: bool = False,
 	) -> DOMState:
-		element_tree, selector_map = await self._build_dom_tree(highlight_elements, focus_element, viewport_expansion)
-		return DOMState(element_tree=element_tree, selector_map=selector_map)
+		"""
+		With `incremental=True` the page keeps a MutationObserver between calls and only the
+		changed subtrees are serialized again. The returned element tree is then shared between
+		calls and updated in place, the selector map is a fresh copy.
+
+		With `wire_format='packed'` the page returns the node map as interned strings and int32
+		columns in a single string instead of one JSON object per node.
+
+		With `compact=True` the tree is stored in a `DOMTreeStore` and the returned nodes are
+		views on it. This is ignored in incremental mode, which patches the object tree in place.
+		"""
+		with timer('dom_build'):
+			element_tree, selector_map, page_info = await self._build_dom_tree(
+				highlight_elements, focus_element, viewport_expansion, incremental, wire_format
+			)
+			if compact and not incremental:
+				element_tree, selector_map = DOMTreeStoreBuilder.compact(element_tree)
+		return DOMState(element_tree=element_tree, selector_map=selector_map, page_info=page_info)
+
+	def reset_incremental_state(self) -> None:
+		"""Drop the cached tree, the next incremental snapshot will be a full one"""
+		self._incremental_root = None
+		self._incremental_node_map = {}
+		self._incremental_selector_map = {}
 
 	@time_execution_async('--build_dom_tree')
 	async def _build_dom_tree(
@@ -50,46 +96,167 @@ class DomService:
 		highlight_elements: bool,
 		focus_element: int,
 		viewport_expansion: int,
-	) -> tuple[DOMElementNode, SelectorMap]:
-		if await self.page.evaluate('1+1') != 2:
-			raise ValueError('The page cannot evaluate javascript code properly')
-
+		incremental: bool = False,
+		wire_format: DOMWireFormat = 'json',
+	) -> tuple[DOMElementNode, SelectorMap, Optional[PageInfo]]:
 		# NOTE: We execute JS code in the browser to extract important DOM information.
 		#       The returned hash map contains information about the DOM tree and the
 		#       relationship between the DOM elements.
+		#       The same evaluation removes old highlights and returns the page metadata,
+		#       so a state needs a single round trip for everything but the screenshot.
 		debug_mode = logger.getEffectiveLevel() == logging.DEBUG
 		args = {
 			'doHighlightElements': highlight_elements,
 			'focusHighlightIndex': focus_element,
 			'viewportExpansion': viewport_expansion,
 			'debugMode': debug_mode,
+			'incremental': incremental,
+			# Without a cached tree on our side a patch from the page would be useless
+			'forceFullRebuild': incremental and self._incremental_root is None,
+			'wireFormat': wire_format,
 		}
 
+		eval_page = await self._evaluate_dom_tree(args)
+
+		if not incremental:
+			element_tree, selector_map = await self._construct_dom_tree(eval_page)
+		else:
+			try:
+				element_tree, selector_map = await self._construct_incremental_dom_tree(eval_page)
+			except ValueError as e:
+				logger.debug(f'Failed to apply incremental DOM patch, rebuilding the full tree: {e}')
+				self.reset_incremental_state()
+				eval_page = await self._evaluate_dom_tree({**args, 'forceFullRebuild': True})
+				element_tree, selector_map = await self._construct_incremental_dom_tree(eval_page)
+
+		return element_tree, selector_map, self._parse_page_info(eval_page)
+
+	async def _evaluate_dom_tree(self, args: dict) -> dict:
 		try:
-			eval_page = await self.page.evaluate(self.js_code, args)
+			with timer('js_eval'):
+				eval_page = await self.page.evaluate(self.js_code, args)
 		except Exception as e:
 			logger.error('Error evaluating JavaScript: %s', e)
 			raise
 
 		# Only log performance metrics in debug mode
-		if debug_mode and 'perfMetrics' in eval_page:
+		if args['debugMode'] and 'perfMetrics' in eval_page:
 			logger.debug('DOM Tree Building Performance Metrics:\n%s', json.dumps(eval_page['perfMetrics'], indent=2))
 
-		return await self._construct_dom_tree(eval_page)
+		return eval_page
+
+	def _parse_page_info(self, eval_page: dict) -> Optional[PageInfo]:
+		page_info = eval_page.get('pageInfo')
+		if not page_info:
+			return None
+		return PageInfo(
+			url=page_info['url'],
+			title=page_info['title'],
+			scroll_y=int(page_info['scrollY']),
+			viewport_height=int(page_info['viewportHeight']),
+			scroll_height=int(page_info['scrollHeight']),
+		)
 
 	@time_execution_async('--construct_dom_tree')
 	async def _construct_dom_tree(
 		self,
 		eval_page: dict,
 	) -> tuple[DOMElementNode, SelectorMap]:
-		js_node_map = eval_page['map']
 		js_root_id = eval_page['rootId']
 
 		selector_map = {}
 		node_map = {}
 
-		for id, node_data in js_node_map.items():
-			node, children_ids = self._parse_node(node_data)
+		with timer('tree_construction'):
+			self._link_nodes(self._parse_nodes(eval_page), node_map, selector_map)
+
+		html_to_dict = node_map[str(js_root_id)]
+
+		if html_to_dict is None or not isinstance(html_to_dict, DOMElementNode):
+			raise ValueError('Failed to parse HTML to dictionary')
+
+		return html_to_dict, selector_map
+
+	@time_execution_async('--construct_incremental_dom_tree')
+	async def _construct_incremental_dom_tree(
+		self,
+		eval_page: dict,
+	) -> tuple[DOMElementNode, SelectorMap]:
+		if 'patch' not in eval_page:
+			node_map: dict[str, DOMBaseNode] = {}
+			selector_map: SelectorMap = {}
+			with timer('tree_construction'):
+				self._link_nodes(self._parse_nodes(eval_page), node_map, selector_map)
+
+			root = node_map.get(str(eval_page['rootId']))
+			if root is None or not isinstance(root, DOMElementNode):
+				raise ValueError('Failed to parse HTML to dictionary')
+
+			self._incremental_root = root
+			self._incremental_node_map = node_map
+			self._incremental_selector_map = selector_map
+		else:
+			if self._incremental_root is None:
+				raise ValueError('Received a DOM patch without a cached tree')
+			with timer('tree_construction'):
+				self._apply_dom_patch(self._parse_nodes(eval_page), eval_page['patch'])
+
+		return self._incremental_root, dict(self._incremental_selector_map)
+
+	def _apply_dom_patch(self, parsed_nodes: Iterable[ParsedNode], patch: dict) -> None:
+		"""
+		Replace the re-serialized subtrees of the cached tree.
+
+		`patch['removed']` lists the ids of all nodes of the old subtrees, `patch['replaced']`
+		maps the id of every old subtree root to the id of its new root (None if it is gone).
+		"""
+		node_map = self._incremental_node_map
+		selector_map = self._incremental_selector_map
+
+		# Resolve the old roots before their ids are dropped
+		old_roots: dict[str, DOMBaseNode] = {}
+		for old_id in patch['replaced']:
+			old_root = node_map.get(str(old_id))
+			if old_root is None or old_root.parent is None:
+				raise ValueError(f'Unknown node {old_id} in DOM patch')
+			old_roots[str(old_id)] = old_root
+
+		for removed_id in patch['removed']:
+			node = node_map.pop(str(removed_id), None)
+			if isinstance(node, DOMElementNode) and node.highlight_index is not None:
+				# Highlight indices are stable, the entry may already belong to a new node
+				if selector_map.get(node.highlight_index) is node:
+					del selector_map[node.highlight_index]
+
+		self._link_nodes(parsed_nodes, node_map, selector_map)
+
+		for old_id, new_id in patch['replaced'].items():
+			old_root = old_roots[str(old_id)]
+			parent = old_root.parent
+			assert parent is not None
+
+			position = next((i for i, child in enumerate(parent.children) if child is old_root), None)
+			if position is None:
+				raise ValueError(f'Node {old_id} is not a child of its parent')
+
+			if new_id is None:
+				del parent.children[position]
+			else:
+				new_root = node_map.get(str(new_id))
+				if new_root is None:
+					raise ValueError(f'Missing node {new_id} in DOM patch')
+				new_root.parent = parent
+				parent.children[position] = new_root
+
+			old_root.parent = None
+
+	def _link_nodes(
+		self,
+		parsed_nodes: Iterable[ParsedNode],
+		node_map: dict[str, DOMBaseNode],
+		selector_map: SelectorMap,
+	) -> None:
+		for id, node, children_ids in parsed_nodes:
 			if node is None:
 				continue
 
@@ -110,18 +277,77 @@ class DomService:
 					child_node.parent = node
 					node.children.append(child_node)
 
-		html_to_dict = node_map[str(js_root_id)]
-
-		del node_map
-		del js_node_map
-		del js_root_id
-
-		gc.collect()
+	def _parse_nodes(self, eval_page: dict) -> Iterator[ParsedNode]:
+		if 'packed' in eval_page:
+			yield from self._unpack_nodes(eval_page['packed'])
+			return
 
-		if html_to_dict is None or not isinstance(html_to_dict, DOMElementNode):
-			raise ValueError('Failed to parse HTML to dictionary')
+		for id, node_data in eval_page['map'].items():
+			node, children_ids = self._parse_node(node_data)
+			yield id, node, children_ids
+
+	def _unpack_nodes(self, packed: str) -> Iterator[ParsedNode]:
+		"""Decode the packed wire format, see packDomHashMap in buildDomTree.js for the layout"""
+		payload = json.loads(packed)
+		strings: list[str] = payload['strings']
+
+		raw = base64.b64decode(payload['data'])
+		if sys.byteorder == 'little':
+			data = memoryview(raw).cast('i')
+		else:
+			# Int32Array uses the byte order of the browser host, which is little endian in practice
+			data = array('i', raw)
+			data.byteswap()
+
+		node_count, child_count, attribute_count = data[0], data[1], data[2]
+		offset = 3
+
+		def column(length: int):
+			nonlocal offset
+			start, offset = offset, offset + length
+			return data[start:offset].tolist()
+
+		ids = column(node_count)
+		flags = column(node_count)
+		tags = column(node_count)
+		values = column(node_count)
+		highlights = column(node_count)
+		child_offsets = column(node_count + 1)
+		attribute_offsets = column(node_count + 1)
+		children = column(child_count)
+		attribute_names = column(attribute_count)
+		attribute_values = column(attribute_count)
+
+		for i in range(node_count):
+			node_flags = flags[i]
+			if node_flags & PACKED_TEXT:
+				text_node = DOMTextNode(
+					text=strings[values[i]],
+					is_visible=bool(node_flags & PACKED_VISIBLE),
+					parent=None,
+				)
+				yield str(ids[i]), text_node, []
+				continue
 
-		return html_to_dict, selector_map
+			attributes_start, attributes_end = attribute_offsets[i], attribute_offsets[i + 1]
+			element_node = DOMElementNode(
+				tag_name=strings[tags[i]],
+				xpath=strings[values[i]],
+				attributes={
+					strings[attribute_names[j]]: strings[attribute_values[j]] for j in range(attributes_start, attributes_end)
+				},
+				children=[],
+				is_visible=bool(node_flags & PACKED_VISIBLE),
+				is_interactive=bool(node_flags & PACKED_INTERACTIVE),
+				is_top_element=bool(node_flags & PACKED_TOP),
+				is_in_viewport=bool(node_flags & PACKED_IN_VIEWPORT),
+				highlight_index=highlights[i] if highlights[i] >= 0 else None,
+				shadow_root=bool(node_flags & PACKED_SHADOW_ROOT),
+				parent=None,
+				viewport_info=None,
+			)
+			children_ids = [str(child_id) for child_id in children[child_offsets[i] : child_offsets[i + 1]]]
+			yield str(ids[i]), element_node, children_ids
 
 	def _parse_node(
 		self,
@@ -0,0 +1,91 @@
+import random
+
+from browser_use.dom.views import DOMBaseNode, DOMElementNode, DOMState, DOMTextNode
+
+
+def reference_clickable_elements_to_string(root: DOMElementNode, include_attributes: list[str]) -> str:
+	"""The recursive implementation, walking to the root for every text node"""
+	formatted_text = []
+
+	def process_node(node: DOMBaseNode) -> None:
+		if isinstance(node, DOMElementNode):
+			if node.highlight_index is not None:
+				attributes_str = ''
+				if include_attributes:
+					attributes_str = ' ' + ' '.join(
+						f'{key}="{value}"' for key, value in node.attributes.items() if key in include_attributes
+					)
+				formatted_text.append(
+					f'[{node.highlight_index}]<{node.tag_name}{attributes_str}>{node.get_all_text_till_next_clickable_element()}</{node.tag_name}>'
+				)
+			for child in node.children:
+				process_node(child)
+		elif isinstance(node, DOMTextNode):
+			if not node.has_parent_with_highlight_index() and node.is_visible:
+				formatted_text.append(f'[]{node.text}')
+
+	process_node(root)
+	return '\n'.join(formatted_text)
+
+
+def random_tree(seed: int) -> DOMElementNode:
+	rng = random.Random(seed)
+	highlight_index = 0
+
+	def build(parent: DOMElementNode | None, depth: int) -> DOMElementNode:
+		nonlocal highlight_index
+		node = DOMElementNode(
+			tag_name=rng.choice(['div', 'a', 'button', 'span']),
+			xpath='',
+			attributes={'id': str(rng.randint(0, 100)), 'role': 'button'},
+			children=[],
+			is_visible=True,
+			parent=parent,
+		)
+		if rng.random() < 0.3:
+			node.highlight_index = highlight_index
+			highlight_index += 1
+		for _ in range(rng.randint(0, 4 if depth < 5 else 0)):
+			if rng.random() < 0.4:
+				node.children.append(
+					DOMTextNode(text=f' text {rng.randint(0, 1000)} ', is_visible=rng.random() < 0.8, parent=node)
+				)
+			else:
+				node.children.append(build(node, depth + 1))
+		return node
+
+	return build(None, 0)
+
+
+def test_matches_recursive_implementation():
+	for seed in range(50):
+		root = random_tree(seed)
+		for include_attributes in ([], ['role']):
+			assert root.clickable_elements_to_string(include_attributes) == reference_clickable_elements_to_string(
+				root, include_attributes
+			)
+
+			# Subtrees below a highlighted ancestor
+			for child in root.children:
+				if isinstance(child, DOMElementNode):
+					assert child.clickable_elements_to_string(include_attributes) == reference_clickable_elements_to_string(
+						child, include_attributes
+					)
+
+
+def test_dom_state_memoizes_rendering(monkeypatch):
+	root = random_tree(0)
+	state = DOMState(element_tree=root, selector_map={})
+
+	calls = []
+	render = DOMElementNode.clickable_elements_to_string
+
+	def counting_render(self, include_attributes=[]):
+		calls.append(include_attributes)
+		return render(self, include_attributes)
+
+	monkeypatch.setattr(DOMElementNode, 'clickable_elements_to_string', counting_render)
+
+	assert state.clickable_elements_to_string(['role']) == state.clickable_elements_to_string(['role'])
+	state.clickable_elements_to_string([])
+	assert calls == [['role'], []]
@@ -0,0 +1,127 @@
+"""
+Benchmarks for building the DOM tree from the buildDomTree.js result.
+
+Run with `pytest browser_use/dom/tests/construct_dom_tree_benchmark_test.py --benchmark-only`.
+Besides the wall time, every benchmark reports the peak traced memory of one build, the peak
+RSS of the process and the time spent in garbage collections in `extra_info`.
+"""
+
+import asyncio
+import gc
+import random
+import resource
+import time
+import tracemalloc
+
+import pytest
+
+from browser_use.dom.service import DomService
+
+pytest.importorskip('pytest_benchmark')
+
+pytestmark = pytest.mark.slow
+
+
+def make_eval_page(node_count: int, seed: int = 0) -> dict:
+	"""Deterministic buildDomTree.js result shaped like a real page: nested containers, links, buttons and text"""
+	rng = random.Random(seed)
+	node_map: dict[str, dict] = {}
+	highlight_index = 0
+	next_id = 0
+
+	def add(node: dict) -> str:
+		nonlocal next_id
+		id = str(next_id)
+		next_id += 1
+		node_map[id] = node
+		return id
+
+	def build(depth: int, xpath: str) -> str:
+		nonlocal highlight_index
+		children = []
+		while len(node_map) < node_count and len(children) < rng.randint(1, 6):
+			kind = rng.random()
+			if kind < 0.35:
+				children.append(add({'type': 'TEXT_NODE', 'text': f'Item {rng.randint(0, 10_000)}', 'isVisible': True}))
+			elif kind < 0.6 or depth > 12:
+				tag = rng.choice(['a', 'button', 'input'])
+				text_id = add({'type': 'TEXT_NODE', 'text': f'{tag} label', 'isVisible': True})
+				children.append(
+					add(
+						{
+							'tagName': tag,
+							'xpath': f'{xpath}/{tag}[{len(children) + 1}]',
+							'attributes': {'class': 'btn btn-primary', 'href': '/path', 'aria-label': 'Open'},
+							'children': [text_id],
+							'isVisible': True,
+							'isInteractive': True,
+							'isTopElement': True,
+							'isInViewport': True,
+							'highlightIndex': highlight_index,
+						}
+					)
+				)
+				highlight_index += 1
+			else:
+				children.append(build(depth + 1, f'{xpath}/div[{len(children) + 1}]'))
+
+		return add({'tagName': 'div', 'xpath': xpath, 'attributes': {}, 'children': children, 'isVisible': True})
+
+	root_children = []
+	while len(node_map) < node_count:
+		root_children.append(build(1, f'html/body/div[{len(root_children) + 1}]'))
+	root_id = add({'tagName': 'body', 'xpath': '/body', 'attributes': {}, 'children': root_children})
+	return {'rootId': root_id, 'map': node_map}
+
+
+class GCPauseTimer:
+	def __init__(self):
+		self.collections = 0
+		self.total_pause = 0.0
+		self._start = 0.0
+
+	def __call__(self, phase: str, info: dict) -> None:
+		if phase == 'start':
+			self._start = time.perf_counter()
+		else:
+			self.collections += 1
+			self.total_pause += time.perf_counter() - self._start
+
+	def __enter__(self):
+		gc.callbacks.append(self)
+		return self
+
+	def __exit__(self, *exc):
+		gc.callbacks.remove(self)
+
+
+@pytest.mark.parametrize('node_count', [1_000, 10_000, 50_000])
+def test_construct_dom_tree(benchmark, node_count):
+	eval_page = make_eval_page(node_count)
+	service = DomService(None)
+	loop = asyncio.new_event_loop()
+
+	def construct():
+		return loop.run_until_complete(service._construct_dom_tree(eval_page))
+
+	try:
+		tracemalloc.start()
+		root, selector_map = construct()
+		_, peak_traced = tracemalloc.get_traced_memory()
+		tracemalloc.stop()
+		del root, selector_map
+
+		with GCPauseTimer() as gc_timer:
+			root, selector_map = benchmark(construct)
+	finally:
+		loop.close()
+
+	assert root.tag_name == 'body'
+	assert selector_map
+
+	benchmark.extra_info['nodes'] = len(eval_page['map'])
+	benchmark.extra_info['peak_traced_mb'] = round(peak_traced / 1024 / 1024, 2)
+	# ru_maxrss is in kilobytes on Linux
+	benchmark.extra_info['peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 2)
+	benchmark.extra_info['gc_collections'] = gc_timer.collections
+	benchmark.extra_info['gc_pause_ms'] = round(gc_timer.total_pause * 1000, 3)
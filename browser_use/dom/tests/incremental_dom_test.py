@@ -0,0 +1,103 @@
+from browser_use.dom.service import DomService
+from browser_use.dom.views import DOMElementNode, DOMTextNode
+
+
+class ScriptedPage:
+	"""Returns the prepared buildDomTree.js results in order"""
+
+	def __init__(self, results: list[dict]):
+		self.results = results
+		self.calls: list[dict] = []
+
+	async def evaluate(self, script, args):
+		self.calls.append(args)
+		return self.results.pop(0)
+
+
+def element(tag: str, children: list[str], highlight_index: int | None = None) -> dict:
+	data = {'tagName': tag, 'xpath': f'/{tag}', 'attributes': {}, 'children': children, 'isVisible': True}
+	if highlight_index is not None:
+		data.update(isInteractive=True, isTopElement=True, isInViewport=True, highlightIndex=highlight_index)
+	return data
+
+
+def text(value: str) -> dict:
+	return {'type': 'TEXT_NODE', 'text': value, 'isVisible': True}
+
+
+FULL_SNAPSHOT = {
+	'rootId': '4',
+	'incremental': True,
+	'map': {
+		'0': text('Login'),
+		'1': element('button', ['0'], highlight_index=0),
+		'2': element('a', [], highlight_index=1),
+		'3': element('div', ['1', '2']),
+		'4': element('body', ['3']),
+	},
+}
+
+
+async def test_patch_replaces_changed_subtree():
+	patch = {
+		'rootId': '4',
+		'incremental': True,
+		'map': {'5': text('Logout'), '6': element('button', ['5'], highlight_index=0)},
+		'patch': {'removed': ['1', '0'], 'replaced': {'1': '6'}},
+	}
+	page = ScriptedPage([FULL_SNAPSHOT, patch])
+	service = DomService(page)
+
+	root, selector_map, _ = await service._build_dom_tree(True, -1, 0, incremental=True)
+	assert page.calls[0]['forceFullRebuild'] is True
+	div = root.children[0]
+	link = selector_map[1]
+
+	patched_root, patched_selector_map, _ = await service._build_dom_tree(True, -1, 0, incremental=True)
+	assert page.calls[1]['forceFullRebuild'] is False
+	assert patched_root is root
+
+	button = patched_selector_map[0]
+	assert isinstance(button, DOMElementNode)
+	assert button.parent is div
+	assert div.children == [button, link]
+	assert isinstance(button.children[0], DOMTextNode)
+	assert button.children[0].text == 'Logout'
+	assert patched_selector_map[1] is link
+
+	# Earlier selector maps are not modified by a patch
+	assert selector_map[0] is not button
+
+
+async def test_patch_removes_subtree():
+	patch = {
+		'rootId': '4',
+		'incremental': True,
+		'map': {},
+		'patch': {'removed': ['2'], 'replaced': {'2': None}},
+	}
+	service = DomService(ScriptedPage([FULL_SNAPSHOT, patch]))
+
+	await service._build_dom_tree(True, -1, 0, incremental=True)
+	root, selector_map, _ = await service._build_dom_tree(True, -1, 0, incremental=True)
+
+	assert [child.tag_name for child in root.children[0].children] == ['button']
+	assert set(selector_map) == {0}
+
+
+async def test_inconsistent_patch_falls_back_to_full_rebuild():
+	broken_patch = {
+		'rootId': '4',
+		'incremental': True,
+		'map': {},
+		'patch': {'removed': ['42'], 'replaced': {'42': None}},
+	}
+	page = ScriptedPage([FULL_SNAPSHOT, broken_patch, FULL_SNAPSHOT])
+	service = DomService(page)
+
+	await service._build_dom_tree(True, -1, 0, incremental=True)
+	root, selector_map, _ = await service._build_dom_tree(True, -1, 0, incremental=True)
+
+	assert page.calls[2]['forceFullRebuild'] is True
+	assert root.tag_name == 'body'
+	assert set(selector_map) == {0, 1}
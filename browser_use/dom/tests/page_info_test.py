@@ -0,0 +1,34 @@
+from browser_use.dom.service import DomService
+
+
+class SingleEvaluationPage:
+	def __init__(self, result: dict):
+		self.result = result
+		self.evaluations = 0
+
+	async def evaluate(self, script, args):
+		self.evaluations += 1
+		return self.result
+
+
+async def test_page_info_comes_with_the_dom_tree():
+	page = SingleEvaluationPage(
+		{
+			'rootId': '0',
+			'map': {'0': {'tagName': 'body', 'xpath': '/body', 'attributes': {}, 'children': []}},
+			'pageInfo': {
+				'url': 'https://example.com/',
+				'title': 'Example Domain',
+				'scrollY': 200,
+				'viewportHeight': 800,
+				'scrollHeight': 3000,
+			},
+		}
+	)
+
+	state = await DomService(page).get_clickable_elements()
+
+	assert page.evaluations == 1
+	assert state.page_info is not None
+	assert state.page_info.title == 'Example Domain'
+	assert (state.page_info.pixels_above, state.page_info.pixels_below) == (200, 2000)
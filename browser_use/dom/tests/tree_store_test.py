@@ -0,0 +1,96 @@
+from browser_use.dom.history_tree_processor.service import HistoryTreeProcessor
+from browser_use.dom.service import DomService
+from browser_use.dom.tree_store.service import DOMTreeStoreBuilder
+from browser_use.dom.tree_store.view import DOMElementView, DOMTextView
+from browser_use.dom.views import DOMState
+
+NODE_MAP = {
+	'0': {'type': 'TEXT_NODE', 'text': 'Upload your CV', 'isVisible': True},
+	'1': {'tagName': 'label', 'xpath': 'html/body/form/label', 'attributes': {'for': 'cv'}, 'children': ['0'], 'isVisible': True},
+	'2': {
+		'tagName': 'input',
+		'xpath': 'html/body/form/input',
+		'attributes': {'type': 'file', 'id': 'cv'},
+		'children': [],
+		'isVisible': True,
+		'isInteractive': True,
+		'isTopElement': True,
+		'isInViewport': True,
+		'highlightIndex': 0,
+	},
+	'3': {'type': 'TEXT_NODE', 'text': 'Send', 'isVisible': True},
+	'4': {
+		'tagName': 'button',
+		'xpath': 'html/body/form/button',
+		'attributes': {'type': 'submit'},
+		'children': ['3'],
+		'isVisible': True,
+		'isInteractive': True,
+		'isTopElement': True,
+		'isInViewport': True,
+		'highlightIndex': 1,
+	},
+	'5': {'tagName': 'form', 'xpath': 'html/body/form', 'attributes': {}, 'children': ['1', '2', '4'], 'isVisible': True},
+	'6': {'tagName': 'body', 'xpath': '/body', 'attributes': {}, 'children': ['5']},
+}
+
+
+async def build_trees():
+	root, selector_map = await DomService(None)._construct_dom_tree({'rootId': '6', 'map': NODE_MAP})
+	compact_root, compact_selector_map = DOMTreeStoreBuilder.compact(root)
+	return root, selector_map, compact_root, compact_selector_map
+
+
+async def test_compact_tree_renders_like_object_tree():
+	root, selector_map, compact_root, compact_selector_map = await build_trees()
+
+	assert isinstance(compact_root, DOMElementView)
+	assert set(compact_selector_map) == set(selector_map)
+	assert compact_root.clickable_elements_to_string(['type']) == root.clickable_elements_to_string(['type'])
+	assert (
+		compact_selector_map[1].get_all_text_till_next_clickable_element()
+		== selector_map[1].get_all_text_till_next_clickable_element()
+	)
+
+
+async def test_compact_tree_navigation():
+	_, _, compact_root, compact_selector_map = await build_trees()
+
+	form = compact_root.children[0]
+	label, file_input, button = form.children
+	assert file_input is compact_selector_map[0]
+	assert button.parent is form
+	assert form.parent == compact_root
+	assert isinstance(label.children[0], DOMTextView)
+	assert label.children[0].parent is label
+	assert label.attributes == {'for': 'cv'}
+	assert button.get_file_upload_element() is file_input
+
+
+async def test_compact_tree_history_hashes():
+	# Parents are weak references, the object tree must stay referenced through its root
+	root, selector_map, _, compact_selector_map = await build_trees()
+
+	for index, node in selector_map.items():
+		assert compact_selector_map[index].hash == node.hash
+		history_element = HistoryTreeProcessor.convert_dom_element_to_history_element(compact_selector_map[index])
+		assert HistoryTreeProcessor.compare_history_element_and_dom_element(history_element, node)
+
+
+async def test_selector_map_nodes_walk_up_while_state_is_referenced():
+	root, selector_map = await DomService(None)._construct_dom_tree({'rootId': '6', 'map': NODE_MAP})
+	state = DOMState(element_tree=root, selector_map=selector_map)
+	del root, selector_map
+
+	node = state.selector_map[1]
+	ancestors = []
+	while node.parent is not None:
+		node = node.parent
+		ancestors.append(node.tag_name)
+	assert ancestors == ['form', 'body']
+	assert node is state.element_tree
+
+	# Without the state the root is freed and the weak parent links are cleared
+	button = state.selector_map[1]
+	del state, node
+	assert button.parent is None
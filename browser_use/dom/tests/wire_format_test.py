@@ -0,0 +1,152 @@
+import base64
+import json
+from array import array
+
+from browser_use.dom.service import (
+	PACKED_IN_VIEWPORT,
+	PACKED_INTERACTIVE,
+	PACKED_SHADOW_ROOT,
+	PACKED_TEXT,
+	PACKED_TOP,
+	PACKED_VISIBLE,
+	DomService,
+)
+from browser_use.dom.views import DOMElementNode, DOMTextNode
+
+NODE_MAP = {
+	'0': {'type': 'TEXT_NODE', 'text': 'Sign in', 'isVisible': True},
+	'1': {
+		'tagName': 'button',
+		'xpath': 'html/body/div/button',
+		'attributes': {'type': 'submit', 'class': 'primary'},
+		'children': ['0'],
+		'isVisible': True,
+		'isInteractive': True,
+		'isTopElement': True,
+		'isInViewport': True,
+		'highlightIndex': 0,
+	},
+	'2': {'type': 'TEXT_NODE', 'text': 'hidden', 'isVisible': False},
+	'3': {
+		'tagName': 'my-widget',
+		'xpath': 'html/body/div/my-widget',
+		'attributes': {},
+		'children': ['2'],
+		'isVisible': True,
+		'shadowRoot': True,
+	},
+	'4': {'tagName': 'div', 'xpath': 'html/body/div', 'attributes': {'class': 'primary'}, 'children': ['1', '3']},
+	'5': {'tagName': 'body', 'xpath': '/body', 'attributes': {}, 'children': ['4']},
+}
+
+
+def pack(node_map: dict) -> str:
+	"""Python port of packDomHashMap in buildDomTree.js"""
+	strings: list[str] = []
+	indices: dict[str, int] = {}
+
+	def intern(value: str) -> int:
+		if value not in indices:
+			indices[value] = len(strings)
+			strings.append(value)
+		return indices[value]
+
+	ids, flags, tags, values, highlights = [], [], [], [], []
+	child_offsets, attribute_offsets, children, attribute_names, attribute_values = [], [], [], [], []
+	for id, node in node_map.items():
+		ids.append(int(id))
+		child_offsets.append(len(children))
+		attribute_offsets.append(len(attribute_names))
+		highlights.append(node.get('highlightIndex', -1))
+		if node.get('type') == 'TEXT_NODE':
+			flags.append(PACKED_TEXT | (PACKED_VISIBLE if node['isVisible'] else 0))
+			tags.append(-1)
+			values.append(intern(node['text']))
+			continue
+
+		flags.append(
+			(PACKED_VISIBLE if node.get('isVisible') else 0)
+			| (PACKED_INTERACTIVE if node.get('isInteractive') else 0)
+			| (PACKED_TOP if node.get('isTopElement') else 0)
+			| (PACKED_IN_VIEWPORT if node.get('isInViewport') else 0)
+			| (PACKED_SHADOW_ROOT if node.get('shadowRoot') else 0)
+		)
+		tags.append(intern(node['tagName']))
+		values.append(intern(node['xpath']))
+		children.extend(int(child_id) for child_id in node['children'])
+		for name, value in node['attributes'].items():
+			attribute_names.append(intern(name))
+			attribute_values.append(intern(value))
+	child_offsets.append(len(children))
+	attribute_offsets.append(len(attribute_names))
+
+	data = array(
+		'i',
+		[len(ids), len(children), len(attribute_names)]
+		+ ids
+		+ flags
+		+ tags
+		+ values
+		+ highlights
+		+ child_offsets
+		+ attribute_offsets
+		+ children
+		+ attribute_names
+		+ attribute_values,
+	)
+	return json.dumps({'strings': strings, 'data': base64.b64encode(data.tobytes()).decode()})
+
+
+def assert_same_tree(a, b):
+	assert type(a) is type(b)
+	if isinstance(a, DOMTextNode):
+		assert (a.text, a.is_visible) == (b.text, b.is_visible)
+		return
+
+	assert isinstance(a, DOMElementNode) and isinstance(b, DOMElementNode)
+	assert (a.tag_name, a.xpath, a.attributes, a.highlight_index, a.shadow_root) == (
+		b.tag_name,
+		b.xpath,
+		b.attributes,
+		b.highlight_index,
+		b.shadow_root,
+	)
+	assert (a.is_visible, a.is_interactive, a.is_top_element, a.is_in_viewport) == (
+		b.is_visible,
+		b.is_interactive,
+		b.is_top_element,
+		b.is_in_viewport,
+	)
+	assert len(a.children) == len(b.children)
+	for child_a, child_b in zip(a.children, b.children):
+		assert child_b.parent is b
+		assert_same_tree(child_a, child_b)
+
+
+async def test_packed_format_matches_json():
+	service = DomService(None)
+
+	json_root, json_selector_map = await service._construct_dom_tree({'rootId': '5', 'map': NODE_MAP})
+	packed_root, packed_selector_map = await service._construct_dom_tree({'rootId': '5', 'packed': pack(NODE_MAP)})
+
+	assert_same_tree(json_root, packed_root)
+	assert set(json_selector_map) == set(packed_selector_map) == {0}
+	assert packed_selector_map[0].attributes == {'type': 'submit', 'class': 'primary'}
+
+
+async def test_packed_incremental_patch():
+	service = DomService(None)
+	await service._construct_incremental_dom_tree({'rootId': '5', 'incremental': True, 'packed': pack(NODE_MAP)})
+
+	new_nodes = {
+		'6': {'type': 'TEXT_NODE', 'text': 'Sign out', 'isVisible': True},
+		'7': {**NODE_MAP['1'], 'children': ['6']},
+	}
+	patch = {'removed': ['1', '0'], 'replaced': {'1': '7'}}
+	root, selector_map = await service._construct_incremental_dom_tree(
+		{'rootId': '5', 'incremental': True, 'packed': pack(new_nodes), 'patch': patch}
+	)
+
+	button = selector_map[0]
+	assert button.parent is root.children[0]
+	assert button.children[0].text == 'Sign out'
@@ -0,0 +1,89 @@
+from browser_use.dom.tree_store.view import (
+	FLAG_IN_VIEWPORT,
+	FLAG_INTERACTIVE,
+	FLAG_SHADOW_ROOT,
+	FLAG_TEXT,
+	FLAG_TOP,
+	FLAG_VISIBLE,
+	DOMElementView,
+	DOMTreeStore,
+)
+from browser_use.dom.views import DOMBaseNode, DOMElementNode, DOMTextNode, SelectorMap
+from browser_use.utils import time_execution_sync
+
+
+class DOMTreeStoreBuilder:
+	"""
+	Converts a parsed DOM tree into a `DOMTreeStore`.
+
+	The object tree is only needed during the conversion, afterwards the whole tree is held
+	by a few arrays and the views handed out by the store.
+	"""
+
+	@staticmethod
+	@time_execution_sync('--build_dom_tree_store')
+	def build(root: DOMElementNode) -> DOMTreeStore:
+		store = DOMTreeStore()
+		string_indices: dict[str, int] = {}
+
+		def intern(value: str) -> int:
+			index = string_indices.get(value)
+			if index is None:
+				index = len(store.strings)
+				store.strings.append(value)
+				string_indices[value] = index
+			return index
+
+		# Breadth first order keeps the children of every node next to each other
+		nodes: list[DOMBaseNode] = [root]
+		parents = [-1]
+		index = 0
+		while index < len(nodes):
+			node = nodes[index]
+			store.parents.append(parents[index])
+			store.child_offsets.append(len(nodes))
+			store.attribute_offsets.append(len(store.attribute_names))
+			flags = FLAG_VISIBLE if node.is_visible else 0
+
+			if isinstance(node, DOMTextNode):
+				store.flags.append(flags | FLAG_TEXT)
+				store.tags.append(-1)
+				store.values.append(intern(node.text))
+				store.highlights.append(-1)
+			elif isinstance(node, DOMElementNode):
+				flags |= (
+					(FLAG_INTERACTIVE if node.is_interactive else 0)
+					| (FLAG_TOP if node.is_top_element else 0)
+					| (FLAG_IN_VIEWPORT if node.is_in_viewport else 0)
+					| (FLAG_SHADOW_ROOT if node.shadow_root else 0)
+				)
+				store.flags.append(flags)
+				store.tags.append(intern(node.tag_name))
+				store.values.append(intern(node.xpath))
+				store.highlights.append(-1 if node.highlight_index is None else node.highlight_index)
+				for name, value in node.attributes.items():
+					store.attribute_names.append(intern(name))
+					store.attribute_values.append(intern(value))
+
+				nodes.extend(node.children)
+				parents.extend([index] * len(node.children))
+
+			index += 1
+
+		store.child_offsets.append(len(nodes))
+		store.attribute_offsets.append(len(store.attribute_names))
+		return store
+
+	@staticmethod
+	def compact(root: DOMElementNode) -> tuple[DOMElementNode, SelectorMap]:
+		"""Returns the root view and the selector map of the compact representation of `root`"""
+		store = DOMTreeStoreBuilder.build(root)
+
+		selector_map: SelectorMap = {}
+		for index, highlight_index in enumerate(store.highlights):
+			if highlight_index != -1:
+				selector_map[highlight_index] = store.view(index)  # type: ignore[assignment]
+
+		root_view = store.view(0)
+		assert isinstance(root_view, DOMElementView)
+		return root_view, selector_map
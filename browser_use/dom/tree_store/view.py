@@ -0,0 +1,167 @@
+import weakref
+from array import array
+from typing import Dict, List, Optional
+
+from browser_use.dom.history_tree_processor.view import CoordinateSet, ViewportInfo
+from browser_use.dom.views import DOMBaseNode, DOMElementNode, DOMTextNode
+
+FLAG_TEXT = 1
+FLAG_VISIBLE = 2
+FLAG_INTERACTIVE = 4
+FLAG_TOP = 8
+FLAG_IN_VIEWPORT = 16
+FLAG_SHADOW_ROOT = 32
+
+
+class DOMTreeStore:
+	"""
+	Struct-of-arrays storage of a DOM tree.
+
+	Nodes are addressed by their index in breadth first order (the root is 0), so the children
+	of a node are the contiguous range `child_offsets[i]:child_offsets[i + 1]`. Tag names,
+	xpaths, texts and attributes are indices into the shared `strings` pool.
+	"""
+
+	def __init__(self) -> None:
+		self.strings: list[str] = []
+		self.flags = array('B')
+		self.tags = array('i')  # -1 for text nodes
+		self.values = array('i')  # xpath, or text for text nodes
+		self.parents = array('i')  # -1 for the root
+		self.highlights = array('i')  # -1 if not highlighted
+		self.child_offsets = array('i')
+		self.attribute_offsets = array('i')
+		self.attribute_names = array('i')
+		self.attribute_values = array('i')
+
+		# Views are only kept alive by their users, the same index maps to the same view while it is in use
+		self._views: weakref.WeakValueDictionary[int, DOMBaseNode] = weakref.WeakValueDictionary()
+
+	def __len__(self) -> int:
+		return len(self.flags)
+
+	def view(self, index: int) -> DOMBaseNode:
+		node = self._views.get(index)
+		if node is None:
+			node = DOMTextView(self, index) if self.flags[index] & FLAG_TEXT else DOMElementView(self, index)
+			self._views[index] = node
+		return node
+
+	def has_flag(self, index: int, flag: int) -> bool:
+		return bool(self.flags[index] & flag)
+
+	def parent_of(self, index: int) -> Optional['DOMElementNode']:
+		parent = self.parents[index]
+		return None if parent == -1 else self.view(parent)  # type: ignore[return-value]
+
+
+class DOMTextView(DOMTextNode):
+	"""`DOMTextNode` backed by a `DOMTreeStore`"""
+
+	__slots__ = ('_store', '_index')
+
+	def __init__(self, store: DOMTreeStore, index: int):
+		self._store = store
+		self._index = index
+
+	@property
+	def is_visible(self) -> bool:
+		return self._store.has_flag(self._index, FLAG_VISIBLE)
+
+	@property
+	def parent(self) -> Optional[DOMElementNode]:
+		return self._store.parent_of(self._index)
+
+	@property
+	def text(self) -> str:
+		return self._store.strings[self._store.values[self._index]]
+
+	def __eq__(self, other: object) -> bool:
+		if isinstance(other, DOMTextView):
+			return self._store is other._store and self._index == other._index
+		return NotImplemented
+
+	def __hash__(self) -> int:
+		return hash((id(self._store), self._index))
+
+
+class DOMElementView(DOMElementNode):
+	"""`DOMElementNode` backed by a `DOMTreeStore`, children and parents are materialized on access"""
+
+	__slots__ = ('_store', '_index')
+
+	def __init__(self, store: DOMTreeStore, index: int):
+		self._store = store
+		self._index = index
+
+	@property
+	def is_visible(self) -> bool:
+		return self._store.has_flag(self._index, FLAG_VISIBLE)
+
+	@property
+	def parent(self) -> Optional[DOMElementNode]:
+		return self._store.parent_of(self._index)
+
+	@property
+	def tag_name(self) -> str:
+		return self._store.strings[self._store.tags[self._index]]
+
+	@property
+	def xpath(self) -> str:
+		return self._store.strings[self._store.values[self._index]]
+
+	@property
+	def attributes(self) -> Dict[str, str]:
+		store = self._store
+		strings = store.strings
+		return {
+			strings[store.attribute_names[i]]: strings[store.attribute_values[i]]
+			for i in range(store.attribute_offsets[self._index], store.attribute_offsets[self._index + 1])
+		}
+
+	@property
+	def children(self) -> List[DOMBaseNode]:
+		store = self._store
+		return [store.view(i) for i in range(store.child_offsets[self._index], store.child_offsets[self._index + 1])]
+
+	@property
+	def is_interactive(self) -> bool:
+		return self._store.has_flag(self._index, FLAG_INTERACTIVE)
+
+	@property
+	def is_top_element(self) -> bool:
+		return self._store.has_flag(self._index, FLAG_TOP)
+
+	@property
+	def is_in_viewport(self) -> bool:
+		return self._store.has_flag(self._index, FLAG_IN_VIEWPORT)
+
+	@property
+	def shadow_root(self) -> bool:
+		return self._store.has_flag(self._index, FLAG_SHADOW_ROOT)
+
+	@property
+	def highlight_index(self) -> Optional[int]:
+		highlight_index = self._store.highlights[self._index]
+		return None if highlight_index == -1 else highlight_index
+
+	# Coordinates are not collected by buildDomTree.js, so the store does not keep them
+	@property
+	def viewport_coordinates(self) -> Optional[CoordinateSet]:
+		return None
+
+	@property
+	def page_coordinates(self) -> Optional[CoordinateSet]:
+		return None
+
+	@property
+	def viewport_info(self) -> Optional[ViewportInfo]:
+		return None
+
+	def __eq__(self, other: object) -> bool:
+		if isinstance(other, DOMElementView):
+			return self._store is other._store and self._index == other._index
+		return NotImplemented
+
+	def __hash__(self) -> int:
+		return hash((id(self._store), self._index))
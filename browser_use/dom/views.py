@@ -1,4 +1,5 @@
-from dataclasses import dataclass
+import weakref
+from dataclasses import dataclass, field
 from functools import cached_property
 from typing import TYPE_CHECKING, Dict, List, Optional
 
@@ -10,11 +11,34 @@ if TYPE_CHECKING:
 	from .views import DOMElementNode
 
 
+class WeakParent:
+	"""
+	Descriptor storing the parent as a weak reference.
+
+	Children hold their parent weakly, so a tree has no reference cycles and is freed by
+	reference counting as soon as its root is dropped, without waiting for the garbage collector.
+	Whoever keeps nodes of a tree around must therefore keep its root as well, like `DOMState` does.
+	"""
+
+	def __set_name__(self, owner: type, name: str) -> None:
+		self._attribute = f'_{name}_ref'
+
+	def __get__(self, instance: Optional['DOMBaseNode'], owner: type) -> Optional['DOMElementNode']:
+		if instance is None:
+			# Makes the dataclass field required instead of using the descriptor as default
+			raise AttributeError
+		ref = instance.__dict__.get(self._attribute)
+		return None if ref is None else ref()
+
+	def __set__(self, instance: 'DOMBaseNode', value: Optional['DOMElementNode']) -> None:
+		instance.__dict__[self._attribute] = None if value is None else weakref.ref(value)
+
+
 @dataclass(frozen=False)
 class DOMBaseNode:
 	is_visible: bool
 	# Use None as default and set parent later to avoid circular reference issues
-	parent: Optional['DOMElementNode']
+	parent: Optional['DOMElementNode'] = WeakParent()  # type: ignore[assignment]
 
 
 @dataclass(frozen=False)
@@ -48,6 +72,9 @@ class DOMElementNode(DOMBaseNode):
 	"""
 	xpath: the xpath of the element from the last root node (shadow root or iframe OR document if no shadow root or iframe).
 	To properly reference the element we need to recursively switch the root node until we find the element (work you way up the tree with `.parent`)
+
+	`.parent` is a weak reference: it is only set while the root of the tree is referenced. Keep the `DOMState`
+	(or the root) alive for as long as nodes taken from its `selector_map` are used, otherwise `.parent` becomes None.
 	"""
 
 	tag_name: str
@@ -119,34 +146,59 @@ class DOMElementNode(DOMBaseNode):
 
 	@time_execution_sync('--clickable_elements_to_string')
 	def clickable_elements_to_string(self, include_attributes: list[str] = []) -> str:
-		"""Convert the processed DOM content to HTML."""
-		formatted_text = []
+		"""Convert the processed DOM content to HTML.
+
+		Single pass over the tree: every text node is assigned to its nearest highlighted ancestor,
+		whose text is the same as `get_all_text_till_next_clickable_element()` would return.
+		"""
+		formatted_text: list[str] = []
+		# (line index, element, collected text) of every highlighted element
+		highlighted: list[tuple[int, DOMElementNode, list[str]]] = []
+
+		# Text below a highlighted ancestor of self belongs to an element outside of this subtree
+		outside_parts: list[str] = []
+		initial_parts: Optional[list[str]] = outside_parts if self.has_parent_with_highlight_index() else None
+
+		stack: list[tuple[DOMBaseNode, Optional[list[str]]]] = [(self, initial_parts)]
+		while stack:
+			node, text_parts = stack.pop()
 
-		def process_node(node: DOMBaseNode, depth: int) -> None:
 			if isinstance(node, DOMElementNode):
-				# Add element with highlight_index
 				if node.highlight_index is not None:
-					attributes_str = ''
-					if include_attributes:
-						attributes_str = ' ' + ' '.join(
-							f'{key}="{value}"' for key, value in node.attributes.items() if key in include_attributes
-						)
-					formatted_text.append(
-						f'[{node.highlight_index}]<{node.tag_name}{attributes_str}>{node.get_all_text_till_next_clickable_element()}</{node.tag_name}>'
-					)
+					text_parts = []
+					highlighted.append((len(formatted_text), node, text_parts))
+					formatted_text.append('')
 
 				# Process children regardless
-				for child in node.children:
-					process_node(child, depth + 1)
+				for child in reversed(node.children):
+					stack.append((child, text_parts))
 
 			elif isinstance(node, DOMTextNode):
+				if text_parts is not None:
+					text_parts.append(node.text)
 				# Add text only if it doesn't have a highlighted parent
-				if not node.has_parent_with_highlight_index() and node.is_visible:  # and node.is_parent_top_element()
+				elif node.is_visible:  # and node.is_parent_top_element()
 					formatted_text.append(f'[]{node.text}')
 
-		process_node(self, 0)
+		for line_index, node, text_parts in highlighted:
+			attributes_str = ''
+			if include_attributes:
+				attributes_str = ' ' + ' '.join(
+					f'{key}="{value}"' for key, value in node.attributes.items() if key in include_attributes
+				)
+			text = '\n'.join(text_parts).strip()
+			formatted_text[line_index] = f'[{node.highlight_index}]<{node.tag_name}{attributes_str}>{text}</{node.tag_name}>'
+
 		return '\n'.join(formatted_text)
 
+	def has_parent_with_highlight_index(self) -> bool:
+		current = self.parent
+		while current is not None:
+			if current.highlight_index is not None:
+				return True
+			current = current.parent
+		return False
+
 	def get_file_upload_element(self, check_siblings: bool = True) -> Optional['DOMElementNode']:
 		# Check if current element is a file input
 		if self.tag_name == 'input' and self.attributes.get('type') == 'file':
@@ -173,7 +225,40 @@ class DOMElementNode(DOMBaseNode):
 SelectorMap = dict[int, DOMElementNode]
 
 
+@dataclass
+class PageInfo:
+	"""Page metadata collected in the same evaluation as the DOM tree"""
+
+	url: str
+	title: str
+	scroll_y: int
+	viewport_height: int
+	scroll_height: int
+
+	@property
+	def pixels_above(self) -> int:
+		return self.scroll_y
+
+	@property
+	def pixels_below(self) -> int:
+		return self.scroll_height - (self.scroll_y + self.viewport_height)
+
+
 @dataclass
 class DOMState:
+	"""
+	Owns the element tree. The nodes of `selector_map` hold their parents weakly, so they can walk up
+	to `element_tree` only while this state (or the root) is referenced.
+	"""
+
 	element_tree: DOMElementNode
 	selector_map: SelectorMap
+	page_info: Optional[PageInfo] = field(default=None, kw_only=True)
+	# Rendered element trees by included attributes, the same state is often rendered several times
+	_clickable_elements_cache: dict[tuple[str, ...], str] = field(default_factory=dict, init=False, repr=False, compare=False)
+
+	def clickable_elements_to_string(self, include_attributes: list[str] = []) -> str:
+		key = tuple(include_attributes)
+		if key not in self._clickable_elements_cache:
+			self._clickable_elements_cache[key] = self.element_tree.clickable_elements_to_string(include_attributes)
+		return self._clickable_elements_cache[key]
@@ -0,0 +1,192 @@
+"""
+Record/replay cache of model responses for deterministic and offline agent runs.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Literal, Optional, Sequence
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import Runnable
+from pydantic import ConfigDict
+
+from browser_use.llm.views import LLMCacheMissError
+
+logger = logging.getLogger(__name__)
+
+CacheMode = Literal['record', 'replay', 'passthrough']
+
+# Parts of the prompts which change between otherwise identical runs
+VOLATILE_PATTERNS = [re.compile(r'Current date and time: \d{4}-\d{2}-\d{2} \d{2}:\d{2}')]
+
+
+class LLMCache:
+	"""
+	Responses of model calls by key, stored in a SQLite file which can be shared by several processes.
+	"""
+
+	def __init__(self, path: str | Path = 'llm_cache.sqlite'):
+		self.path = Path(path)
+		self.path.parent.mkdir(parents=True, exist_ok=True)
+		self._lock = threading.Lock()
+		self._db = sqlite3.connect(self.path, check_same_thread=False)
+		self._db.execute('PRAGMA journal_mode=WAL')
+		self._db.execute('CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, model TEXT, response TEXT, created REAL)')
+		self._db.commit()
+
+		self.hits = 0
+		self.misses = 0
+
+	def get(self, key: str) -> Optional[AIMessage]:
+		with self._lock:
+			row = self._db.execute('SELECT response FROM responses WHERE key = ?', (key,)).fetchone()
+		if row is None:
+			self.misses += 1
+			return None
+		self.hits += 1
+		return messages_from_dict([json.loads(row[0])])[0]  # type: ignore
+
+	def put(self, key: str, model: str, response: BaseMessage) -> None:
+		with self._lock:
+			self._db.execute(
+				'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)',
+				(key, model, json.dumps(message_to_dict(response)), time.time()),
+			)
+			self._db.commit()
+
+	def __len__(self) -> int:
+		with self._lock:
+			return self._db.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+	def close(self) -> None:
+		with self._lock:
+			self._db.close()
+
+	def metrics(self) -> dict[str, Any]:
+		return {'hits': self.hits, 'misses': self.misses}
+
+
+class CachedChatModel(BaseChatModel):
+	"""
+	Chat model which caches the responses of `llm`.
+
+	Modes:
+		record: call `llm` and store every response, replacing older responses of the same call
+		replay: only answer from the cache, calls which were not recorded raise LLMCacheMissError
+		passthrough: call `llm` without the cache
+
+	The key of a call is a hash of the model, the input messages with images replaced by their hash, and
+	the bound tools. Use it everywhere the agent takes a chat model, e.g. for the agent, the planner and
+	the page extraction:
+
+	Example:
+		cache = LLMCache('tests/llm_cache.sqlite')
+		llm = CachedChatModel(llm=ChatOpenAI(model='gpt-4o'), response_cache=cache, mode='replay')
+		agent = Agent(task=task, llm=llm, planner_llm=llm, page_extraction_llm=llm)
+	"""
+
+	model_config = ConfigDict(arbitrary_types_allowed=True)
+
+	llm: BaseChatModel
+	response_cache: LLMCache
+	mode: CacheMode = 'record'
+
+	@property
+	def _llm_type(self) -> str:
+		return f'cached-{self.llm._llm_type}'
+
+	@property
+	def model_name(self) -> Optional[str]:
+		"""Model of the wrapped chat model, the agent selects its prompt format by it"""
+		return getattr(self.llm, 'model_name', None) or getattr(self.llm, 'model', None)
+
+	def bind_tools(self, tools: Sequence[Any], *, tool_choice: Optional[str] = None, **kwargs: Any) -> Runnable:
+		# Let the wrapped model format the tools, the formatted tools are bound to the cached model
+		bound = self.llm.bind_tools(tools, tool_choice=tool_choice, **kwargs)
+		return self.bind(**bound.kwargs)  # type: ignore
+
+	def cache_key(self, messages: list[BaseMessage], stop: Optional[list[str]] = None, **kwargs: Any) -> str:
+		call = {
+			'model': [self.llm.__class__.__name__, self.model_name],
+			'messages': [_message_key(message) for message in messages],
+			'stop': stop,
+			# ls_* arguments only annotate the tracing
+			'kwargs': {name: value for name, value in kwargs.items() if not name.startswith('ls_')},
+		}
+		return hashlib.sha256(json.dumps(call, sort_keys=True, default=_json_default).encode()).hexdigest()
+
+	def _generate(
+		self, messages: list[BaseMessage], stop: Optional[list[str]] = None, run_manager: Any = None, **kwargs: Any
+	) -> ChatResult:
+		if self.mode == 'passthrough':
+			return _result(self.llm.invoke(messages, stop=stop, **kwargs))
+		key = self.cache_key(messages, stop, **kwargs)
+		if self.mode == 'replay':
+			return _result(self._replay(key))
+		response = self.llm.invoke(messages, stop=stop, **kwargs)
+		self.response_cache.put(key, str(self.model_name), response)
+		return _result(response)
+
+	async def _agenerate(
+		self, messages: list[BaseMessage], stop: Optional[list[str]] = None, run_manager: Any = None, **kwargs: Any
+	) -> ChatResult:
+		if self.mode == 'passthrough':
+			return _result(await self.llm.ainvoke(messages, stop=stop, **kwargs))
+		key = self.cache_key(messages, stop, **kwargs)
+		if self.mode == 'replay':
+			return _result(await asyncio.to_thread(self._replay, key))
+		response = await self.llm.ainvoke(messages, stop=stop, **kwargs)
+		await asyncio.to_thread(self.response_cache.put, key, str(self.model_name), response)
+		return _result(response)
+
+	def _replay(self, key: str) -> BaseMessage:
+		response = self.response_cache.get(key)
+		if response is None:
+			raise LLMCacheMissError(key)
+		logger.debug(f'Replayed LLM response {key}')
+		return response
+
+
+def _result(message: BaseMessage) -> ChatResult:
+	return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def _message_key(message: BaseMessage) -> dict[str, Any]:
+	key: dict[str, Any] = {'type': message.type, 'content': _content_key(message.content)}
+	for attribute in ('tool_calls', 'tool_call_id', 'name'):
+		value = getattr(message, attribute, None)
+		if value:
+			key[attribute] = value
+	return key
+
+
+def _content_key(content: Any) -> Any:
+	if isinstance(content, str):
+		for pattern in VOLATILE_PATTERNS:
+			content = pattern.sub('', content)
+		return content
+	if isinstance(content, list):
+		return [_content_key(part) for part in content]
+	if isinstance(content, dict):
+		if content.get('type') == 'image_url':
+			# Screenshots are hashed instead of inlined
+			image_url = content['image_url']
+			url = image_url['url'] if isinstance(image_url, dict) else image_url
+			return {'type': 'image_url', 'sha256': hashlib.sha256(url.encode()).hexdigest()}
+		return {name: _content_key(value) for name, value in content.items()}
+	return content
+
+
+def _json_default(value: Any) -> Any:
+	if hasattr(value, 'model_json_schema'):
+		return value.model_json_schema()
+	return repr(value)
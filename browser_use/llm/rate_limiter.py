@@ -0,0 +1,277 @@
+"""
+Process-wide rate limits of model calls, shared by all agents which use the same provider and model.
+"""
+
+import asyncio
+import logging
+import random
+import time
+import weakref
+from dataclasses import dataclass
+from typing import Any, Optional
+from urllib.parse import urlparse
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import Runnable
+
+logger = logging.getLogger(__name__)
+
+RateLimitKey = tuple[str, str]
+
+# Same estimates as the MessageManager for calls which do not pass a token count
+CHARACTERS_PER_TOKEN = 3
+IMAGE_TOKENS = 800
+
+
+@dataclass
+class RateLimit:
+	"""
+	Limits of one provider and model, shared by all calls in the process.
+
+	Default values:
+		requests_per_minute: None
+			Maximum requests per minute, None for no limit
+
+		tokens_per_minute: None
+			Maximum input and output tokens per minute, None for no limit
+
+		max_retries: 5
+			Retries of a call which was rejected with a rate limit error
+
+		initial_backoff: 1.0
+			Seconds to wait before the first retry, doubled for every further retry
+
+		max_backoff: 60.0
+			Upper bound of the wait before a retry
+	"""
+
+	requests_per_minute: Optional[float] = None
+	tokens_per_minute: Optional[float] = None
+	max_retries: int = 5
+	initial_backoff: float = 1.0
+	max_backoff: float = 60.0
+
+
+class TokenBucket:
+	"""Refills `per_minute` units per minute up to `per_minute`, the level may become negative"""
+
+	def __init__(self, per_minute: float):
+		self.capacity = per_minute
+		self.rate = per_minute / 60
+		self.level = per_minute
+		self._updated = time.monotonic()
+
+	def _refill(self) -> None:
+		now = time.monotonic()
+		self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+		self._updated = now
+
+	def wait_time(self, amount: float) -> float:
+		"""Seconds until `amount` units are available, amounts above the capacity wait for a full bucket"""
+		self._refill()
+		missing = min(amount, self.capacity) - self.level
+		return max(0.0, missing / self.rate)
+
+	def consume(self, amount: float) -> None:
+		self._refill()
+		self.level -= amount
+
+
+class RateLimiter:
+	"""
+	Token buckets for the requests and tokens per minute of one provider and model.
+
+	Callers wait in FIFO order, so no agent starves. A rate limit error of one call blocks all callers
+	until the retry-after hint of the provider has passed.
+	"""
+
+	def __init__(self, limit: RateLimit = RateLimit()):
+		self.limit = limit
+		self._requests = TokenBucket(limit.requests_per_minute) if limit.requests_per_minute else None
+		self._tokens = TokenBucket(limit.tokens_per_minute) if limit.tokens_per_minute else None
+		self._blocked_until = 0.0
+		# asyncio locks are bound to one event loop
+		self._locks: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock] = weakref.WeakKeyDictionary()
+
+		self.requests = 0
+		self.rate_limit_errors = 0
+		self.waited_seconds = 0.0
+
+	def _lock(self) -> asyncio.Lock:
+		loop = asyncio.get_running_loop()
+		lock = self._locks.get(loop)
+		if lock is None:
+			lock = self._locks[loop] = asyncio.Lock()
+		return lock
+
+	def _delay(self, tokens: int) -> float:
+		delays = [self._blocked_until - time.monotonic()]
+		if self._requests is not None:
+			delays.append(self._requests.wait_time(1))
+		if self._tokens is not None:
+			delays.append(self._tokens.wait_time(tokens))
+		return max(delays)
+
+	async def acquire(self, tokens: int = 0) -> float:
+		"""Wait until a request with `tokens` input tokens fits into the limits, returns the seconds waited"""
+		started = time.monotonic()
+		async with self._lock():
+			while (delay := self._delay(tokens)) > 0:
+				await asyncio.sleep(delay)
+			if self._requests is not None:
+				self._requests.consume(1)
+			if self._tokens is not None:
+				self._tokens.consume(tokens)
+			self.requests += 1
+
+		waited = time.monotonic() - started
+		self.waited_seconds += waited
+		return waited
+
+	def record_usage(self, tokens: int) -> None:
+		"""Count tokens which were not known before the call, e.g. the output tokens"""
+		if self._tokens is not None and tokens > 0:
+			self._tokens.consume(tokens)
+
+	def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+		"""Jittered exponential backoff before retry `attempt` (0 based), never shorter than `retry_after`"""
+		base = min(self.limit.max_backoff, self.limit.initial_backoff * 2**attempt)
+		delay = random.uniform(base / 2, base)
+		if retry_after is not None:
+			# Spread the retries of all callers which got the same hint
+			delay = max(delay, retry_after + random.uniform(0, self.limit.initial_backoff))
+		return delay
+
+	def on_rate_limit_error(self, attempt: int, retry_after: Optional[float] = None) -> float:
+		"""Block all callers after a rate limit error, returns the seconds the failed call waits before its retry"""
+		self.rate_limit_errors += 1
+		delay = self.backoff(attempt, retry_after)
+		blocked_for = (
+			retry_after if retry_after is not None else min(self.limit.max_backoff, self.limit.initial_backoff * 2**attempt)
+		)
+		self._blocked_until = max(self._blocked_until, time.monotonic() + blocked_for)
+		return delay
+
+	def metrics(self) -> dict[str, Any]:
+		return {
+			'requests': self.requests,
+			'rate_limit_errors': self.rate_limit_errors,
+			'waited_seconds': round(self.waited_seconds, 3),
+		}
+
+
+class RateLimiters:
+	"""The rate limiters of a process by provider and model"""
+
+	def __init__(self):
+		self._limits: dict[RateLimitKey, RateLimit] = {}
+		self._limiters: dict[RateLimitKey, RateLimiter] = {}
+
+	def configure(self, provider: str, model: str, limit: RateLimit) -> None:
+		"""Set the limits of `provider` and `model`, e.g. ('api.deepseek.com', 'deepseek-reasoner')"""
+		self._limits[(provider, model)] = limit
+		self._limiters.pop((provider, model), None)
+
+	def get(self, llm: Runnable) -> Optional[RateLimiter]:
+		"""The limiter of the chat model in `llm`, None if `llm` contains no chat model"""
+		chat_model = find_chat_model(llm)
+		if chat_model is None:
+			return None
+		key = rate_limit_key(chat_model)
+		limiter = self._limiters.get(key)
+		if limiter is None:
+			limiter = self._limiters[key] = RateLimiter(self._limits.get(key, RateLimit()))
+		return limiter
+
+	def metrics(self) -> dict[str, dict[str, Any]]:
+		return {f'{provider}/{model}': limiter.metrics() for (provider, model), limiter in self._limiters.items()}
+
+
+# Shared by all agents of the process
+rate_limiters = RateLimiters()
+
+
+def find_chat_model(runnable: Any) -> Optional[BaseChatModel]:
+	"""The chat model inside `runnable`, e.g. of a structured output runnable"""
+	if isinstance(runnable, BaseChatModel):
+		# Wrappers like CachedChatModel are limited like the model they call
+		wrapped = getattr(runnable, 'llm', None)
+		if isinstance(wrapped, BaseChatModel):
+			return find_chat_model(wrapped)
+		return runnable
+	children = []
+	for attribute in ('bound', 'runnable', 'first', 'middle', 'last', 'steps__'):
+		value = getattr(runnable, attribute, None)
+		if isinstance(value, dict):
+			children.extend(value.values())
+		elif isinstance(value, list):
+			children.extend(value)
+		elif value is not None:
+			children.append(value)
+	for child in children:
+		chat_model = find_chat_model(child)
+		if chat_model is not None:
+			return chat_model
+	return None
+
+
+def rate_limit_key(llm: BaseChatModel) -> RateLimitKey:
+	"""Provider and model of `llm`, the provider is the host of the API if it is configured"""
+	base_url = getattr(llm, 'openai_api_base', None) or getattr(llm, 'anthropic_api_url', None) or getattr(llm, 'base_url', None)
+	provider = (urlparse(str(base_url)).hostname if base_url else None) or llm.__class__.__name__
+	model = getattr(llm, 'model_name', None) or getattr(llm, 'model', None) or 'unknown'
+	return provider, str(model)
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+	"""Rate limit errors of the OpenAI, Anthropic and Google clients or any error with HTTP status 429"""
+	if type(error).__name__ in ('RateLimitError', 'ResourceExhausted'):
+		return True
+	status_code = getattr(error, 'status_code', None) or getattr(getattr(error, 'response', None), 'status_code', None)
+	return status_code == 429
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+	"""Seconds from the retry-after headers of the response of `error`, if any"""
+	headers = getattr(getattr(error, 'response', None), 'headers', None)
+	if not headers:
+		return None
+	try:
+		if headers.get('retry-after-ms'):
+			return float(headers['retry-after-ms']) / 1000
+		if headers.get('retry-after'):
+			return float(headers['retry-after'])
+	except (TypeError, ValueError):
+		# retry-after may also be an HTTP date
+		pass
+	return None
+
+
+def estimate_tokens(input: Any) -> int:
+	"""Rough token count of the input of a model call"""
+	if isinstance(input, str):
+		return len(input) // CHARACTERS_PER_TOKEN
+	if not isinstance(input, list):
+		return len(str(input)) // CHARACTERS_PER_TOKEN
+
+	tokens = 0
+	for message in input:
+		content = message.content if isinstance(message, BaseMessage) else message
+		if isinstance(content, list):
+			for part in content:
+				if isinstance(part, dict) and part.get('type') == 'image_url':
+					tokens += IMAGE_TOKENS
+				else:
+					tokens += len(str(part.get('text', '') if isinstance(part, dict) else part)) // CHARACTERS_PER_TOKEN
+		else:
+			tokens += len(str(content)) // CHARACTERS_PER_TOKEN
+	return tokens
+
+
+def output_tokens(response: Any) -> int:
+	"""Output tokens from the usage metadata of a model response, also of structured output with include_raw"""
+	if isinstance(response, dict):
+		response = response.get('raw')
+	usage = getattr(response, 'usage_metadata', None)
+	return usage.get('output_tokens', 0) if usage else 0
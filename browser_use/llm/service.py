@@ -0,0 +1,197 @@
+"""
+Async invocation layer shared by all model calls of the agent, the planner, the validator and the controller.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+from langchain_core.runnables import Runnable
+
+from browser_use.llm.rate_limiter import (
+	RateLimiter,
+	RateLimiters,
+	estimate_tokens,
+	is_rate_limit_error,
+	output_tokens,
+	rate_limiters,
+	retry_after,
+)
+from browser_use.llm.views import LLMCancelledError, LLMTimeoutError
+
+logger = logging.getLogger(__name__)
+
+# Use the timeout of the invoker, None means no timeout
+DEFAULT_TIMEOUT: Any = object()
+
+
+async def _next(iterator: AsyncIterator[Any]) -> Any:
+	return await iterator.__anext__()
+
+
+class LLMInvoker:
+	"""
+	Runs model calls on the event loop with a timeout per call.
+
+	Calls never block the event loop, models without native async support are run in a thread by
+	langchain. Every call runs in its own task, `cancel()` aborts all calls in flight and their callers
+	get an LLMCancelledError.
+
+	Calls wait for the shared rate limiter of their provider and model. Calls which are rejected with a
+	rate limit error are retried with backoff, the waits count neither toward the timeout nor as failures.
+	Pass `rate_limiters=None` to call the models without limits.
+
+	Example:
+		invoker = LLMInvoker(timeout=60)
+		response = await invoker.ainvoke(planner_llm, messages, name='planner', timeout=120)
+	"""
+
+	def __init__(self, timeout: Optional[float] = 120.0, rate_limiters: Optional[RateLimiters] = rate_limiters):
+		self.timeout = timeout
+		self.rate_limiters = rate_limiters
+		self._tasks: set[asyncio.Future] = set()
+
+	@property
+	def in_flight(self) -> int:
+		"""Number of calls which are running"""
+		return len(self._tasks)
+
+	async def ainvoke(
+		self,
+		llm: Runnable,
+		input: Any,
+		name: str = 'llm',
+		timeout: Optional[float] = DEFAULT_TIMEOUT,
+		tokens: Optional[int] = None,
+	) -> Any:
+		"""Invoke `llm`, `tokens` are the input tokens for the rate limit, estimated from `input` if not given"""
+		limiter = self._limiter(llm)
+		attempt = 0
+		while True:
+			await self._acquire(limiter, input, tokens)
+			try:
+				response = await self._run(llm.ainvoke(input), name, self._timeout(timeout))
+			except Exception as e:
+				await self._retry_or_raise(e, limiter, attempt, name)
+				attempt += 1
+				continue
+			if limiter is not None:
+				limiter.record_usage(output_tokens(response))
+			return response
+
+	async def astream(
+		self,
+		llm: Runnable,
+		input: Any,
+		name: str = 'llm',
+		timeout: Optional[float] = DEFAULT_TIMEOUT,
+		tokens: Optional[int] = None,
+	) -> AsyncIterator[Any]:
+		"""Stream the output of `llm`, the timeout applies to the whole stream"""
+		async for chunk in self._iterate(lambda: llm.astream(input), llm, input, name, self._timeout(timeout), tokens):
+			yield chunk
+
+	async def astream_events(
+		self,
+		llm: Runnable,
+		input: Any,
+		name: str = 'llm',
+		timeout: Optional[float] = DEFAULT_TIMEOUT,
+		tokens: Optional[int] = None,
+		**kwargs: Any,
+	) -> AsyncIterator[dict[str, Any]]:
+		"""Stream the events of `llm`, e.g. of a structured output runnable, the timeout applies to the whole stream"""
+		open_stream = lambda: llm.astream_events(input, **kwargs)  # noqa: E731
+		async for event in self._iterate(open_stream, llm, input, name, self._timeout(timeout), tokens):
+			yield event
+
+	def cancel(self) -> None:
+		"""Cancel all calls in flight"""
+		for task in list(self._tasks):
+			task.cancel()
+
+	def _timeout(self, timeout: Optional[float]) -> Optional[float]:
+		return self.timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+	def _limiter(self, llm: Runnable) -> Optional[RateLimiter]:
+		return self.rate_limiters.get(llm) if self.rate_limiters is not None else None
+
+	async def _acquire(self, limiter: Optional[RateLimiter], input: Any, tokens: Optional[int]) -> None:
+		if limiter is None:
+			return
+		waited = await limiter.acquire(tokens if tokens is not None else estimate_tokens(input))
+		if waited > 1:
+			logger.info(f'⏳ Waited {waited:.1f} seconds for the rate limit')
+
+	async def _retry_or_raise(self, error: Exception, limiter: Optional[RateLimiter], attempt: int, name: str) -> None:
+		"""Wait before the retry of a call which was rate limited, raise `error` otherwise"""
+		if limiter is None or not is_rate_limit_error(error):
+			raise error
+		delay = limiter.on_rate_limit_error(attempt, retry_after(error))
+		if attempt >= limiter.limit.max_retries:
+			# The next call of any caller waits in acquire() until the provider accepts requests again
+			raise error
+		logger.warning(
+			f'LLM call {name} was rate limited, retry {attempt + 1}/{limiter.limit.max_retries} in {delay:.1f} seconds'
+		)
+		await asyncio.sleep(delay)
+
+	async def _run(self, awaitable: Awaitable[Any], name: str, timeout: Optional[float], deadline: Optional[float] = None) -> Any:
+		task = asyncio.ensure_future(awaitable)
+		self._tasks.add(task)
+		task.add_done_callback(self._tasks.discard)
+
+		wait = timeout if deadline is None else max(0.0, deadline - time.monotonic())
+		try:
+			return await asyncio.wait_for(task, wait)
+		except asyncio.TimeoutError:
+			logger.warning(f'LLM call {name} timed out after {timeout} seconds')
+			raise LLMTimeoutError(name, timeout) from None
+		except asyncio.CancelledError:
+			current_task = asyncio.current_task()
+			if current_task is not None and current_task.cancelling():
+				# The caller was cancelled, not only the call
+				raise
+			raise LLMCancelledError(f'LLM call {name} was cancelled') from None
+
+	async def _iterate(
+		self,
+		open_stream: Callable[[], AsyncIterator[Any]],
+		llm: Runnable,
+		input: Any,
+		name: str,
+		timeout: Optional[float],
+		tokens: Optional[int],
+	) -> AsyncIterator[Any]:
+		limiter = self._limiter(llm)
+		attempt = 0
+		# A stream can only be retried until its first item was passed on
+		while True:
+			await self._acquire(limiter, input, tokens)
+			iterator = open_stream()
+			deadline = None if timeout is None else time.monotonic() + timeout
+			try:
+				item = await self._run(_next(iterator), name, timeout, deadline)
+			except StopAsyncIteration:
+				return
+			except Exception as e:
+				await iterator.aclose()  # type: ignore
+				await self._retry_or_raise(e, limiter, attempt, name)
+				attempt += 1
+				continue
+			break
+
+		used_tokens = 0
+		try:
+			while True:
+				used_tokens += output_tokens(item)
+				yield item
+				try:
+					item = await self._run(_next(iterator), name, timeout, deadline)
+				except StopAsyncIteration:
+					return
+		finally:
+			if limiter is not None:
+				limiter.record_usage(used_tokens)
+			await iterator.aclose()  # type: ignore
@@ -0,0 +1,121 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from browser_use.agent.service import Agent
+from browser_use.llm.cache import CachedChatModel, LLMCache
+from browser_use.llm.views import LLMCacheMissError
+
+AGENT_OUTPUT = {
+	'current_state': {'page_summary': '', 'evaluation_previous_goal': '', 'memory': '', 'next_goal': 'Finish'},
+	'action': [{'done': {'text': 'ok'}}],
+}
+
+
+class ToolCallingChatModel(BaseChatModel):
+	"""Answers every call with a tool call of the first bound tool, or with text without tools"""
+
+	model_name: str = 'fake-tools'
+	offline: bool = False
+	calls: list = []
+
+	@property
+	def _llm_type(self) -> str:
+		return 'tool-calling-fake'
+
+	def bind_tools(self, tools, *, tool_choice=None, **kwargs):
+		return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+	def _generate(self, messages, stop=None, run_manager=None, tools=None, **kwargs):
+		if self.offline:
+			raise ConnectionError('No network in replay mode')
+		self.calls.append(messages)
+		if tools:
+			name = tools[0]['function']['name']
+			message = AIMessage(content='', tool_calls=[{'name': name, 'args': AGENT_OUTPUT, 'id': 'call_1'}])
+		else:
+			message = AIMessage(content=f'answer {len(self.calls)}')
+		return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def image_message(data: str) -> HumanMessage:
+	return HumanMessage(
+		content=[
+			{'type': 'text', 'text': 'Current date and time: 2025-01-01 10:00'},
+			{'type': 'image_url', 'image_url': {'url': f'data:image/png;base64,{data}'}},
+		]
+	)
+
+
+@pytest.fixture
+def cache(tmp_path):
+	cache = LLMCache(tmp_path / 'llm_cache.sqlite')
+	yield cache
+	cache.close()
+
+
+async def test_record_then_replay(cache):
+	recorder = CachedChatModel(llm=ToolCallingChatModel(calls=[]), response_cache=cache, mode='record')
+	recorded = await recorder.ainvoke([HumanMessage(content='hi')])
+
+	player = CachedChatModel(llm=ToolCallingChatModel(offline=True), response_cache=cache, mode='replay')
+	replayed = await player.ainvoke([HumanMessage(content='hi')])
+
+	assert replayed.content == recorded.content == 'answer 1'
+	assert len(cache) == 1
+	assert cache.metrics() == {'hits': 1, 'misses': 0}
+
+	with pytest.raises(LLMCacheMissError):
+		await player.ainvoke([HumanMessage(content='something else')])
+
+
+def test_passthrough_does_not_store(cache):
+	llm = ToolCallingChatModel(calls=[])
+	cached = CachedChatModel(llm=llm, response_cache=cache, mode='passthrough')
+
+	cached.invoke('hi')
+	cached.invoke('hi')
+
+	assert len(llm.calls) == 2
+	assert len(cache) == 0
+
+
+def test_key_hashes_images_and_ignores_the_clock(cache):
+	cached = CachedChatModel(llm=ToolCallingChatModel(), response_cache=cache)
+	key = cached.cache_key([SystemMessage(content='system'), image_message('aaaa')])
+
+	later = HumanMessage(
+		content=[
+			{'type': 'text', 'text': 'Current date and time: 2025-06-30 23:59'},
+			{'type': 'image_url', 'image_url': {'url': 'data:image/png;base64,aaaa'}},
+		]
+	)
+	assert cached.cache_key([SystemMessage(content='system'), later]) == key
+	assert cached.cache_key([SystemMessage(content='system'), image_message('bbbb')]) != key
+	assert cached.cache_key([SystemMessage(content='system'), image_message('aaaa')], stop=['\n']) != key
+
+
+async def test_agent_replays_structured_output_offline(cache):
+	messages = [HumanMessage(content='Finish')]
+	recorder = Agent(
+		task='Finish',
+		llm=CachedChatModel(llm=ToolCallingChatModel(calls=[]), response_cache=cache, mode='record'),
+		browser_context=SimpleNamespace(),
+	)
+	recorded = await recorder.get_next_action(messages)
+
+	player = Agent(
+		task='Finish',
+		llm=CachedChatModel(llm=ToolCallingChatModel(offline=True), response_cache=cache, mode='replay'),
+		browser_context=SimpleNamespace(),
+	)
+	replayed = await player.get_next_action(messages)
+
+	assert player.model_name == 'fake-tools'
+	assert json.loads(replayed.model_dump_json(exclude_unset=True)) == json.loads(recorded.model_dump_json(exclude_unset=True))
+	assert replayed.action[0].model_dump(exclude_unset=True) == {'done': {'text': 'ok'}}
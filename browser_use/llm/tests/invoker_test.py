@@ -0,0 +1,117 @@
+import asyncio
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from browser_use.agent.service import Agent
+from browser_use.llm.service import LLMInvoker
+from browser_use.llm.views import LLMCancelledError, LLMTimeoutError
+
+AGENT_OUTPUT = {
+	'current_state': {'page_summary': '', 'evaluation_previous_goal': '', 'memory': '', 'next_goal': 'Finish'},
+	'action': [{'done': {'text': 'ok'}}],
+}
+
+
+class SlowChatModel(BaseChatModel):
+	"""
+	Sync only chat model which blocks its thread for `delay` seconds per call, like a reasoning
+	model behind a blocking client
+	"""
+
+	model_name: str = 'deepseek-reasoner'
+	delay: float = 0.3
+	calls: list = []
+
+	@property
+	def _llm_type(self) -> str:
+		return 'slow-fake'
+
+	def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+		started = time.monotonic()
+		time.sleep(self.delay)
+		self.calls.append((started, time.monotonic(), threading.get_ident()))
+		return ChatResult(generations=[ChatGeneration(message=AIMessage(content=json.dumps(AGENT_OUTPUT)))])
+
+	def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+		for token in json.dumps(AGENT_OUTPUT).split(' '):
+			time.sleep(self.delay)
+			yield ChatGenerationChunk(message=AIMessageChunk(content=token + ' '))
+
+
+async def test_agents_call_blocking_model_concurrently():
+	llm = SlowChatModel(calls=[])
+	agents = [Agent(task='Finish', llm=llm, browser_context=SimpleNamespace()) for _ in range(4)]
+	ticks = 0
+
+	async def heartbeat():
+		nonlocal ticks
+		while True:
+			ticks += 1
+			await asyncio.sleep(0.02)
+
+	heartbeat_task = asyncio.create_task(heartbeat())
+	started = time.monotonic()
+	outputs = await asyncio.gather(*(agent.get_next_action([HumanMessage(content='Finish')]) for agent in agents))
+	elapsed = time.monotonic() - started
+	heartbeat_task.cancel()
+
+	assert [output.action[0].model_dump(exclude_unset=True) for output in outputs] == [{'done': {'text': 'ok'}}] * 4
+	# Serial calls would take 4 * 0.3 s and block the heartbeat
+	assert elapsed < 0.8
+	assert max(start for start, _, _ in llm.calls) < min(end for _, end, _ in llm.calls)
+	assert ticks >= 10
+
+
+async def test_timeout():
+	invoker = LLMInvoker(timeout=0.05)
+
+	with pytest.raises(LLMTimeoutError) as exc_info:
+		await invoker.ainvoke(SlowChatModel(calls=[]), 'hi', name='planner')
+
+	assert exc_info.value.name == 'planner'
+	assert invoker.in_flight == 0
+	# The timeout of a single call overrides the default
+	response = await invoker.ainvoke(SlowChatModel(calls=[], delay=0.01), 'hi', timeout=None)
+	assert json.loads(response.content) == AGENT_OUTPUT
+
+
+async def test_stream_timeout_applies_to_whole_stream():
+	invoker = LLMInvoker(timeout=0.25)
+	chunks = []
+
+	with pytest.raises(LLMTimeoutError):
+		async for chunk in invoker.astream(SlowChatModel(calls=[], delay=0.1), 'hi'):
+			chunks.append(chunk)
+
+	assert 1 <= len(chunks) < 4
+
+
+async def test_cancel_calls_in_flight():
+	invoker = LLMInvoker(timeout=None)
+	call = asyncio.create_task(invoker.ainvoke(SlowChatModel(calls=[], delay=1), 'hi'))
+	await asyncio.sleep(0.05)
+
+	assert invoker.in_flight == 1
+	invoker.cancel()
+
+	with pytest.raises(LLMCancelledError):
+		await call
+	assert invoker.in_flight == 0
+
+
+async def test_stopping_agent_cancels_model_call():
+	agent = Agent(task='Finish', llm=SlowChatModel(calls=[], delay=1), browser_context=SimpleNamespace())
+	call = asyncio.create_task(agent.get_next_action([HumanMessage(content='Finish')]))
+	await asyncio.sleep(0.05)
+
+	agent.stop()
+
+	with pytest.raises(InterruptedError):
+		await call
@@ -0,0 +1,158 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_openai import ChatOpenAI
+from pydantic import BaseModel
+
+from browser_use.agent.service import Agent
+from browser_use.llm.cache import CachedChatModel, LLMCache
+from browser_use.llm.rate_limiter import (
+	RateLimit,
+	RateLimiter,
+	RateLimiters,
+	find_chat_model,
+	is_rate_limit_error,
+	rate_limit_key,
+	retry_after,
+)
+from browser_use.llm.service import LLMInvoker
+
+
+class RateLimitError(Exception):
+	def __init__(self, retry_after: str):
+		super().__init__('Rate limit reached')
+		self.status_code = 429
+		self.response = SimpleNamespace(status_code=429, headers={'retry-after': retry_after})
+
+
+class RateLimitedChatModel(BaseChatModel):
+	"""Chat model which rejects its first `failures` calls with HTTP 429"""
+
+	model_name: str = 'limited'
+	failures: int = 2
+	calls: list = []
+
+	@property
+	def _llm_type(self) -> str:
+		return 'rate-limited-fake'
+
+	def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+		self.calls.append(time.monotonic())
+		if len(self.calls) <= self.failures:
+			raise RateLimitError(retry_after='0.05')
+		message = AIMessage(content='ok', usage_metadata={'input_tokens': 10, 'output_tokens': 5, 'total_tokens': 15})
+		return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class Answer(BaseModel):
+	text: str
+
+
+async def test_callers_wait_in_order_for_requests_per_minute():
+	# 1200 requests per minute refill one request every 50 ms after the initial burst
+	limiter = RateLimiter(RateLimit(requests_per_minute=1200))
+	limiter._requests.level = 1
+	order = []
+
+	async def call(i):
+		await limiter.acquire()
+		order.append((i, time.monotonic()))
+
+	started = time.monotonic()
+	await asyncio.gather(*(call(i) for i in range(4)))
+
+	assert [i for i, _ in order] == [0, 1, 2, 3]
+	assert order[-1][1] - started >= 0.14
+	assert limiter.metrics()['requests'] == 4
+
+
+async def test_tokens_per_minute_include_output_tokens():
+	limiter = RateLimiter(RateLimit(tokens_per_minute=6000))
+	await limiter.acquire(tokens=5000)
+	limiter.record_usage(1000)
+
+	# The bucket is empty and refills 100 tokens per second
+	assert limiter._delay(100) == pytest.approx(1.0, abs=0.05)
+
+
+async def test_retries_rate_limit_errors_with_retry_after():
+	limiters = RateLimiters()
+	limiters.configure('RateLimitedChatModel', 'limited', RateLimit(initial_backoff=0.01))
+	invoker = LLMInvoker(timeout=5, rate_limiters=limiters)
+	llm = RateLimitedChatModel(calls=[])
+
+	response = await invoker.ainvoke(llm, 'hi')
+
+	assert response.content == 'ok'
+	assert len(llm.calls) == 3
+	# Every retry waits at least for the retry-after hint
+	assert all(b - a >= 0.05 for a, b in zip(llm.calls, llm.calls[1:]))
+	assert limiters.metrics()['RateLimitedChatModel/limited'] == {
+		'requests': 3,
+		'rate_limit_errors': 2,
+		'waited_seconds': pytest.approx(0.05, abs=0.1),
+	}
+
+
+async def test_gives_up_after_max_retries():
+	limiters = RateLimiters()
+	limiters.configure('RateLimitedChatModel', 'limited', RateLimit(max_retries=1, initial_backoff=0.01))
+	invoker = LLMInvoker(rate_limiters=limiters)
+	llm = RateLimitedChatModel(calls=[], failures=5)
+
+	with pytest.raises(RateLimitError):
+		await invoker.ainvoke(llm, 'hi')
+
+	# The next call waits for the retry-after hint of the last error
+	limiter = limiters.get(llm)
+	assert limiter.rate_limit_errors == 2
+	assert limiter._blocked_until > time.monotonic()
+
+
+async def test_rate_limit_errors_do_not_count_as_failures():
+	agent = Agent(task='Finish', llm=RateLimitedChatModel(calls=[]), browser_context=SimpleNamespace())
+
+	started = time.monotonic()
+	result = await agent._handle_step_error(RateLimitError(retry_after='1'))
+
+	# No fixed retry_delay sleep, the rate limiter makes the next step wait
+	assert time.monotonic() - started < 1
+	assert agent.state.consecutive_failures == 0
+	assert result[0].error
+
+	await agent._handle_step_error(ValueError('Could not parse response.'))
+	assert agent.state.consecutive_failures == 1
+
+
+def test_rate_limit_key_of_structured_output():
+	llm = ChatOpenAI(base_url='https://api.deepseek.com/v1', model='deepseek-chat', api_key='key')
+	structured_llm = llm.with_structured_output(Answer, include_raw=True)
+
+	assert find_chat_model(structured_llm) is llm
+	assert rate_limit_key(llm) == ('api.deepseek.com', 'deepseek-chat')
+	assert rate_limit_key(RateLimitedChatModel()) == ('RateLimitedChatModel', 'limited')
+	assert RateLimiters().get(structured_llm) is not None
+
+
+def test_rate_limit_key_of_cached_model(tmp_path):
+	llm = ChatOpenAI(base_url='https://api.deepseek.com/v1', model='deepseek-reasoner', api_key='key')
+	cached = CachedChatModel(llm=llm, response_cache=LLMCache(tmp_path / 'llm_cache.sqlite'), mode='record')
+	limiters = RateLimiters()
+
+	assert find_chat_model(cached) is llm
+	assert find_chat_model(cached.with_structured_output(Answer, include_raw=True)) is llm
+	assert rate_limit_key(find_chat_model(cached)) == ('api.deepseek.com', 'deepseek-reasoner')
+	assert limiters.get(cached) is limiters.get(llm)
+
+
+def test_detects_rate_limit_errors():
+	error = RateLimitError(retry_after='2')
+
+	assert is_rate_limit_error(error)
+	assert retry_after(error) == 2.0
+	assert not is_rate_limit_error(ValueError('Rate limit'))
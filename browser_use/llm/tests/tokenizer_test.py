@@ -0,0 +1,90 @@
+import base64
+import struct
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from browser_use.agent.message_manager.service import MessageManager, MessageManagerSettings
+from browser_use.agent.views import MessageManagerState
+from browser_use.llm.tokenizer import CharacterTokenizer, DeepSeekTokenizer, Tokenizer, get_tokenizer, image_size
+
+
+def png_url(width: int, height: int) -> str:
+	header = b'\x89PNG\r\n\x1a\n' + struct.pack('>I4sII', 13, b'IHDR', width, height) + b'\x08\x02\x00\x00\x00'
+	return 'data:image/png;base64,' + base64.b64encode(header).decode()
+
+
+def jpeg_url(width: int, height: int) -> str:
+	app0 = b'\xff\xe0' + struct.pack('>H', 16) + b'JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00'
+	sof0 = b'\xff\xc0' + struct.pack('>HBHHB', 11, 8, height, width, 1) + b'\x01\x11\x00'
+	return 'data:image/jpeg;base64,' + base64.b64encode(b'\xff\xd8' + app0 + sof0 + b'\xff\xd9').decode()
+
+
+class CountingTokenizer(Tokenizer):
+	def __init__(self):
+		super().__init__()
+		self.calls = 0
+
+	def _count_text(self, text: str) -> int:
+		self.calls += 1
+		return len(text.split())
+
+
+def test_image_size_from_header():
+	assert image_size(png_url(1280, 1100)) == (1280, 1100)
+	assert image_size(jpeg_url(800, 600)) == (800, 600)
+	assert image_size('https://example.com/screenshot.png') is None
+	assert image_size('data:image/png;base64,not an image') is None
+
+
+def test_images_are_sized_from_their_dimensions():
+	tokenizer = DeepSeekTokenizer(image_tokens=800)
+
+	# 1280x1100 is scaled to 894x768, 2x2 tiles
+	assert tokenizer.count_image({'url': png_url(1280, 1100)}) == 85 + 170 * 4
+	assert tokenizer.count_image({'url': png_url(1280, 1100), 'detail': 'low'}) == 85
+	assert tokenizer.count_image({'url': 'https://example.com/screenshot.png'}) == 800
+	assert CharacterTokenizer(image_tokens=800).count_image({'url': png_url(1280, 1100)}) == 85 + 170 * 4
+
+
+def test_long_texts_are_counted_once():
+	tokenizer = CountingTokenizer()
+	text = 'word ' * 1000
+
+	assert tokenizer.count_text(text) == tokenizer.count_text(text) == 1000
+	assert tokenizer.calls == 1
+
+	tokenizer.count_text('short text')
+	tokenizer.count_text('short text')
+	assert tokenizer.calls == 3
+
+
+def test_tokenizer_per_model():
+	assert isinstance(get_tokenizer('deepseek-chat'), DeepSeekTokenizer)
+	assert isinstance(get_tokenizer('Unknown'), CharacterTokenizer)
+	assert isinstance(get_tokenizer(None), CharacterTokenizer)
+
+	tokenizer = DeepSeekTokenizer()
+	assert tokenizer.count_text('登录') == 2
+	assert tokenizer.count_text('login page') == 3
+
+
+def test_message_manager_counts_with_tokenizer():
+	manager = MessageManager(
+		task='登录并下载报表',
+		system_message=SystemMessage(content='You are a browser agent'),
+		settings=MessageManagerSettings(),
+		state=MessageManagerState(),
+		tokenizer=DeepSeekTokenizer(),
+	)
+	before = manager.state.history.total_tokens
+	manager._add_message_with_tokens(
+		HumanMessage(
+			content=[{'type': 'text', 'text': '当前页面'}, {'type': 'image_url', 'image_url': {'url': png_url(1280, 1100)}}]
+		)
+	)
+	assert manager.state.history.total_tokens - before == 3 + 765
+
+	manager.settings.max_input_tokens = before + 100
+	manager.cut_messages()
+	assert manager.state.history.messages[-1].message.content == '当前页面'
+	assert manager.state.history.total_tokens - before == 3
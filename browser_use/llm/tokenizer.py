@@ -0,0 +1,209 @@
+"""
+Token counts of prompts, used by the MessageManager to keep the message history within the context window of the model.
+"""
+
+import base64
+import binascii
+import hashlib
+import logging
+import math
+import re
+import struct
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import cache
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Shorter texts are counted again instead of hashed, hashing would cost about as much as counting
+MEMOIZE_MIN_LENGTH = 256
+
+# Han characters, kana and hangul, DeepSeek documents about 0.6 tokens per character for them
+CJK_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]')
+
+
+class Tokenizer(ABC):
+	"""Counts the tokens of the texts and images of a prompt, text counts are memoized by content hash"""
+
+	def __init__(self, image_tokens: int = 800, max_memoized: int = 4096):
+		# Tokens of an image whose size can not be read, e.g. of an image url instead of a data url
+		self.image_tokens = image_tokens
+		self.max_memoized = max_memoized
+		self._counts: OrderedDict[bytes, int] = OrderedDict()
+
+	def count_text(self, text: str) -> int:
+		if len(text) < MEMOIZE_MIN_LENGTH:
+			return self._count_text(text)
+
+		key = hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+		tokens = self._counts.get(key)
+		if tokens is not None:
+			self._counts.move_to_end(key)
+			return tokens
+
+		tokens = self._count_text(text)
+		self._counts[key] = tokens
+		if len(self._counts) > self.max_memoized:
+			self._counts.popitem(last=False)
+		return tokens
+
+	def count_image(self, image_url: str | dict[str, Any]) -> int:
+		"""Tokens of an image content item, sized from the dimensions in the header of a data url"""
+		detail = 'auto'
+		if isinstance(image_url, dict):
+			detail = image_url.get('detail', 'auto')
+			image_url = image_url.get('url', '')
+		size = image_size(image_url)
+		if size is None:
+			return self.image_tokens
+		return self._count_image(*size, detail=detail)
+
+	@abstractmethod
+	def _count_text(self, text: str) -> int:
+		pass
+
+	def _count_image(self, width: int, height: int, detail: str = 'auto') -> int:
+		"""OpenAI vision pricing, 85 tokens plus 170 per 512px tile after scaling to 2048px and to 768px on the short side"""
+		if detail == 'low':
+			return 85
+		scale = min(1.0, 2048 / max(width, height))
+		width, height = width * scale, height * scale
+		scale = min(1.0, 768 / min(width, height))
+		width, height = width * scale, height * scale
+		return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+class CharacterTokenizer(Tokenizer):
+	"""Estimate from the number of characters, used for models without a known tokenizer"""
+
+	def __init__(self, characters_per_token: int = 3, image_tokens: int = 800):
+		super().__init__(image_tokens=image_tokens)
+		self.characters_per_token = characters_per_token
+
+	def count_text(self, text: str) -> int:
+		return self._count_text(text)
+
+	def _count_text(self, text: str) -> int:
+		return len(text) // self.characters_per_token
+
+
+class TiktokenTokenizer(Tokenizer):
+	"""Exact counts of OpenAI models with a tiktoken encoding"""
+
+	def __init__(self, encoding: Any, image_tokens: int = 800):
+		super().__init__(image_tokens=image_tokens)
+		self.encoding = encoding
+
+	@classmethod
+	def for_model(cls, model_name: str, image_tokens: int = 800) -> 'TiktokenTokenizer':
+		try:
+			import tiktoken
+		except ImportError as e:
+			raise ImportError('TiktokenTokenizer requires tiktoken, install it with `pip install tiktoken`') from e
+		return cls(tiktoken.encoding_for_model(model_name), image_tokens=image_tokens)
+
+	def _count_text(self, text: str) -> int:
+		return len(self.encoding.encode(text, disallowed_special=()))
+
+
+class DeepSeekTokenizer(Tokenizer):
+	"""DeepSeek's documented estimate of about 0.3 tokens per latin and 0.6 tokens per chinese character"""
+
+	def _count_text(self, text: str) -> int:
+		cjk = len(CJK_PATTERN.findall(text))
+		return math.ceil(cjk * 0.6 + (len(text) - cjk) * 0.3)
+
+
+def get_tokenizer(model_name: Optional[str], characters_per_token: int = 3, image_tokens: int = 800) -> Tokenizer:
+	"""Tokenizer for the model, the character estimate if the model is unknown or tiktoken is not available"""
+	name = (model_name or '').lower()
+	if name.startswith('deepseek'):
+		return DeepSeekTokenizer(image_tokens=image_tokens)
+	if name and (encoding := _tiktoken_encoding(name)) is not None:
+		return TiktokenTokenizer(encoding, image_tokens=image_tokens)
+	return CharacterTokenizer(characters_per_token=characters_per_token, image_tokens=image_tokens)
+
+
+@cache
+def _tiktoken_encoding(model_name: str) -> Any:
+	"""The encoding of the model, loaded once per process, or None"""
+	try:
+		return TiktokenTokenizer.for_model(model_name).encoding
+	except KeyError:
+		# not an OpenAI model
+		return None
+	except (ImportError, OSError, ValueError) as e:
+		# tiktoken is not installed or can not download the encoding
+		logger.debug(f'No tiktoken encoding for {model_name}: {e}')
+		return None
+
+
+def image_size(url: str) -> Optional[tuple[int, int]]:
+	"""Width and height of a PNG, JPEG or WebP data url, read from the image header"""
+	if not url.startswith('data:'):
+		return None
+	_, _, data = url.partition(',')
+	try:
+		# 64 base64 characters cover the PNG and WebP headers
+		header = base64.b64decode(data[:64])
+		if header.startswith(b'\x89PNG\r\n\x1a\n'):
+			return struct.unpack('>II', header[16:24])
+		if header.startswith(b'RIFF') and header[8:12] == b'WEBP':
+			return _webp_size(header)
+		if header.startswith(b'\xff\xd8'):
+			# the frame header usually follows the quantization tables within the first kilobytes
+			return _jpeg_size(base64.b64decode(data[:8192])) or _jpeg_size(base64.b64decode(data))
+	except (binascii.Error, struct.error, ValueError):
+		pass
+	return None
+
+
+def _webp_size(header: bytes) -> Optional[tuple[int, int]]:
+	chunk = header[12:16]
+	if chunk == b'VP8X':
+		width = int.from_bytes(header[24:27], 'little') + 1
+		height = int.from_bytes(header[27:30], 'little') + 1
+		return width, height
+	if chunk == b'VP8 ':
+		width, height = struct.unpack('<HH', header[26:30])
+		return width & 0x3FFF, height & 0x3FFF
+	if chunk == b'VP8L':
+		bits = int.from_bytes(header[21:25], 'little')
+		return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+	return None
+
+
+def _jpeg_size(data: bytes) -> Optional[tuple[int, int]]:
+	"""Size from the first start of frame segment"""
+	offset = 2
+	while offset + 9 <= len(data):
+		if data[offset] != 0xFF:
+			return None
+		marker = data[offset + 1]
+		if marker == 0xFF:
+			offset += 1
+			continue
+		length = struct.unpack('>H', data[offset + 2 : offset + 4])[0]
+		# SOF0 to SOF15 without DHT, JPG and DAC
+		if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+			height, width = struct.unpack('>HH', data[offset + 5 : offset + 9])
+			return width, height
+		offset += 2 + length
+	return None
+
+
+def prompt_usage(message: Any) -> dict[str, int]:
+	"""Input tokens of a model response and how many of them were read from the prompt cache, if the provider reports them"""
+	usage = getattr(message, 'usage_metadata', None) or {}
+	token_usage = (getattr(message, 'response_metadata', None) or {}).get('token_usage') or {}
+
+	result = {}
+	input_tokens = usage.get('input_tokens', token_usage.get('prompt_tokens'))
+	if input_tokens is not None:
+		result['input_tokens'] = input_tokens
+	# DeepSeek reports the cache hits next to the OpenAI usage fields
+	cached = (usage.get('input_token_details') or {}).get('cache_read', token_usage.get('prompt_cache_hit_tokens'))
+	if cached is not None:
+		result['cached_input_tokens'] = cached
+	return result
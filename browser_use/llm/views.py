@@ -0,0 +1,26 @@
+from typing import Optional
+
+
+class LLMError(Exception):
+	"""Base class for all errors of model calls"""
+
+
+class LLMTimeoutError(LLMError, TimeoutError):
+	"""Error raised when a model call takes longer than its timeout"""
+
+	def __init__(self, name: str, timeout: Optional[float]):
+		super().__init__(f'LLM call {name} timed out after {timeout} seconds')
+		self.name = name
+		self.timeout = timeout
+
+
+class LLMCancelledError(LLMError, InterruptedError):
+	"""Error raised in the caller when a model call was cancelled by LLMInvoker.cancel()"""
+
+
+class LLMCacheMissError(LLMError):
+	"""Error raised when a model call is not in the cache in replay mode"""
+
+	def __init__(self, key: str):
+		super().__init__(f'No cached response for LLM call {key}, record it first')
+		self.key = key
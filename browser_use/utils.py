@@ -1,10 +1,22 @@
+import importlib.metadata
 import logging
+import math
+import subprocess
 import time
-from functools import wraps
-from typing import Any, Callable, Coroutine, ParamSpec, TypeVar
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import cache, wraps
+from pathlib import Path
+from typing import Any, Callable, Coroutine, Iterator, Optional, ParamSpec, TypeVar
 
 logger = logging.getLogger(__name__)
 
+TimingHook = Callable[[str, float], None]
+
+# Seconds per phase of the code which currently collects timings, e.g. of an agent step
+_timings: ContextVar[Optional[dict[str, float]]] = ContextVar('timings', default=None)
+_timing_hooks: list[TimingHook] = []
+
 
 # Define generic type variables for return type and parameters
 R = TypeVar('R')
@@ -43,6 +55,76 @@ def time_execution_async(
 	return decorator
 
 
+@contextmanager
+def timer(name: str) -> Iterator[None]:
+	"""
+	Time a phase, e.g. `with timer('screenshot'): ...`.
+
+	The duration is added to the timings collected by `collect_timings()` and passed to the hooks.
+	Without a collector and hooks the phase is not timed.
+	"""
+	timings = _timings.get()
+	if timings is None and not _timing_hooks:
+		yield
+		return
+
+	start_time = time.perf_counter()
+	try:
+		yield
+	finally:
+		duration = time.perf_counter() - start_time
+		if timings is not None:
+			timings[name] = timings.get(name, 0.0) + duration
+		for hook in _timing_hooks:
+			hook(name, duration)
+
+
+@contextmanager
+def collect_timings() -> Iterator[dict[str, float]]:
+	"""Collect the seconds per phase of all timers in this context, phases which run several times are summed"""
+	timings: dict[str, float] = {}
+	token = _timings.set(timings)
+	try:
+		yield timings
+	finally:
+		_timings.reset(token)
+
+
+def add_timing_hook(hook: TimingHook) -> None:
+	"""Call `hook(name, seconds)` for every timed phase, e.g. to export the timings to a metrics system"""
+	_timing_hooks.append(hook)
+
+
+def remove_timing_hook(hook: TimingHook) -> None:
+	_timing_hooks.remove(hook)
+
+
+def percentile(values: list[float], q: float) -> float:
+	"""Linear interpolation between the closest ranks, `q` in [0, 100]"""
+	if not values:
+		return math.nan
+	ordered = sorted(values)
+	rank = (len(ordered) - 1) * q / 100
+	low, high = math.floor(rank), math.ceil(rank)
+	return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+@cache
+def get_version_and_source() -> tuple[str, str]:
+	"""Version and source of the package (pip or git), resolved once per process"""
+	try:
+		return importlib.metadata.version('ai-rpa'), 'pip'
+	except importlib.metadata.PackageNotFoundError:
+		pass
+	try:
+		version = subprocess.check_output(
+			['git', 'describe', '--tags'], cwd=Path(__file__).parent, stderr=subprocess.DEVNULL, timeout=5
+		)
+		return version.decode('utf-8').strip(), 'git'
+	except Exception:
+		return 'unknown', 'unknown'
+
+
 def singleton(cls):
 	instance = [None]
 
@@ -0,0 +1,510 @@
+"""
+生成脚本的执行器：预先启动一组已经加载 Playwright 并打开 Chromium 的 worker 进程，
+每个脚本在独立的工作目录中执行，输出逐行回调，不阻塞事件循环。
+"""
+
+import ast
+import asyncio
+import json
+import logging
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+import uuid
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Optional
+
+from examples.rpa.jobs import _percentile
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，只能依靠墙钟超时
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "script_worker.py")
+# 单行输出的最大字节数，超出的行会被丢弃
+LINE_LIMIT = 1024 * 1024
+
+OutputCallback = Callable[[str, str], Awaitable[Any]]
+
+
+@dataclass
+class ExecutionResult:
+    # success / error / timeout
+    status: str
+    stdout: str
+    stderr: str
+    workspace: str
+    duration: float
+    # 是否在预热的 worker 中执行
+    warm: bool
+    error: Optional[str] = None
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+def _is_main_guard(node: ast.stmt) -> bool:
+    """`if __name__ == "__main__":`，worker 以 run_name="rpa_script" 加载脚本，这段代码不会执行"""
+    if not isinstance(node, ast.If) or node.orelse or not isinstance(node.test, ast.Compare):
+        return False
+    test = node.test
+    if len(test.ops) != 1 or not isinstance(test.ops[0], ast.Eq):
+        return False
+    operands = [test.left, test.comparators[0]]
+    return any(isinstance(operand, ast.Name) and operand.id == "__name__" for operand in operands) and any(
+        isinstance(operand, ast.Constant) and operand.value == "__main__" for operand in operands
+    )
+
+
+def _starts_playwright(node: ast.AST) -> bool:
+    """语句中是否调用了 sync_playwright() 或 run()"""
+    for child in ast.walk(node):
+        if isinstance(child, ast.Call):
+            function = child.func
+            name = function.id if isinstance(function, ast.Name) else getattr(function, "attr", None)
+            if name in ("sync_playwright", "run"):
+                return True
+    return False
+
+
+def _is_warm_compatible(code: str) -> bool:
+    """
+    编译出的同步脚本都有顶层的 `def run(playwright)`，可以交给预热的 worker 执行。
+
+    worker 已经启动了 sync Playwright，脚本在顶层再调用 `with sync_playwright() as p: run(p)` 会失败，
+    所以顶层只允许导入、函数和类定义、赋值以及 `__main__` 保护块，其他脚本在新进程中执行。
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return False
+
+    has_run = False
+    for index, node in enumerate(tree.body):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            if isinstance(node, ast.FunctionDef) and node.name == "run" and len(node.args.args) == 1:
+                has_run = True
+        elif isinstance(node, (ast.Import, ast.ImportFrom)) or _is_main_guard(node):
+            continue
+        elif isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+            if _starts_playwright(node):
+                return False
+        elif index == 0 and isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant):
+            # 模块文档字符串
+            continue
+        else:
+            return False
+    return has_run
+
+
+class _Output:
+    """收集一个任务的输出，同时逐行转发给回调"""
+
+    def __init__(self, on_output: Optional[OutputCallback], max_lines: int):
+        self.on_output = on_output
+        self.lines = {"stdout": deque(maxlen=max_lines), "stderr": deque(maxlen=max_lines)}
+
+    async def write(self, stream: str, line: str):
+        self.lines[stream].append(line)
+        if self.on_output is None:
+            return
+        try:
+            await self.on_output(stream, line)
+        except Exception as e:
+            logger.debug(f"转发脚本输出失败: {str(e)}")
+
+    def text(self, stream: str) -> str:
+        return "\n".join(self.lines[stream])
+
+
+async def _read_lines(stream: asyncio.StreamReader):
+    while True:
+        try:
+            line = await stream.readline()
+        except ValueError:
+            # 超过 LINE_LIMIT 的行
+            continue
+        if not line:
+            return
+        yield line.decode(errors="replace").rstrip("\r\n")
+
+
+async def _kill(process: asyncio.subprocess.Process):
+    """结束进程及其启动的浏览器"""
+    try:
+        if hasattr(os, "killpg"):
+            # 进程已经退出时也结束进程组，脚本没有关闭的浏览器不会残留
+            os.killpg(process.pid, signal.SIGKILL)
+        elif process.returncode is None:
+            process.kill()
+    except OSError:
+        pass
+    await process.wait()
+
+
+def _cpu_limit_preexec(seconds: Optional[int]):
+    if resource is None or not seconds:
+        return None
+
+    def preexec():
+        resource.setrlimit(resource.RLIMIT_CPU, (seconds, seconds + 1))
+
+    return preexec
+
+
+def _exit_reason(returncode: Optional[int]) -> str:
+    if hasattr(signal, "SIGXCPU") and returncode == -signal.SIGXCPU:
+        return "超出CPU时间限制"
+    return f"进程退出，返回码 {returncode}"
+
+
+class _Worker:
+    """一个预热的 worker 进程，stdout 和 stderr 的每一行都放入同一个队列，结束标记按来源区分"""
+
+    def __init__(self, process: asyncio.subprocess.Process, token: str):
+        self.process = process
+        self.token = token
+        self.jobs = 0
+        self.lines: asyncio.Queue = asyncio.Queue()
+        self._readers = [
+            asyncio.create_task(self._read(process.stdout, "stdout")),
+            asyncio.create_task(self._read(process.stderr, "stderr")),
+        ]
+
+    @property
+    def alive(self) -> bool:
+        return self.process.returncode is None
+
+    async def _read(self, stream: asyncio.StreamReader, name: str):
+        prefix = self.token + " "
+        async for line in _read_lines(stream):
+            if name == "stdout" and line.startswith(prefix):
+                await self.lines.put(("report", json.loads(line[len(prefix):])))
+            elif name == "stderr" and line == self.token:
+                await self.lines.put(("stderr_end", None))
+            else:
+                await self.lines.put((name, line))
+        await self.lines.put(("eof", name))
+
+    async def next_report(self, output: Optional[_Output] = None) -> Optional[dict]:
+        """转发输出直到 worker 报告结果，worker 退出时返回 None"""
+        closed = 0
+        report = None
+        stderr_end = False
+        while closed < 2:
+            kind, value = await self.lines.get()
+            if kind == "report":
+                report = value
+            elif kind == "stderr_end":
+                stderr_end = True
+            elif kind == "eof":
+                closed += 1
+            elif output is not None:
+                await output.write(kind, value)
+            else:
+                logger.debug(f"worker {self.process.pid} [{kind}]: {value}")
+            if report is not None and stderr_end:
+                return report
+        return None
+
+    def discard_pending_lines(self):
+        # 空闲期间的输出（例如浏览器的警告）不属于任何任务
+        while not self.lines.empty():
+            kind, value = self.lines.get_nowait()
+            if kind == "eof":
+                self.lines.put_nowait((kind, value))
+                return
+
+    async def kill(self):
+        await _kill(self.process)
+        await asyncio.gather(*self._readers, return_exceptions=True)
+
+
+class ScriptExecutor:
+    """
+    执行生成的 Playwright 脚本。
+
+    后台保持 `pool_size` 个预热的 worker，每个 worker 已经启动了解释器、Playwright 和 Chromium。
+    脚本的 `playwright.chromium.launch()` 直接拿到已经打开的浏览器，`browser.close()` 只关闭脚本自己的上下文。
+    一个 worker 执行 `max_jobs_per_worker` 个脚本后退出，默认每个脚本独占一个进程，取出 worker 的同时就开始预热下一个。
+    没有顶层 `run(playwright)` 的脚本（例如异步脚本或手写脚本）以及在顶层启动 Playwright 的脚本在新的解释器中执行。
+
+    每个脚本有独立的工作目录，截图等文件都保存在其中，只保留最近 `max_workspaces` 个任务的工作目录；
+    执行超过 `wall_timeout` 秒或 CPU 时间超过 `cpu_limit` 秒时结束进程。同时最多执行 `pool_size` 个脚本。
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 2,
+        max_jobs_per_worker: int = 1,
+        wall_timeout: float = 60.0,
+        cpu_limit: Optional[int] = 30,
+        workspace_root: Optional[str] = None,
+        headless: bool = True,
+        startup_timeout: float = 60.0,
+        max_output_lines: int = 2000,
+        max_workspaces: Optional[int] = 100,
+    ):
+        self.pool_size = pool_size
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.wall_timeout = wall_timeout
+        self.cpu_limit = cpu_limit
+        self.workspace_root = workspace_root
+        self.headless = headless
+        self.startup_timeout = startup_timeout
+        self.max_output_lines = max_output_lines
+        self.max_workspaces = max_workspaces
+
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._busy: set[_Worker] = set()
+        self._spawning: set[asyncio.Task] = set()
+        self._slots = asyncio.Semaphore(pool_size)
+        self._spawn_error: Optional[str] = None
+        self._closed = False
+
+        self._running = 0
+        self._counts = {"success": 0, "error": 0, "timeout": 0, "warm": 0, "cold": 0}
+        self._finished_at: deque = deque(maxlen=10000)
+        self._run_times: deque = deque(maxlen=1000)
+        # 已完成任务的工作目录，从旧到新
+        self._workspaces: deque = deque()
+
+    async def start(self):
+        self._closed = False
+        for _ in range(self.pool_size):
+            self._spawn_soon()
+        logger.info(f"脚本执行器已启动，预热 {self.pool_size} 个 worker")
+
+    async def close(self):
+        self._closed = True
+        for task in list(self._spawning):
+            task.cancel()
+        await asyncio.gather(*self._spawning, return_exceptions=True)
+
+        workers = list(self._busy)
+        while not self._idle.empty():
+            workers.append(self._idle.get_nowait())
+        await asyncio.gather(*(worker.kill() for worker in workers), return_exceptions=True)
+
+    async def run(self, code: str, on_output: Optional[OutputCallback] = None) -> ExecutionResult:
+        """在独立的工作目录中执行 `code`，`on_output(stream, line)` 逐行接收 stdout/stderr"""
+        async with self._slots:
+            workspace, path = await asyncio.to_thread(self._prepare_workspace, code)
+            output = _Output(on_output, self.max_output_lines)
+            started = time.monotonic()
+            self._running += 1
+            try:
+                worker = await self._take_worker() if _is_warm_compatible(code) else None
+                if worker is not None:
+                    status, error = await self._run_warm(worker, workspace, path, output)
+                else:
+                    status, error = await self._run_cold(workspace, path, output)
+            finally:
+                self._running -= 1
+                await self._remove_old_workspaces(workspace)
+
+            duration = time.monotonic() - started
+            self._counts[status] += 1
+            self._counts["warm" if worker is not None else "cold"] += 1
+            self._finished_at.append(time.monotonic())
+            self._run_times.append(duration)
+            return ExecutionResult(
+                status=status,
+                stdout=output.text("stdout"),
+                stderr=output.text("stderr"),
+                workspace=workspace,
+                duration=round(duration, 3),
+                warm=worker is not None,
+                error=error,
+            )
+
+    def scripts_per_minute(self) -> int:
+        since = time.monotonic() - 60
+        return sum(1 for finished_at in self._finished_at if finished_at >= since)
+
+    def metrics(self) -> dict[str, Any]:
+        run_times = list(self._run_times)
+        return {
+            "scripts_per_minute": self.scripts_per_minute(),
+            "pool_size": self.pool_size,
+            "idle_workers": self._idle.qsize(),
+            "starting_workers": len(self._spawning),
+            "running": self._running,
+            "succeeded": self._counts["success"],
+            "failed": self._counts["error"],
+            "timed_out": self._counts["timeout"],
+            "warm_runs": self._counts["warm"],
+            "cold_runs": self._counts["cold"],
+            "run_time_p50": _percentile(run_times, 50),
+            "run_time_p95": _percentile(run_times, 95),
+            "worker_error": self._spawn_error,
+        }
+
+    def _prepare_workspace(self, code: str) -> tuple[str, str]:
+        if self.workspace_root:
+            os.makedirs(self.workspace_root, exist_ok=True)
+        workspace = tempfile.mkdtemp(prefix="rpa-job-", dir=self.workspace_root)
+        path = os.path.join(workspace, "script.py")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(code)
+        return workspace, path
+
+    async def _remove_old_workspaces(self, workspace: str):
+        """记录任务的工作目录，删除超出 `max_workspaces` 的旧目录，刚结束的任务的目录总是保留"""
+        self._workspaces.append(workspace)
+        if self.max_workspaces is None:
+            return
+        old = []
+        while len(self._workspaces) > max(1, self.max_workspaces):
+            old.append(self._workspaces.popleft())
+        for path in old:
+            await asyncio.to_thread(shutil.rmtree, path, ignore_errors=True)
+
+    # 预热的 worker ---------------------------------------------------------
+
+    def _spawn_soon(self):
+        if self._closed:
+            return
+        task = asyncio.create_task(self._spawn())
+        self._spawning.add(task)
+        task.add_done_callback(self._spawning.discard)
+
+    async def _spawn(self):
+        try:
+            worker = await self._start_worker()
+        except Exception as e:
+            self._spawn_error = str(e)
+            logger.error(f"启动脚本 worker 失败: {str(e)}")
+            return
+        self._spawn_error = None
+        if self._closed:
+            await worker.kill()
+            return
+        self._idle.put_nowait(worker)
+
+    async def _start_worker(self) -> _Worker:
+        token = uuid.uuid4().hex
+        env = dict(os.environ, RPA_WORKER_TOKEN=token, RPA_WORKER_HEADLESS="1" if self.headless else "0")
+        process = await asyncio.create_subprocess_exec(
+            sys.executable,
+            "-u",
+            WORKER_SCRIPT,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            env=env,
+            start_new_session=True,
+            limit=LINE_LIMIT,
+        )
+        worker = _Worker(process, token)
+        startup = _Output(None, 50)
+        try:
+            report = await asyncio.wait_for(worker.next_report(startup), self.startup_timeout)
+        except BaseException:
+            await worker.kill()
+            raise
+        if report is None:
+            await worker.kill()
+            raise RuntimeError(f"{_exit_reason(process.returncode)}: {startup.text('stderr')[-2000:]}")
+        return worker
+
+    async def _take_worker(self) -> Optional[_Worker]:
+        """取一个预热的 worker，没有可用的 worker 时返回 None，改为在新进程中执行"""
+        while True:
+            if self._idle.empty() and (self._spawn_error is not None or not self._spawning):
+                # worker 启动失败（例如没有安装 Chromium），尝试补充后先用新进程执行
+                if len(self._spawning) + self._idle.qsize() < self.pool_size:
+                    self._spawn_soon()
+                return None
+            try:
+                worker = await asyncio.wait_for(self._idle.get(), self.startup_timeout)
+            except asyncio.TimeoutError:
+                return None
+            if worker.alive:
+                break
+            await worker.kill()
+            self._spawn_soon()
+
+        worker.discard_pending_lines()
+        if worker.jobs + 1 >= self.max_jobs_per_worker:
+            # 这个 worker 执行完就退出，现在开始预热下一个
+            self._spawn_soon()
+        return worker
+
+    async def _run_warm(self, worker: _Worker, workspace: str, path: str, output: _Output) -> tuple[str, Optional[str]]:
+        self._busy.add(worker)
+        worker.jobs += 1
+        try:
+            job = {"workspace": workspace, "path": path, "cpu_limit": self.cpu_limit}
+            worker.process.stdin.write(json.dumps(job).encode() + b"\n")
+            await worker.process.stdin.drain()
+            report = await asyncio.wait_for(worker.next_report(output), self.wall_timeout)
+        except (BrokenPipeError, ConnectionResetError):
+            report = None
+        except asyncio.TimeoutError:
+            await self._retire(worker)
+            return "timeout", f"执行超过 {self.wall_timeout} 秒"
+        except asyncio.CancelledError:
+            await self._retire(worker)
+            raise
+        finally:
+            self._busy.discard(worker)
+
+        if report is None:
+            await self._retire(worker)
+            return "error", _exit_reason(worker.process.returncode)
+
+        if worker.alive and worker.jobs < self.max_jobs_per_worker:
+            self._idle.put_nowait(worker)
+        else:
+            await self._retire(worker)
+        if report.get("ok"):
+            return "success", None
+        return "error", report.get("error")
+
+    async def _retire(self, worker: _Worker):
+        await worker.kill()
+        if worker.jobs < self.max_jobs_per_worker:
+            # 提前退出的 worker 还没有安排接替者
+            self._spawn_soon()
+
+    # 新进程 ---------------------------------------------------------------
+
+    async def _run_cold(self, workspace: str, path: str, output: _Output) -> tuple[str, Optional[str]]:
+        process = await asyncio.create_subprocess_exec(
+            sys.executable,
+            "-u",
+            path,
+            cwd=workspace,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=True,
+            preexec_fn=_cpu_limit_preexec(self.cpu_limit),
+            limit=LINE_LIMIT,
+        )
+
+        async def forward(stream: asyncio.StreamReader, name: str):
+            async for line in _read_lines(stream):
+                await output.write(name, line)
+
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(forward(process.stdout, "stdout"), forward(process.stderr, "stderr"), process.wait()),
+                self.wall_timeout,
+            )
+        except asyncio.TimeoutError:
+            return "timeout", f"执行超过 {self.wall_timeout} 秒"
+        finally:
+            await _kill(process)
+
+        if process.returncode == 0:
+            return "success", None
+        return "error", _exit_reason(process.returncode)
@@ -0,0 +1,226 @@
+"""
+RPA 任务队列：请求只负责入队并立即返回任务ID，按大模型提供方限制并发的 worker 池在后台执行任务。
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class JobStatus(str, Enum):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+
+
+class QueueFullError(Exception):
+    """队列已满，拒绝新任务"""
+
+
+@dataclass
+class Job:
+    task: str
+    provider: str
+    connection_id: Optional[str] = None
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: JobStatus = JobStatus.QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[dict] = None
+    error: Optional[str] = None
+
+    @property
+    def wait_time(self) -> Optional[float]:
+        if self.started_at is None:
+            return None
+        return self.started_at - self.created_at
+
+    @property
+    def run_time(self) -> Optional[float]:
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            'job_id': self.id,
+            'task': self.task,
+            'provider': self.provider,
+            'status': self.status.value,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'wait_time': self.wait_time,
+            'run_time': self.run_time,
+            'result': self.result,
+            'error': self.error,
+        }
+
+
+def _percentile(values: list[float], percentile: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, round(percentile / 100 * (len(ordered) - 1)))
+    return round(ordered[index], 3)
+
+
+@dataclass
+class ProviderQueue:
+    """一个大模型提供方的队列、worker 和统计信息"""
+
+    concurrency: int
+    queue: asyncio.Queue
+    workers: list[asyncio.Task] = field(default_factory=list)
+    running: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    # 最近任务的排队等待时间和执行时间（秒）
+    wait_times: deque = field(default_factory=lambda: deque(maxlen=1000))
+    run_times: deque = field(default_factory=lambda: deque(maxlen=1000))
+
+    def metrics(self) -> dict[str, Any]:
+        wait_times = list(self.wait_times)
+        run_times = list(self.run_times)
+        return {
+            'concurrency': self.concurrency,
+            'queue_depth': self.queue.qsize(),
+            'running': self.running,
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'wait_time_p50': _percentile(wait_times, 50),
+            'wait_time_p95': _percentile(wait_times, 95),
+            'run_time_p50': _percentile(run_times, 50),
+            'run_time_p95': _percentile(run_times, 95),
+        }
+
+
+JobRunner = Callable[[Job], Awaitable[dict]]
+
+
+class JobManager:
+    """
+    按提供方划分的有界任务队列。
+
+    每个提供方有自己的队列和 `concurrency` 个 worker，一个提供方的慢请求不会占用其他提供方的并发额度。
+    队列中最多排 `max_queue_size` 个任务，超出时 `submit` 抛出 QueueFullError，由调用方返回 429。
+    已完成的任务最多保留 `max_finished_jobs` 个，供 `GET /jobs/{id}` 查询。
+    """
+
+    def __init__(
+        self,
+        runner: JobRunner,
+        concurrency: dict[str, int],
+        max_queue_size: int = 100,
+        max_finished_jobs: int = 1000,
+    ):
+        self.runner = runner
+        self.max_queue_size = max_queue_size
+        self.max_finished_jobs = max_finished_jobs
+        self._concurrency = dict(concurrency)
+        self._providers: dict[str, ProviderQueue] = {}
+        self._jobs: OrderedDict[str, Job] = OrderedDict()
+
+    @property
+    def providers(self) -> list[str]:
+        return list(self._concurrency)
+
+    async def start(self):
+        """为每个提供方启动 worker"""
+        for provider, concurrency in self._concurrency.items():
+            if provider in self._providers:
+                continue
+            provider_queue = ProviderQueue(concurrency=concurrency, queue=asyncio.Queue(maxsize=self.max_queue_size))
+            provider_queue.workers = [
+                asyncio.create_task(self._worker(provider, provider_queue), name=f'rpa-job-worker-{provider}-{i}')
+                for i in range(concurrency)
+            ]
+            self._providers[provider] = provider_queue
+        logger.info(f"任务队列已启动: {self._concurrency}")
+
+    async def close(self):
+        """停止所有 worker，正在执行的任务会被取消"""
+        workers = [worker for provider_queue in self._providers.values() for worker in provider_queue.workers]
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self._providers.clear()
+
+    def submit(self, task: str, provider: str, connection_id: Optional[str] = None) -> Job:
+        """任务入队并立即返回，不等待执行"""
+        provider_queue = self._providers.get(provider)
+        if provider_queue is None:
+            raise ValueError(f"未知的大模型提供方: {provider}")
+
+        job = Job(task=task, provider=provider, connection_id=connection_id)
+        try:
+            provider_queue.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFullError(f"{provider} 的任务队列已满（{self.max_queue_size}）")
+
+        self._jobs[job.id] = job
+        self._evict_finished_jobs()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def queue_position(self, job: Job) -> int:
+        """任务前面还有多少个排队的任务"""
+        if job.status != JobStatus.QUEUED:
+            return 0
+        # _jobs 按提交顺序排列，同一时刻提交的任务 created_at 可能相同
+        position = 0
+        for other in self._jobs.values():
+            if other is job:
+                break
+            if other.provider == job.provider and other.status == JobStatus.QUEUED:
+                position += 1
+        return position
+
+    def metrics(self) -> dict[str, Any]:
+        return {
+            'providers': {provider: provider_queue.metrics() for provider, provider_queue in self._providers.items()},
+            'queue_depth': sum(provider_queue.queue.qsize() for provider_queue in self._providers.values()),
+            'running': sum(provider_queue.running for provider_queue in self._providers.values()),
+        }
+
+    async def _worker(self, provider: str, provider_queue: ProviderQueue):
+        while True:
+            job = await provider_queue.queue.get()
+            job.status = JobStatus.RUNNING
+            job.started_at = time.time()
+            provider_queue.wait_times.append(job.wait_time)
+            provider_queue.running += 1
+            try:
+                job.result = await self.runner(job)
+                job.status = JobStatus.SUCCEEDED
+                provider_queue.succeeded += 1
+            except asyncio.CancelledError:
+                job.status = JobStatus.FAILED
+                job.error = "任务已取消"
+                raise
+            except Exception as e:
+                logger.error(f"任务 {job.id} 执行失败: {str(e)}")
+                job.status = JobStatus.FAILED
+                job.error = str(e)
+                provider_queue.failed += 1
+            finally:
+                job.finished_at = time.time()
+                provider_queue.run_times.append(job.run_time)
+                provider_queue.running -= 1
+                provider_queue.queue.task_done()
+
+    def _evict_finished_jobs(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in (JobStatus.SUCCEEDED, JobStatus.FAILED)]
+        for job_id in finished[: max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job_id]
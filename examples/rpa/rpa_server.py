@@ -14,7 +14,14 @@ from langchain_openai import ChatOpenAI
 from pydantic import SecretStr, BaseModel
 
 from browser_use import Agent
+from browser_use.agent.action_trace.service import ActionTrace
 from browser_use.agent.views import AgentOutput
+from browser_use.browser.pool import BrowserPool, BrowserPoolConfig
+from browser_use.codegen.service import PlaywrightScriptCompiler, polish_script
+from browser_use.llm.cache import CachedChatModel, LLMCache
+from browser_use.llm.rate_limiter import RateLimit, rate_limiters
+from examples.rpa.executor import ScriptExecutor
+from examples.rpa.jobs import Job, JobManager, QueueFullError
 
 logging.basicConfig(
     level=logging.INFO,
@@ -22,66 +29,133 @@ logging.basicConfig(
 )
 
 
+# 浏览器池：预先启动的浏览器和上下文，供并发任务复用
+browser_pool = BrowserPool(
+    BrowserPoolConfig(
+        browser_count=int(os.getenv('BROWSER_POOL_BROWSERS', '1')),
+        contexts_per_browser=int(os.getenv('BROWSER_POOL_CONTEXTS_PER_BROWSER', '2')),
+        max_context_uses=int(os.getenv('BROWSER_POOL_MAX_CONTEXT_USES', '20')),
+    )
+)
+
+# 脚本执行器：预热的 worker 进程执行生成的脚本，每个脚本有独立的工作目录
+script_executor = ScriptExecutor(
+    pool_size=int(os.getenv('RPA_EXECUTOR_WORKERS', '2')),
+    max_jobs_per_worker=int(os.getenv('RPA_EXECUTOR_MAX_JOBS_PER_WORKER', '1')),
+    wall_timeout=float(os.getenv('RPA_EXECUTOR_TIMEOUT', '60')),
+    cpu_limit=int(os.getenv('RPA_EXECUTOR_CPU_LIMIT', '30')),
+    workspace_root=os.getenv('RPA_WORKSPACE_DIR'),
+    max_workspaces=int(os.getenv('RPA_MAX_WORKSPACES', '100')) or None,
+)
+
+
+# DeepSeek 的限流：所有 agent 和脚本润色共享同一个令牌桶，未配置时不限速，只在 429 时退避重试
+rate_limiters.configure(
+    'api.deepseek.com',
+    'deepseek-reasoner',
+    RateLimit(
+        requests_per_minute=float(os.getenv('DEEPSEEK_REQUESTS_PER_MINUTE', '0')) or None,
+        tokens_per_minute=float(os.getenv('DEEPSEEK_TOKENS_PER_MINUTE', '0')) or None,
+    ),
+)
+
+
 # 使用生命周期管理器
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # 简单记录启动信息
     print("正在启动服务...")
+    await browser_pool.start()
+    await job_manager.start()
+    await script_executor.start()
 
     yield
 
     # 简单记录关闭信息
     print("正在关闭服务...")
+    await job_manager.close()
+    await script_executor.close()
+    await browser_pool.close()
 
 # dotenv
 load_dotenv()
 api_key = os.getenv('DEEPSEEK_API_KEY', '')
 if not api_key:
     raise ValueError('DEEPSEEK_API_KEY is not set')
-
-async def run_search(task: str, connection_id: str = None):
+# 是否在编译出代码后再调用大模型润色
+POLISH_SCRIPT = os.getenv('RPA_POLISH_SCRIPT', '').lower() in ('1', 'true', 'yes')
+# 大模型缓存：record 录制所有调用，replay 只用录制的结果（不联网，结果可复现），默认不缓存
+LLM_CACHE_MODE = os.getenv('RPA_LLM_CACHE', 'passthrough')
+llm_cache = LLMCache(os.getenv('RPA_LLM_CACHE_PATH', 'llm_cache.sqlite')) if LLM_CACHE_MODE != 'passthrough' else None
+
+
+def create_deepseek_llm():
+    llm = ChatOpenAI(
+        base_url='https://api.deepseek.com/v1',
+        model='deepseek-reasoner',
+        api_key=SecretStr(api_key),
+        # 流式输出默认不带 usage，打开后最后一块会带上 token 用量和缓存命中数，限流和缓存统计都要用
+        stream_usage=True,
+    )
+    if llm_cache is None:
+        return llm
+    return CachedChatModel(llm=llm, response_cache=llm_cache, mode=LLM_CACHE_MODE)
+
+
+async def run_search(task: str, connection_id: str = None, action_trace: ActionTrace = None):
     logger = logging.getLogger(__name__)
     logger.info(f"开始执行任务: {task[:50]}...")
 
+    async def token_callback(token, step_number):
+        """大模型边生成边推送到前端，不用等完整的回复"""
+        await send_to_connection({"type": "agent_token", "step_number": step_number, "token": token}, connection_id)
+
     try:
-        # 创建Agent实例
-        agent = Agent(
-            task=task,
-            llm=ChatOpenAI(
-                base_url='https://api.deepseek.com/v1',
-                model='deepseek-reasoner',
-                api_key=SecretStr(api_key),
-            ),
-            use_vision=False,
-            max_failures=2,
-            max_actions_per_step=1,
-        )
-
-        # 自定义监控进度回调函数
-        async def step_callback(state, output, step_number):
-            """每一步Agent执行完成后的回调函数，将执行信息发送到前端"""
-            try:
-                # 发送当前步骤信息到前端
-                await send_log_to_frontend(output, connection_id)
+        # 从浏览器池中借用一个预热的浏览器上下文，按连接隔离 cookie 和存储
+        async with browser_pool.acquire(tenant_id=connection_id) as browser_context:
+            # 创建Agent实例
+            agent = Agent(
+                task=task,
+                llm=create_deepseek_llm(),
+                use_vision=False,
+                browser_context=browser_context,
+                max_failures=2,
+                max_actions_per_step=1,
+                action_trace=action_trace,
+                register_new_token_callback=token_callback if connection_id else None,
+                # 推理模型一次调用可能要一两分钟，超时后这一步记为失败
+                llm_timeout=float(os.getenv("RPA_LLM_TIMEOUT", "180")),
+                # 长任务只保留最近几步的完整消息，更早的步骤压缩成记忆，0 表示不压缩
+                keep_last_steps=int(os.getenv("RPA_KEEP_LAST_STEPS", "10")) or None,
+                # 保持提示词前缀稳定，命中 DeepSeek 的上下文硬盘缓存
+                cache_aware_layout=os.getenv("RPA_CACHE_AWARE_PROMPT", "1") == "1",
+            )
+
+            # 自定义监控进度回调函数
+            async def step_callback(state, output, step_number):
+                """每一步Agent执行完成后的回调函数，将执行信息发送到前端"""
+                try:
+                    # 发送当前步骤信息到前端
+                    await send_log_to_frontend(output, connection_id)
                 
-                # 同时发送结构化的步骤信息
-                step_info = {
-                    "step": 1,  # 固定为步骤1，因为这是RPA自动化的主要步骤
-                    "status": "in-progress",
-                    "message": f"AI步骤 {step_number}: {output.current_state.next_goal}",
-                    "details": f"执行操作: {', '.join([a.model_dump_json(exclude_unset=True)[:30] + '...' for a in output.action])}"
-                }
-                await send_ws_message(step_info, websocket_connections.get(connection_id))
-            except Exception as e:
-                logger.error(f"发送步骤信息失败: {str(e)}")
-
-        # 注册步骤回调函数
-        agent.register_new_step_callback = step_callback
-
-        # 执行任务
-        logger.info("开始执行自动化任务")
-        result = await agent.run()
-        logger.info("自动化任务执行完成")
+                    # 同时发送结构化的步骤信息
+                    step_info = {
+                        "step": 1,  # 固定为步骤1，因为这是RPA自动化的主要步骤
+                        "status": "in-progress",
+                        "message": f"AI步骤 {step_number}: {output.current_state.next_goal}",
+                        "details": f"执行操作: {', '.join([a.model_dump_json(exclude_unset=True)[:30] + '...' for a in output.action])}"
+                    }
+                    await send_to_connection(step_info, connection_id)
+                except Exception as e:
+                    logger.error(f"发送步骤信息失败: {str(e)}")
+
+            # 注册步骤回调函数
+            agent.register_new_step_callback = step_callback
+
+            # 执行任务
+            logger.info("开始执行自动化任务")
+            result = await agent.run()
+            logger.info("自动化任务执行完成")
 
         # 提取最终结果
         final_result = "操作已完成，但未找到明确的结果内容"
@@ -98,7 +172,7 @@ async def run_search(task: str, connection_id: str = None):
                         break
 
         logger.info(f"最终结果: {final_result}")
-        return final_result
+        return final_result, result
 
     except Exception as e:
         logger.error(f"任务执行失败: {str(e)}")
@@ -136,6 +210,7 @@ async def root():
 class TaskRequest(BaseModel):
     task: str
     connection_id: str = None
+    provider: str = "deepseek"
 
     class Config:
         arbitrary_types_allowed = True
@@ -210,278 +285,258 @@ async def websocket_endpoint_no_id(websocket: WebSocket):
     await websocket_endpoint(websocket, client_id)
 
 # 定义API端点
-@app.post("/run-search")
-async def api_run_search(request: TaskRequest):
-    try:
-        # 记录任务开始
-        logging.info(f"🚀 开始执行任务: {request.task[:50]}...")
-
-        # 使用连接ID，如果提供了的话
-        if request.connection_id:
-            logging.info(f"📡 请求中包含WebSocket连接ID: {request.connection_id}")
-
-        # 获取指定的WebSocket连接（如果有）
-        target_websocket = None
-        if request.connection_id and request.connection_id in websocket_connections:
-            target_websocket = websocket_connections[request.connection_id]
-            logging.info(f"📡 找到指定的WebSocket连接 ID: {request.connection_id}")
-
-        # 显示活跃连接状态
-        logging.info(f"📡 当前活跃WebSocket连接数: {len(active_websockets)}")
-        if not active_websockets:
-            logging.warning("⚠️ 没有活跃的WebSocket连接，进度更新将无法发送")
-            # 等待更长时间，给前端更多机会建立连接
-            await asyncio.sleep(2)
-            logging.info(f"📡 等待后检查，当前活跃WebSocket连接数: {len(active_websockets)}")
-
-        # 确保WebSocket连接稳定
-        await asyncio.sleep(1)  # 增加等待时间
+async def run_job(job: Job) -> dict:
+    """在任务队列的 worker 中执行：运行Agent、读取日志、生成提示词、生成代码"""
 
+    async def notify(message):
+        # 每次发送时重新查找连接，排队期间建立的WebSocket连接也能收到进度
+        message["job_id"] = job.id
+        return await send_to_connection(message, job.connection_id)
+
+    try:
+        # 步骤1: 初始化任务
+        logging.info("✅ 步骤1: 大模型模拟RPA开始")
+        # 每个任务单独记录Agent执行的操作，并发任务互不干扰
+        trace_dir = os.getenv("RPA_ACTION_TRACE_DIR")
+        action_trace = ActionTrace(jsonl_path=os.path.join(trace_dir, f"{job.id}.jsonl") if trace_dir else None)
+        # # 执行任务
         try:
-            # 确保WebSocket连接稳定
-            await asyncio.sleep(0.5)  # 给WebSocket连接一些建立的时间
-
-            # 步骤1: 初始化任务
-            logging.info("✅ 步骤1: 大模型模拟RPA开始")
-            llm_log_path = os.path.join(os.path.dirname(__file__), 'llm_context.log')
-            # 创建my.log文件（如果不存在）
-            if os.path.exists(llm_log_path):
-                with open(llm_log_path, 'w', encoding='utf-8') as log_file:
-                    log_file.write("--new-job--\n")
-            # # 执行任务
-            result = await run_search(request.task, request.connection_id)
-            logging.info(f"🔍 大模型模拟RPA结果: {result}")
-
-            # 通过WebSocket发送步骤1完成的消息
-            sent_count = await send_ws_message({
-                "step": 1,
-                "status": "completed",
-                "message": "初始化任务完成，大模型执行结果:" + result.__str__(),
-                "details": "准备开始读取日志"
-            }, target_websocket)
-
-            # 打印日志以确认消息已发送
-            logging.info(f"✅ 步骤1完成消息已发送给 {sent_count} 个活跃连接")
-
-            # 步骤2: 读取同目录下的my.log文件指定内容
-            logging.info("✅ 步骤2: 读取日志内容")
-
-            # 通过WebSocket发送步骤2开始的消息
-            sent_count = await send_ws_message({
-                "step": 2,
-                "status": "in-progress",
-                "message": "正在读取日志内容"
-            }, target_websocket)
+            result, history = await run_search(job.task, job.connection_id, action_trace)
+        finally:
+            await asyncio.to_thread(action_trace.close)
+        logging.info(f"🔍 大模型模拟RPA结果: {result}")
+
+        # 每一步的耗时和首个token的等待时间
+        step_metrics = [item.metadata.model_dump() for item in history.history if item.metadata]
+        ttfbs = [metric["time_to_first_token"] for metric in step_metrics if metric["time_to_first_token"] is not None]
+        ttfb_details = f"，平均首token耗时{sum(ttfbs) / len(ttfbs):.2f}秒" if ttfbs else ""
+
+        # 通过WebSocket发送步骤1完成的消息
+        sent_count = await notify({
+            "step": 1,
+            "status": "completed",
+            "message": "初始化任务完成，大模型执行结果:" + result.__str__(),
+            "details": f"准备开始读取日志（共{len(step_metrics)}步{ttfb_details}）",
+            "step_metrics": step_metrics
+        })
 
-            # 打印日志以确认消息已发送
-            logging.info(f"✅ 步骤2开始消息已发送给 {sent_count} 个活跃连接")
+        # 打印日志以确认消息已发送
+        logging.info(f"✅ 步骤1完成消息已发送给 {sent_count} 个活跃连接")
 
-            a = ""
-            try:
-                with open(llm_log_path, 'r', encoding='utf-8') as log_file:
-                    content = log_file.read()
-                    sections = content.split('--new-job--')
-                    if len(sections) > 1:
-                        a = sections[-1].strip()  # 获取最后一个标记后的内容
-                    else:
-                        a = "未找到有效的日志内容"
-                logging.info(f"📝 读取到的日志内容: {a[:100]}...")
-
-                # 通过WebSocket发送步骤2完成的消息
-                sent_count = await send_ws_message({
-                    "step": 2,
-                    "status": "completed",
-                    "message": "日志读取完成",
-                    "details": f"读取了{len(a)}字节的日志内容"
-                }, target_websocket)
-
-                # 打印日志以确认消息已发送
-                logging.info(f"✅ 步骤2完成消息已发送给 {sent_count} 个活跃连接")
-
-            except Exception as read_error:
-                a = f"读取日志文件失败: {str(read_error)}"
-                logging.error(f"❌ 读取日志失败: {str(read_error)}")
-
-                # 通过WebSocket发送步骤2出错的消息
-                sent_count = await send_ws_message({
-                    "step": 2,
-                    "status": "error",
-                    "message": "日志读取失败",
-                    "details": str(read_error)
-                }, target_websocket)
-
-            # 步骤3 生成提示词
-            logging.info("✅ 步骤3: 生成提示词")
-
-            # 通过WebSocket发送步骤3开始的消息
-            sent_count = await send_ws_message({
-                "step": 3,
-                "status": "in-progress",
-                "message": "正在生成提示词"
-            }, target_websocket)
+        # 步骤2: 读取本次任务的操作记录
+        logging.info("✅ 步骤2: 读取日志内容")
+
+        # 通过WebSocket发送步骤2开始的消息
+        sent_count = await notify({
+            "step": 2,
+            "status": "in-progress",
+            "message": "正在读取日志内容"
+        })
+
+        # 打印日志以确认消息已发送
+        logging.info(f"✅ 步骤2开始消息已发送给 {sent_count} 个活跃连接")
 
-            # 从文件中导入提示词模板
-            from examples.rpa.templates.prompt_template import prompt_template
+        # 直接读取内存中的操作记录
+        a = action_trace.to_text() or "未找到有效的日志内容"
+        logging.info(f"📝 读取到的日志内容: {a[:100]}...")
 
-            # 替换变量
-            final_prompt = prompt_template.replace('{task}', request.task).replace('{a}', a)
-            logging.info("🔤 已生成提示词\n"+final_prompt)
+        # 通过WebSocket发送步骤2完成的消息
+        sent_count = await notify({
+            "step": 2,
+            "status": "completed",
+            "message": "日志读取完成",
+            "details": f"读取了{len(action_trace)}条操作记录，共{len(a)}字节"
+        })
+
+        # 打印日志以确认消息已发送
+        logging.info(f"✅ 步骤2完成消息已发送给 {sent_count} 个活跃连接")
 
-            # 通过WebSocket发送步骤3完成的消息
-            sent_count = await send_ws_message({
-                "step": 3,
-                "status": "completed",
-                "message": "提示词生成完成",
-                "details": f"生成了{len(final_prompt)}字节的提示词"
-            }, target_websocket)
+        # 步骤3 根据Agent的执行历史直接编译Playwright代码，不需要调用大模型
+        logging.info("✅ 步骤3: 编译Playwright代码")
 
-            # 步骤4 获取生成的代码
-            logging.info("✅ 步骤4: 生成代码")
+        # 通过WebSocket发送步骤3开始的消息
+        sent_count = await notify({
+            "step": 3,
+            "status": "in-progress",
+            "message": "正在根据执行历史编译Playwright代码"
+        })
 
+        generated_code = PlaywrightScriptCompiler().compile(history)
+        logging.info(f"🎉 代码编译成功\n"+generated_code)
+
+        # 通过WebSocket发送步骤3完成的消息
+        sent_count = await notify({
+            "step": 3,
+            "status": "completed",
+            "message": "代码编译完成",
+            "details": f"生成了{len(generated_code)}字节的代码"
+        })
+
+        # 步骤4 可选：调用大模型润色代码，只调整可读性，不改变操作
+        logging.info("✅ 步骤4: 润色代码")
+        if POLISH_SCRIPT:
             # 通过WebSocket发送步骤4开始的消息
-            sent_count = await send_ws_message({
+            sent_count = await notify({
                 "step": 4,
                 "status": "in-progress",
-                "message": "正在调用AI模型生成代码"
-            }, target_websocket)
+                "message": "正在调用AI模型润色代码"
+            })
 
             # 创建DeepSeek LLM实例
-            deepseek_llm = ChatOpenAI(
-                base_url='https://api.deepseek.com/v1',
-                model='deepseek-reasoner',  # 使用适合代码生成的模型
-                api_key=SecretStr(api_key),
+            deepseek_llm = create_deepseek_llm()
+            logging.info("🤖 正在调用DeepSeek模型润色代码...")
+            async def code_token_callback(token):
+                # 润色后的代码逐段推送到前端
+                await notify({"type": "code_token", "token": token})
+
+            generated_code = await polish_script(
+                generated_code, deepseek_llm, job.task, on_token=code_token_callback if job.connection_id else None
             )
-            logging.info("🤖 正在调用DeepSeek模型生成代码...")
-            # 调用模型
-            response = await deepseek_llm.ainvoke([
-                {"role": "user", "content": final_prompt}
-            ])
-
-            #官方标准配置（需替换为你的API密钥）
-            #步骤4 获取生成的代码
-            generated_code = response.content
-
-            #调用 OpenAI API
-            # async with httpx.AsyncClient() as client:
-            #     api_response = await client.post("http://localhost:8001/chatgpt_query",
-            #                                      json={"prompt": final_prompt, "model": "gpt-4o"})
-            #     if api_response.status_code == 200:
-            #         generated_code = api_response.json().get("response")
-            #         logging.info(f"🎉 代码生成成功\n" + generated_code)
-            #     else:
-            #         logging.error(f"❌ 代码生成失败: {api_response.text}")
-            #         raise HTTPException(status_code=500, detail="代码生成失败")
-
-            logging.info(f"🎉 代码生成成功\n"+generated_code)
-            
-            # 通过WebSocket发送步骤4完成的消息
-            sent_count = await send_ws_message({
-                "step": 4,
-                "status": "completed",
-                "message": "代码生成完成",
-                "details": f"生成了{len(generated_code)}字节的代码"
-            }, target_websocket)
-            # 返回结果
-            return {
-                "status": "success",
-                "result": "大模型自动化RPA程序成功完成！",
-                "log_content": a[:500] + ("..." if len(a) > 500 else ""),
-                "prompt": final_prompt,
-                "generated_code": generated_code,
-                "steps": [
-                    {"name": "初始化任务", "status": "completed", "result": "任务已初始化"},
-                    {"name": "读取日志", "status": "completed", "result": f"读取了{len(a)}字节的日志内容"},
-                    {"name": "生成提示词", "status": "completed", "result": f"生成了{len(final_prompt)}字节的提示词"},
-                    {"name": "生成代码", "status": "completed", "result": f"生成了{len(generated_code)}字节的代码"}
-                ]
-            }
-        except Exception as e:
-            # 记录异常并返回错误
-            logging.error(f"❌ 执行失败: {str(e)}")
-            
-            # 通过WebSocket发送错误消息
-            sent_count = await send_ws_message({
-                "status": "error",
-                "message": f"执行失败: {str(e)}"
-            }, target_websocket)
-            
-            raise HTTPException(status_code=500, detail=str(e))
-
+            step4_result = f"润色后共{len(generated_code)}字节的代码"
+        else:
+            step4_result = "未启用代码润色"
+
+        # 通过WebSocket发送步骤4完成的消息
+        sent_count = await notify({
+            "step": 4,
+            "status": "completed",
+            "message": "代码生成完成",
+            "details": step4_result
+        })
+        # 返回结果
+        return {
+            "status": "success",
+            "result": "大模型自动化RPA程序成功完成！",
+            "log_content": a[:500] + ("..." if len(a) > 500 else ""),
+            "generated_code": generated_code,
+            "step_metrics": step_metrics,
+            "steps": [
+                {"name": "初始化任务", "status": "completed", "result": "任务已初始化"},
+                {"name": "读取日志", "status": "completed", "result": f"读取了{len(a)}字节的日志内容"},
+                {"name": "编译代码", "status": "completed", "result": f"生成了{len(generated_code)}字节的代码"},
+                {"name": "润色代码", "status": "completed", "result": step4_result}
+            ]
+        }
     except Exception as e:
-        # 记录异常并返回错误
+        # 记录异常，由任务队列记录失败状态
         logging.error(f"❌ 执行失败: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+
+        # 通过WebSocket发送错误消息
+        await notify({
+            "status": "error",
+            "message": f"执行失败: {str(e)}"
+        })
+        raise
+
+
+# 每个大模型提供方允许同时执行的任务数
+JOB_CONCURRENCY = {
+    "deepseek": int(os.getenv("DEEPSEEK_MAX_CONCURRENCY", "2")),
+}
+job_manager = JobManager(
+    run_job,
+    concurrency=JOB_CONCURRENCY,
+    max_queue_size=int(os.getenv("RPA_MAX_QUEUED_JOBS", "100")),
+)
+
+
+@app.post("/run-search", status_code=202)
+async def api_run_search(request: TaskRequest):
+    # 只负责入队，任务由后台 worker 执行，进度通过WebSocket推送，结果通过 GET /jobs/{id} 查询
+    logging.info(f"🚀 任务入队: {request.task[:50]}...")
+    try:
+        job = job_manager.submit(request.task, request.provider, request.connection_id)
+    except QueueFullError as e:
+        logging.warning(f"⚠️ {str(e)}")
+        raise HTTPException(status_code=429, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    queue_position = job_manager.queue_position(job)
+    await send_to_connection({
+        "step": 1,
+        "status": "in-progress",
+        "message": "任务已排队",
+        "details": f"前面还有{queue_position}个任务",
+        "job_id": job.id
+    }, request.connection_id)
+
+    return {"job_id": job.id, "status": job.status.value, "queue_position": queue_position}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    result = job.to_dict()
+    result["queue_position"] = job_manager.queue_position(job)
+    return result
+
+
+@app.get("/metrics/jobs")
+async def job_metrics():
+    # 队列长度、执行中的任务数以及排队等待时间
+    return job_manager.metrics()
 
 # 定义保存代码的请求模型
 class CodeRequest(BaseModel):
     code: str
+    connection_id: str = None
 
 # 添加保存和运行代码的API端点
 @app.post("/save-and-run")
 async def save_and_run_code(request: CodeRequest):
-    try:
-        if not request.code:
-            raise HTTPException(status_code=400, detail="代码不能为空")
-        
-        # 保存代码到文件
-        filepath = "rpa-demo.py"
-        try:
-            # 保存前清空文件内容
-            with open(filepath, "w", encoding="utf-8") as f:
-                f.write(request.code)
-            logging.info(f"✅ 代码已保存到文件: {filepath}")
-        except Exception as e:
-            logging.error(f"❌ 保存代码到文件失败: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"保存代码失败: {str(e)}")
-
-        # 使用子进程运行代码
-        try:
-            # 创建一个新的进程来运行Python代码
-            import subprocess
-            import sys
-            
-            # 使用当前Python解释器的路径，而不是依赖于系统环境变量
-            python_executable = sys.executable
-            
-            process = subprocess.Popen(
-                [python_executable, filepath],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
+    if not request.code:
+        raise HTTPException(status_code=400, detail="代码不能为空")
 
-            # 限制执行时间，避免脚本无限运行
-            try:
-                stdout, stderr = process.communicate(timeout=60)  # 60秒超时
-                if process.returncode == 0:
-                    logging.info(f"✅ RPA代码执行成功")
-                    return {
-                        "status": "success", 
-                        "output": stdout,
-                        "message": "RPA代码已成功执行"
-                    }
-                else:
-                    logging.error(f"❌ RPA代码执行失败: {stderr}")
-                    return {
-                        "status": "error", 
-                        "output": stderr,
-                        "message": "RPA代码执行时出错"
-                    }
-            except subprocess.TimeoutExpired:
-                process.kill()
-                logging.error("❌ RPA代码执行超时")
-                return {
-                    "status": "error",
-                    "message": "RPA代码执行超时，可能存在无限循环"
-                }
-                
-        except Exception as e:
-            logging.error(f"❌ 运行RPA代码失败: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"运行RPA代码失败: {str(e)}")
-            
+    target_websocket = websocket_connections.get(request.connection_id) if request.connection_id else None
+
+    async def on_output(stream, line):
+        # 脚本的输出逐行推送到前端
+        await send_ws_message({"type": "script_output", "stream": stream, "line": line}, target_websocket)
+
+    try:
+        # 在预热的 worker 中异步执行，不阻塞事件循环，并发请求各自使用独立的工作目录
+        result = await script_executor.run(request.code, on_output if target_websocket else None)
     except Exception as e:
-        logging.error(f"❌ 处理请求失败: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        logging.error(f"❌ 运行RPA代码失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"运行RPA代码失败: {str(e)}")
+
+    logging.info(f"✅ 代码已保存到: {result.workspace}，执行状态: {result.status}，耗时 {result.duration} 秒")
+    if result.status == "success":
+        message = "RPA代码已成功执行"
+        output = result.stdout
+    elif result.status == "timeout":
+        message = "RPA代码执行超时，可能存在无限循环"
+        output = "\n".join(filter(None, [result.stdout, result.stderr]))
+    else:
+        logging.error(f"❌ RPA代码执行失败: {result.error}")
+        message = f"RPA代码执行时出错: {result.error}"
+        output = result.stderr or result.stdout
+    return {
+        "status": "success" if result.status == "success" else "error",
+        "output": output,
+        "message": message,
+        "workspace": result.workspace,
+        "duration": result.duration,
+        "warm": result.warm,
+    }
+
+
+@app.get("/metrics/executor")
+async def executor_metrics():
+    # 脚本吞吐量（脚本/分钟）、空闲的预热 worker 数和执行时间
+    return script_executor.metrics()
+
+
+@app.get("/metrics/llm")
+async def llm_metrics():
+    # 每个模型的请求数、429 次数和限流等待的总时间
+    metrics = rate_limiters.metrics()
+    if llm_cache is not None:
+        metrics["cache"] = {"mode": LLM_CACHE_MODE, **llm_cache.metrics()}
+    return metrics
 
 # 通过WebSocket发送消息的统一函数
 async def send_ws_message(message, target_websocket=None):
@@ -512,6 +567,17 @@ async def send_ws_message(message, target_websocket=None):
         logging.error(f"发送WebSocket消息异常: {str(e)}")
         return 0
 
+
+async def send_to_connection(message, connection_id=None):
+    """发送给 connection_id 对应的连接，没有 connection_id 时发送给所有活跃连接"""
+    if not connection_id:
+        return await send_ws_message(message)
+    target_websocket = websocket_connections.get(connection_id)
+    if target_websocket is None:
+        # 客户端已断开或还没连上时丢弃消息，不能广播给其他用户
+        return 0
+    return await send_ws_message(message, target_websocket)
+
 # 新增: 用于发送log_response内容到前端控制台的函数
 async def send_log_to_frontend(response: AgentOutput, connection_id=None):
     """将log_response的内容发送到前端控制台"""
@@ -547,11 +613,7 @@ async def send_log_to_frontend(response: AgentOutput, connection_id=None):
             })
         
         # 通过WebSocket发送到前端
-        target_websocket = None
-        if connection_id and connection_id in websocket_connections:
-            target_websocket = websocket_connections[connection_id]
-            
-        await send_ws_message(log_info, target_websocket)
+        await send_to_connection(log_info, connection_id)
         logging.info(f"⏱️ 已发送Agent日志到前端")
     except Exception as e:
         logging.error(f"发送Agent日志到前端时出错: {str(e)}")
@@ -0,0 +1,142 @@
+"""
+脚本执行器的预热 worker 进程，由 executor.ScriptExecutor 启动，不直接运行。
+
+启动时先导入 Playwright 并启动 Chromium，然后从 stdin 逐行读取任务（JSON），
+在任务的工作目录中执行生成脚本的 `run(playwright)`。脚本的 print 直接写到 stdout/stderr，
+每个任务结束后写一行带 RPA_WORKER_TOKEN 的报告，父进程据此区分脚本输出和任务结果。
+"""
+
+import json
+import os
+import runpy
+import sys
+import time
+import traceback
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，只能依靠父进程的超时
+    resource = None
+
+TOKEN = os.environ["RPA_WORKER_TOKEN"]
+
+
+def report(**data):
+    # stdout 和 stderr 是两个管道，各写一行结束标记，父进程收齐两行才算任务结束
+    sys.stderr.write(f"{TOKEN}\n")
+    sys.stderr.flush()
+    sys.stdout.write(f"{TOKEN} {json.dumps(data)}\n")
+    sys.stdout.flush()
+
+
+class BorrowedBrowser:
+    """预热的浏览器，脚本关闭它时只关闭脚本自己创建的上下文"""
+
+    def __init__(self, browser):
+        self._browser = browser
+        self._contexts = []
+
+    def new_context(self, **kwargs):
+        context = self._browser.new_context(**kwargs)
+        self._contexts.append(context)
+        return context
+
+    def new_page(self, **kwargs):
+        return self.new_context(**kwargs).new_page()
+
+    def close(self, **kwargs):
+        for context in self._contexts:
+            try:
+                context.close()
+            except Exception:
+                pass
+        self._contexts.clear()
+
+    def __getattr__(self, name):
+        return getattr(self._browser, name)
+
+
+class WarmBrowserType:
+    """代替 playwright.chromium：launch 返回已经启动的浏览器"""
+
+    def __init__(self, browser_type, browser):
+        self._browser_type = browser_type
+        self._browser = browser
+        self.borrowed = []
+
+    def launch(self, **kwargs):
+        borrowed = BorrowedBrowser(self._browser)
+        self.borrowed.append(borrowed)
+        return borrowed
+
+    def __getattr__(self, name):
+        return getattr(self._browser_type, name)
+
+
+class WarmPlaywright:
+    def __init__(self, playwright, browser):
+        self._playwright = playwright
+        self.chromium = WarmBrowserType(playwright.chromium, browser)
+
+    def release(self):
+        # 脚本出错时可能没有执行到 browser.close()
+        for borrowed in self.chromium.borrowed:
+            borrowed.close()
+        self.chromium.borrowed.clear()
+
+    def __getattr__(self, name):
+        return getattr(self._playwright, name)
+
+
+def limit_cpu(seconds):
+    if resource is None or not seconds:
+        return
+    # RLIMIT_CPU 按进程累计，在已用 CPU 时间的基础上再给 seconds 秒
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft = int(usage.ru_utime + usage.ru_stime) + int(seconds)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, soft + 1))
+
+
+def run_job(job, warm_playwright):
+    started = time.monotonic()
+    cwd = os.getcwd()
+    os.chdir(job["workspace"])
+    sys.path.insert(0, job["workspace"])
+    try:
+        limit_cpu(job.get("cpu_limit"))
+        namespace = runpy.run_path(job["path"], run_name="rpa_script")
+        namespace["run"](warm_playwright)
+        return {"ok": True, "duration": time.monotonic() - started}
+    except BaseException as e:
+        if isinstance(e, KeyboardInterrupt):
+            raise
+        traceback.print_exc()
+        return {"ok": False, "error": f"{type(e).__name__}: {e}", "duration": time.monotonic() - started}
+    finally:
+        warm_playwright.release()
+        sys.path.remove(job["workspace"])
+        os.chdir(cwd)
+
+
+def serve(warm_playwright):
+    """报告就绪，然后逐行执行 stdin 中的任务直到 stdin 关闭"""
+    report(ready=True)
+    for line in sys.stdin:
+        if line.strip():
+            report(**run_job(json.loads(line), warm_playwright))
+
+
+def main():
+    from playwright.sync_api import sync_playwright
+
+    playwright = sync_playwright().start()
+    browser = playwright.chromium.launch(headless=os.environ.get("RPA_WORKER_HEADLESS", "1") == "1")
+    try:
+        serve(WarmPlaywright(playwright, browser))
+    finally:
+        browser.close()
+        playwright.stop()
+
+
+if __name__ == "__main__":
+    main()
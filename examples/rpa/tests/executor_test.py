@@ -0,0 +1,153 @@
+import asyncio
+import os
+import textwrap
+
+import pytest
+
+from examples.rpa import executor as executor_module
+from examples.rpa.executor import ScriptExecutor, _is_warm_compatible
+
+FAKE_WORKER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_worker.py")
+
+COMPILED_SCRIPT = '''
+import sys
+import time
+
+from playwright.sync_api import sync_playwright
+
+DELAY = {delay}
+
+
+def run(playwright):
+    time.sleep(DELAY)
+    with open("result.txt", "w") as f:
+        f.write("done")
+    print("第一行")
+    print("错误输出", file=sys.stderr)
+    print("第二行")
+
+
+if __name__ == "__main__":
+    with sync_playwright() as playwright:
+        run(playwright)
+'''
+
+
+def script(delay: float = 0) -> str:
+    return COMPILED_SCRIPT.format(delay=delay)
+
+
+@pytest.fixture
+async def executor(monkeypatch, tmp_path):
+    monkeypatch.setattr(executor_module, "WORKER_SCRIPT", FAKE_WORKER)
+    script_executor = ScriptExecutor(
+        pool_size=1, wall_timeout=5, startup_timeout=10, workspace_root=str(tmp_path), max_workspaces=2
+    )
+    await script_executor.start()
+    yield script_executor
+    await script_executor.close()
+
+
+async def wait_for_idle_worker(script_executor: ScriptExecutor):
+    async def poll():
+        while script_executor._idle.qsize() < script_executor.pool_size:
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(poll(), 10)
+
+
+def test_scripts_starting_playwright_at_module_level_run_cold():
+    assert _is_warm_compatible(script())
+    assert _is_warm_compatible('"""润色后的脚本"""\n' + script())
+
+    # 润色后的脚本常常去掉了 __main__ 保护，在 worker 中嵌套启动 sync Playwright 会失败
+    unguarded = script().split("if __name__")[0] + "with sync_playwright() as playwright:\n    run(playwright)\n"
+    assert not _is_warm_compatible(unguarded)
+    assert not _is_warm_compatible(script() + "\nplaywright = sync_playwright().start()\nrun(playwright)\n")
+    assert not _is_warm_compatible(script() + '\nprint("starting")\n')
+    assert not _is_warm_compatible("import asyncio\n\nasync def run(playwright):\n    pass\n")
+    assert not _is_warm_compatible("def run(:")
+
+
+async def test_warm_and_cold_runs_stream_output(executor):
+    await wait_for_idle_worker(executor)
+    lines = []
+
+    async def on_output(stream, line):
+        lines.append((stream, line))
+
+    warm = await executor.run(script(), on_output)
+    assert warm.status == "success", warm.stderr
+    assert warm.warm
+    assert [line for line in lines if line[0] == "stdout"] == [("stdout", "第一行"), ("stdout", "第二行")]
+    assert ("stderr", "错误输出") in lines
+    assert warm.stdout == "第一行\n第二行"
+
+    # 没有 run(playwright) 的脚本在新进程中执行，输出同样逐行转发
+    lines.clear()
+    cold = await executor.run('import sys\nprint("冷启动")\nprint("失败", file=sys.stderr)\nsys.exit(3)\n', on_output)
+    assert cold.status == "error"
+    assert not cold.warm
+    assert cold.error == "进程退出，返回码 3"
+    assert sorted(lines) == [("stderr", "失败"), ("stdout", "冷启动")]
+
+    metrics = executor.metrics()
+    assert (metrics["warm_runs"], metrics["cold_runs"]) == (1, 1)
+    assert (metrics["succeeded"], metrics["failed"], metrics["timed_out"]) == (1, 1, 0)
+    assert metrics["run_time_p50"] is not None
+    assert metrics["scripts_per_minute"] == 2
+    assert metrics["running"] == 0
+
+
+async def test_each_job_has_its_own_workspace_and_old_ones_are_removed(executor, tmp_path):
+    results = []
+    for _ in range(3):
+        await wait_for_idle_worker(executor)
+        results.append(await executor.run(script()))
+
+    workspaces = [result.workspace for result in results]
+    assert len(set(workspaces)) == 3
+    assert all(os.path.dirname(workspace) == str(tmp_path) for workspace in workspaces)
+    # 脚本的相对路径写入自己的工作目录
+    for workspace in workspaces[1:]:
+        with open(os.path.join(workspace, "result.txt")) as f:
+            assert f.read() == "done"
+    # max_workspaces=2，最早的工作目录已删除
+    assert not os.path.exists(workspaces[0])
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(workspace) for workspace in workspaces[1:])
+
+
+async def test_timed_out_worker_is_killed_and_replaced(executor):
+    await wait_for_idle_worker(executor)
+    worker = await executor._idle.get()
+    executor._idle.put_nowait(worker)
+
+    executor.wall_timeout = 0.5
+    result = await executor.run(script(delay=30))
+
+    assert result.status == "timeout"
+    assert result.warm
+    assert not worker.alive
+    await wait_for_idle_worker(executor)
+    replacement = await executor._idle.get()
+    executor._idle.put_nowait(replacement)
+    assert replacement is not worker and replacement.alive
+
+    executor.wall_timeout = 5
+    result = await executor.run(script())
+    assert result.status == "success", result.stderr
+    assert executor.metrics()["timed_out"] == 1
+
+
+async def test_cold_run_timeout_kills_process(executor):
+    executor.wall_timeout = 0.5
+    result = await executor.run(textwrap.dedent('''
+        import time
+        print("开始", flush=True)
+        time.sleep(30)
+    '''))
+
+    assert result.status == "timeout"
+    assert not result.warm
+    assert result.stdout == "开始"
+    assert executor.metrics()["cold_runs"] == 1
@@ -0,0 +1,21 @@
+"""
+不启动浏览器的预热 worker，测试用：和 script_worker 使用同样的协议和 run_job，脚本拿到的 playwright 是一个占位对象。
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import script_worker  # noqa: E402
+
+
+class FakePlaywright:
+    chromium = None
+
+    def release(self):
+        pass
+
+
+if __name__ == "__main__":
+    script_worker.serve(FakePlaywright())
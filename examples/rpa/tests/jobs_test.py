@@ -0,0 +1,148 @@
+import asyncio
+
+import pytest
+
+from examples.rpa.jobs import JobManager, JobStatus, QueueFullError
+
+
+class FakeRunner:
+    """按任务名控制执行结束的 runner，记录同时执行的任务数"""
+
+    def __init__(self):
+        self.running = 0
+        self.max_running = 0
+        self.started: dict[str, asyncio.Event] = {}
+        self.release: dict[str, asyncio.Event] = {}
+
+    def events(self, task: str) -> tuple[asyncio.Event, asyncio.Event]:
+        self.started.setdefault(task, asyncio.Event())
+        self.release.setdefault(task, asyncio.Event())
+        return self.started[task], self.release[task]
+
+    async def __call__(self, job):
+        started, release = self.events(job.task)
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        started.set()
+        try:
+            await release.wait()
+        finally:
+            self.running -= 1
+        if job.task.startswith('fail'):
+            raise RuntimeError('页面加载失败')
+        return {'task': job.task}
+
+
+async def wait_until(condition, timeout: float = 1.0):
+    async def poll():
+        while not condition():
+            await asyncio.sleep(0)
+
+    await asyncio.wait_for(poll(), timeout)
+
+
+async def test_submit_rejects_jobs_when_queue_is_full():
+    manager = JobManager(FakeRunner(), {'deepseek': 1}, max_queue_size=2)
+    await manager.start()
+    runner = manager.runner
+
+    first = manager.submit('first', 'deepseek')
+    await runner.events('first')[0].wait()
+    manager.submit('second', 'deepseek')
+    manager.submit('third', 'deepseek')
+    with pytest.raises(QueueFullError):
+        manager.submit('fourth', 'deepseek')
+    with pytest.raises(ValueError):
+        manager.submit('fifth', 'unknown')
+
+    assert first.status == JobStatus.RUNNING
+    await manager.close()
+
+
+async def test_concurrency_is_capped_per_provider():
+    runner = FakeRunner()
+    manager = JobManager(runner, {'deepseek': 2, 'openai': 1})
+    await manager.start()
+
+    jobs = [manager.submit(f'deepseek-{i}', 'deepseek') for i in range(5)]
+    openai_job = manager.submit('openai-0', 'openai')
+    await wait_until(lambda: runner.running == 3)
+    await asyncio.sleep(0.01)
+
+    assert runner.max_running == 3
+    assert [job.status for job in jobs] == [JobStatus.RUNNING] * 2 + [JobStatus.QUEUED] * 3
+    assert openai_job.status == JobStatus.RUNNING
+    assert manager.metrics()['providers']['deepseek']['running'] == 2
+    assert manager.metrics()['queue_depth'] == 3
+
+    for i in range(5):
+        runner.events(f'deepseek-{i}')[1].set()
+    await wait_until(lambda: all(job.status == JobStatus.SUCCEEDED for job in jobs))
+
+    assert runner.max_running == 3
+    await manager.close()
+
+
+async def test_job_status_and_queue_position():
+    runner = FakeRunner()
+    manager = JobManager(runner, {'deepseek': 1})
+    await manager.start()
+
+    # 同一时刻提交的任务按提交顺序排队
+    succeeding = manager.submit('ok', 'deepseek')
+    failing = manager.submit('fail', 'deepseek')
+    last = manager.submit('last', 'deepseek')
+    assert [manager.queue_position(job) for job in (succeeding, failing, last)] == [0, 1, 2]
+
+    await runner.events('ok')[0].wait()
+    assert succeeding.status == JobStatus.RUNNING
+    assert [manager.queue_position(job) for job in (succeeding, failing, last)] == [0, 0, 1]
+
+    runner.events('ok')[1].set()
+    await runner.events('fail')[0].wait()
+    assert succeeding.status == JobStatus.SUCCEEDED
+    assert succeeding.result == {'task': 'ok'}
+    assert manager.queue_position(last) == 0
+
+    runner.events('fail')[1].set()
+    await runner.events('last')[0].wait()
+    assert failing.status == JobStatus.FAILED
+    assert failing.error == '页面加载失败'
+    assert failing.run_time is not None
+
+    metrics = manager.metrics()['providers']['deepseek']
+    assert (metrics['succeeded'], metrics['failed'], metrics['running']) == (1, 1, 1)
+    await manager.close()
+
+
+async def test_finished_jobs_are_evicted():
+    runner = FakeRunner()
+    manager = JobManager(runner, {'deepseek': 1}, max_finished_jobs=2)
+    await manager.start()
+
+    jobs = []
+    for i in range(4):
+        jobs.append(manager.submit(f'job-{i}', 'deepseek'))
+        runner.events(f'job-{i}')[1].set()
+        await wait_until(lambda: jobs[-1].status == JobStatus.SUCCEEDED)
+
+    # 驱逐在下一次 submit 时进行
+    pending = manager.submit('pending', 'deepseek')
+    assert [manager.get(job.id) for job in jobs] == [None, None, jobs[2], jobs[3]]
+    assert manager.get(pending.id) is pending
+    await manager.close()
+
+
+async def test_close_fails_running_jobs():
+    runner = FakeRunner()
+    manager = JobManager(runner, {'deepseek': 1})
+    await manager.start()
+
+    job = manager.submit('slow', 'deepseek')
+    await runner.events('slow')[0].wait()
+    await manager.close()
+
+    assert job.status == JobStatus.FAILED
+    assert job.error == '任务已取消'
+    assert job.finished_at is not None
+    assert manager.metrics()['providers'] == {}